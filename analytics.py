@@ -0,0 +1,175 @@
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+import numpy as np
+import counters
+
+# Column storage settings
+ANALYTICS_INITIAL_CAPACITY = 1024
+ANALYTICS_WEEK_FILE = "analytics_week.npz"
+ANALYTICS_RARITIES = ["Common", "Rare", "Epic", "Legend", "Mythic", "Ultimate"]
+
+# Numeric user fields mirrored into columns
+ANALYTICS_FIELDS = {
+    "money": lambda user_data: user_data.get("money", 0),
+    "total_sp": lambda user_data: user_data.get("total_sp", 0),
+    "season_sp": lambda user_data: user_data.get("season_sp", 0),
+    "earned_sp": lambda user_data: user_data.get("earned_sp", 0),
+    "shards": lambda user_data: user_data.get("shards", 0),
+    "arena_cups": lambda user_data: user_data.get("arena_cups", 0),
+    "battles_won": lambda user_data: user_data.get("battles_won", 0),
+    "battles_lost": lambda user_data: user_data.get("battles_lost", 0),
+    "total_cards": counters.total_cards,
+    "total_pulls": counters.total_pulls
+}
+for _rarity in ANALYTICS_RARITIES:
+    ANALYTICS_FIELDS[f"cards_{_rarity.lower()}"] = lambda user_data, rarity=_rarity: counters.rarity_count(user_data, rarity)
+
+ANALYTICS_OPERATORS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "=": np.equal,
+    "!=": np.not_equal
+}
+
+
+def get_week_start(timestamp=None):
+    """Returns timestamp of Monday 00:00 of the week"""
+    moment = datetime.fromtimestamp(timestamp if timestamp is not None else time.time())
+    monday = (moment - timedelta(days=moment.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    return monday.timestamp()
+
+
+class UserAnalytics:
+    """Columnar NumPy mirror of numeric user fields, one row per user"""
+
+    def __init__(self, user_db):
+        self.user_db = user_db
+        self.rows = {}
+        self.size = 0
+        self.user_ids = np.zeros(ANALYTICS_INITIAL_CAPACITY, dtype=np.int64)
+        self.columns = {name: np.zeros(ANALYTICS_INITIAL_CAPACITY, dtype=np.int64) for name in ANALYTICS_FIELDS}
+        self.reload()
+
+        # earned_sp of every row at the start of the week
+        self.week_start = get_week_start()
+        self.week_baseline = np.zeros(len(self.user_ids), dtype=np.int64)
+        self.load_week_baseline()
+        logging.info(f"🔄 Analytics initialization ({self.size} users mirrored)")
+
+    def grow(self, capacity):
+        """Enlarges all columns to at least capacity rows"""
+        new_capacity = len(self.user_ids)
+        while new_capacity < capacity:
+            new_capacity *= 2
+        if new_capacity == len(self.user_ids):
+            return
+
+        def enlarge(column):
+            enlarged = np.zeros(new_capacity, dtype=column.dtype)
+            enlarged[:len(column)] = column
+            return enlarged
+
+        self.user_ids = enlarge(self.user_ids)
+        self.columns = {name: enlarge(column) for name, column in self.columns.items()}
+        if hasattr(self, "week_baseline"):
+            self.week_baseline = enlarge(self.week_baseline)
+
+    def get_row(self, user_id):
+        """Returns user's row, appending a new one if needed"""
+        row = self.rows.get(user_id)
+        if row is None:
+            row = self.size
+            self.grow(row + 1)
+            self.rows[user_id] = row
+            self.user_ids[row] = user_id
+            self.size += 1
+        return row
+
+    def sync_user(self, user_id):
+        """Copies user's numeric fields into the columns"""
+        user_data = self.user_db.get(user_id)
+        if user_data is None:
+            return
+        row = self.get_row(user_id)
+        for name, field in ANALYTICS_FIELDS.items():
+            self.columns[name][row] = int(field(user_data))
+
+    def reload(self):
+        """Rebuilds all columns in one pass (after bulk changes like season reset)"""
+        self.grow(len(self.user_db))
+        for user_id in list(self.user_db):
+            self.sync_user(user_id)
+
+    def column(self, name):
+        """Returns view of column over existing rows"""
+        return self.columns[name][:self.size]
+
+    def count_where(self, name, operator, value):
+        """Returns number of users whose field matches condition"""
+        return int(np.count_nonzero(ANALYTICS_OPERATORS[operator](self.column(name), value)))
+
+    def sum_where(self, name, condition_name, operator, value):
+        """Returns sum of field over users matching condition on another field"""
+        mask = ANALYTICS_OPERATORS[operator](self.column(condition_name), value)
+        return int(self.column(name)[mask].sum())
+
+    def summarize(self, name):
+        """Returns total, mean, min, max and median of field"""
+        column = self.column(name)
+        if not self.size:
+            return {"total": 0, "mean": 0, "min": 0, "max": 0, "median": 0}
+        return {
+            "total": int(column.sum()),
+            "mean": float(column.mean()),
+            "min": int(column.min()),
+            "max": int(column.max()),
+            "median": float(np.median(column))
+        }
+
+    def distribution(self, name, percentiles=(10, 25, 50, 75, 90, 99)):
+        """Returns {percentile: value} of field"""
+        if not self.size:
+            return {percentile: 0 for percentile in percentiles}
+        values = np.percentile(self.column(name), percentiles)
+        return dict(zip(percentiles, values.tolist()))
+
+    def load_week_baseline(self):
+        """Loads start-of-week earned SP of every user"""
+        try:
+            if os.path.exists(ANALYTICS_WEEK_FILE):
+                with np.load(ANALYTICS_WEEK_FILE) as data:
+                    if float(data["week_start"]) == self.week_start:
+                        for user_id, earned in zip(data["user_ids"].tolist(), data["earned_sp"].tolist()):
+                            row = self.rows.get(user_id)
+                            if row is not None:
+                                self.week_baseline[row] = earned
+                        return
+        except Exception as e:
+            logging.error(f"Error loading {ANALYTICS_WEEK_FILE}: {e}")
+        self.start_week(self.week_start)
+
+    def start_week(self, week_start):
+        """Stores current earned SP as the week's baseline"""
+        self.week_start = week_start
+        self.week_baseline[:self.size] = self.column("earned_sp")
+        try:
+            np.savez(
+                ANALYTICS_WEEK_FILE,
+                week_start=week_start,
+                user_ids=self.user_ids[:self.size],
+                earned_sp=self.week_baseline[:self.size]
+            )
+        except Exception as e:
+            logging.error(f"Error saving {ANALYTICS_WEEK_FILE}: {e}")
+
+    def get_sp_minted_this_week(self):
+        """Returns SP earned by all users since Monday"""
+        week_start = get_week_start()
+        if week_start != self.week_start:
+            self.start_week(week_start)
+        # Users who joined this week have zero baseline
+        return int((self.column("earned_sp") - self.week_baseline[:self.size]).sum())
@@ -1,22 +1,49 @@
+import heapq
 import random
 import logging
+import counters
+import events
+from datetime import datetime
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
+from battle_sessions import BattleSessionStore
+from bot_pool import BotOpponentPool, card_power
+from duel import duel_winner, battle_rounds
+from replays import ReplayLog
+
+# Team recommender settings
+RECOMMEND_SAMPLE_SIZE = 100   # Real opponent teams sampled for evaluation
+ARENA_TEAM_SIZE = 5
+BATTLE_HISTORY_SIZE = 5       # Battles listed on "Last Battles" screen
 
 class ArenaSystem:
     def __init__(self, user_db, cards_db, rarity_settings):
         self.user_db = user_db
         self.cards_db = cards_db
         self.rarity_settings = rarity_settings
+        self.sessions = BattleSessionStore()
+        self.card_index = {
+            card["name"]: card
+            for cards in cards_db.values()
+            for card in cards
+        }
+        self.bot_pool = BotOpponentPool(cards_db)
+        self.bot_pool.refill()
+        self.replays = ReplayLog(cards_db)
         logging.info("🔄 Arena system initialization")
 
     def get_card_data(self, card_name):
         """Gets card data by name"""
-        for rarity, cards in self.cards_db.items():
-            for card in cards:
-                if card["name"] == card_name:
-                    return card
-        return None
+        return self.card_index.get(card_name)
+
+    def get_team_power(self, user_data):
+        """Returns total power of user's arena team"""
+        total_power = 0
+        for card_name in user_data.get("arena_team", []):
+            card_data = self.get_card_data(card_name) if card_name else None
+            if card_data:
+                total_power += card_power(card_data)
+        return total_power
 
     def update_arena_team(self, user_data, slot_index, card_name):
         """Updates user's arena team"""
@@ -31,7 +58,132 @@ class ArenaSystem:
             return True
         return False
 
-    def get_real_player_team(self, exclude_user_id):
+    def get_opponent_sample(self, exclude_user_id, limit=RECOMMEND_SAMPLE_SIZE):
+        """Returns opponent teams a player is likely to meet"""
+        teams = []
+        for user_id, user_data in self.user_db.items():
+            if user_id == exclude_user_id:
+                continue
+
+            user_team = user_data.get("arena_team", [])
+            if len(user_team) == ARENA_TEAM_SIZE and all(user_team):
+                team = [self.get_card_data(card_name) for card_name in user_team]
+                if all(team):
+                    teams.append(team)
+
+        if len(teams) > limit:
+            teams = random.sample(teams, limit)
+
+        # Bots are the fallback opponents, so ready bot teams count too
+        for bucket in self.bot_pool.buckets:
+            teams.extend(team for team in bucket if len(team) == ARENA_TEAM_SIZE)
+
+        return teams
+
+    def prune_dominated_cards(self, cards, keep=ARENA_TEAM_SIZE):
+        """Drops cards beaten on both attack and health by at least `keep` other cards"""
+        # Such a card can always be swapped for an unused stronger one without losing a round
+        ordered = sorted(cards, key=lambda card: (-card.get("attack", 0), -card.get("health", 0)))
+        top_healths = []
+        candidates = []
+
+        for card in ordered:
+            health = card.get("health", 0)
+            if len(top_healths) >= keep and top_healths[0] >= health:
+                continue
+
+            candidates.append(card)
+            if len(top_healths) < keep:
+                heapq.heappush(top_healths, health)
+            else:
+                heapq.heapreplace(top_healths, health)
+
+        return candidates
+
+    def best_assignment(self, candidates, scores):
+        """Assigns candidates to slots maximizing total score (DP over filled slots)"""
+        full_mask = (1 << ARENA_TEAM_SIZE) - 1
+        best = [0.0] + [None] * full_mask
+        choices = []
+
+        for row in scores:
+            new_best = best[:]
+            choice = {}
+            for mask in range(full_mask):
+                if best[mask] is None:
+                    continue
+                for slot in range(ARENA_TEAM_SIZE):
+                    bit = 1 << slot
+                    if mask & bit:
+                        continue
+                    value = best[mask] + row[slot]
+                    if new_best[mask | bit] is None or value > new_best[mask | bit]:
+                        new_best[mask | bit] = value
+                        choice[mask | bit] = (mask, slot)
+            best = new_best
+            choices.append(choice)
+
+        # Walk back through the candidates that improved each mask
+        lineup = [None] * ARENA_TEAM_SIZE
+        mask = full_mask
+        for index in range(len(candidates) - 1, -1, -1):
+            if not mask:
+                break
+            if mask in choices[index]:
+                mask, slot = choices[index][mask]
+                lineup[slot] = candidates[index]
+
+        return lineup
+
+    def recommend_team(self, user_data, exclude_user_id):
+        """Picks best 5-card lineup from user's collection
+
+        Returns (card names by slot, expected win rate or None).
+        """
+        owned_cards = {}
+        for cards in user_data["cards"].values():
+            for card_name in cards:
+                card_data = self.get_card_data(card_name)
+                if card_data:
+                    owned_cards[card_name] = card_data
+
+        if len(owned_cards) < ARENA_TEAM_SIZE:
+            return None, None
+
+        candidates = self.prune_dominated_cards(list(owned_cards.values()))
+        opponents = self.get_opponent_sample(exclude_user_id)
+
+        # Tiny power term breaks ties in favour of stronger cards
+        scores = []
+        for card in candidates:
+            tie_break = card_power(card) * 1e-12
+            if opponents:
+                row = []
+                for slot in range(ARENA_TEAM_SIZE):
+                    round_wins = sum(
+                        1 for team in opponents
+                        if duel_winner(card.get("attack", 0), card.get("health", 0),
+                                       team[slot].get("attack", 0), team[slot].get("health", 0)) > 0
+                    )
+                    row.append(round_wins / len(opponents) + tie_break)
+            else:
+                row = [card_power(card)] * ARENA_TEAM_SIZE
+            scores.append(row)
+
+        lineup = self.best_assignment(candidates, scores)
+
+        win_rate = None
+        if opponents:
+            battles_won = 0
+            for team in opponents:
+                wins, enemy_wins = battle_rounds(lineup, team)
+                if wins > enemy_wins:
+                    battles_won += 1
+            win_rate = battles_won / len(opponents)
+
+        return [card["name"] for card in lineup], win_rate
+
+    def get_real_player_team(self, exclude_user_id, power=None):
         """Finds a real player for battle"""
         available_players = []
 
@@ -67,37 +219,11 @@ class ArenaSystem:
         if available_players:
             return random.choice(available_players)
 
-        return self.generate_bot_team()
+        return self.generate_bot_team(power)
 
-    def generate_bot_team(self):
-        """Generates bot team"""
-        bot_team = []
-        all_cards = []
-
-        for rarity in ["Common", "Rare", "Epic", "Legend", "Mythic", "Ultimate"]:
-            if rarity in self.cards_db:
-                all_cards.extend(self.cards_db[rarity])
-
-        if len(all_cards) >= 5:
-            team_cards = random.sample(all_cards, 5)
-        else:
-            team_cards = all_cards * 2
-            team_cards = team_cards[:5]
-
-        for card in team_cards:
-            bot_team.append({
-                "name": card["name"],
-                "attack": card.get("attack", 0),
-                "health": card.get("health", 0)
-            })
-
-        return {
-            "user_id": 0,
-            "username": "Bot Opponent",
-            "team": bot_team,
-            "cups": random.randint(0, 1000),
-            "is_bot": True
-        }
+    def generate_bot_team(self, power=None):
+        """Returns pre-generated bot team matching player power"""
+        return self.bot_pool.draw(power)
 
     async def show_arena_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_data: dict):
         """Shows arena menu"""
@@ -130,6 +256,7 @@ class ArenaSystem:
         buttons = [
             [InlineKeyboardButton("🗂 My Team", callback_data="arena_team")],
             [InlineKeyboardButton("🔍 Find Opponent", callback_data="arena_find")],
+            [InlineKeyboardButton("📜 Last Battles", callback_data="arena_history")],
             [InlineKeyboardButton("🔙 Back", callback_data="back_to_profile")]
         ]
 
@@ -138,7 +265,26 @@ class ArenaSystem:
             reply_markup=InlineKeyboardMarkup(buttons)
         )
 
-    async def show_arena_team(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_data: dict):
+    async def auto_fill_team(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_data: dict):
+        """Fills arena team with recommended lineup"""
+        query = update.callback_query
+        await query.answer()
+
+        lineup, win_rate = self.recommend_team(user_data, query.from_user.id)
+        if not lineup:
+            await query.answer("❌ You need at least 5 different cards", show_alert=True)
+            return
+
+        for slot_index, card_name in enumerate(lineup):
+            self.update_arena_team(user_data, slot_index, card_name)
+
+        note = "🤖 Best team selected!\n"
+        if win_rate is not None:
+            note += f"📈 Expected win rate: {win_rate:.0%}\n"
+
+        await self.show_arena_team(update, context, user_data, note)
+
+    async def show_arena_team(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_data: dict, note: str = ""):
         """Shows user's arena team"""
         query = update.callback_query
         await query.answer()
@@ -153,7 +299,8 @@ class ArenaSystem:
         total_attack = 0
         total_health = 0
 
-        team_text = "🗂 Your Arena Team:\n\n"
+        team_text = f"{note}\n" if note else ""
+        team_text += "🗂 Your Arena Team:\n\n"
         for i, card_name in enumerate(user_team):
             if card_name:
                 card_data = self.get_card_data(card_name)
@@ -179,6 +326,7 @@ class ArenaSystem:
             )])
 
         buttons.extend([
+            [InlineKeyboardButton("🤖 Auto-fill Best Team", callback_data="arena_autofill")],
             [InlineKeyboardButton("🔍 Find Opponent", callback_data="arena_find")],
             [InlineKeyboardButton("🔙 Back", callback_data="arena")]
         ])
@@ -198,7 +346,7 @@ class ArenaSystem:
 
         buttons = []
         for rarity in ["Common", "Rare", "Epic", "Legend", "Mythic", "Ultimate"]:
-            card_count = len(user_data["cards"][rarity])
+            card_count = counters.rarity_count(user_data, rarity)
             if card_count > 0:
                 buttons.append([InlineKeyboardButton(
                     f"{self.rarity_settings[rarity]['emoji']} {rarity} - {card_count} cards",
@@ -264,12 +412,12 @@ class ArenaSystem:
             )
             return
 
-        enemy_data = self.get_real_player_team(update.effective_user.id)
+        enemy_data = self.get_real_player_team(update.effective_user.id, self.get_team_power(user_data))
 
         enemy_total_attack = sum(card['attack'] for card in enemy_data["team"])
         enemy_total_health = sum(card['health'] for card in enemy_data["team"])
 
-        context.user_data["enemy_data"] = enemy_data
+        session = self.sessions.create(update.effective_user.id, enemy_data)
 
         enemy_type = "🤖 Bot" if enemy_data.get("is_bot") else "👤 Player"
         enemy_team_text = f"{enemy_type}: {enemy_data['username']}\n"
@@ -287,23 +435,48 @@ class ArenaSystem:
             f"🎯 Opponent found!\n\n{enemy_team_text}\n"
             "Ready for battle?",
             reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("⚔️ Start Battle", callback_data="battle_attack")],
+                [InlineKeyboardButton("⚔️ Start Battle", callback_data=f"battle_attack_{session.session_id}")],
                 [InlineKeyboardButton("🔙 Back", callback_data="arena_team")]
             ])
         )
 
     # ================== NEW BATTLE METHODS ==================
 
+    def get_battle_session(self, update: Update):
+        """Returns battle session referenced by callback data"""
+        query = update.callback_query
+        session_id = query.data.rsplit("_", 1)[-1]
+        return self.sessions.get(session_id, query.from_user.id)
+
+    async def show_battle_expired(self, update: Update):
+        """Shows message for expired or unknown battle"""
+        query = update.callback_query
+        await query.edit_message_text(
+            "⌛ This battle has expired. Find a new opponent!",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔍 Find Opponent", callback_data="arena_find")],
+                [InlineKeyboardButton("🔙 To Arena", callback_data="arena")]
+            ])
+        )
+
+    def cancel_battle(self, update: Update):
+        """Closes battle session referenced by callback data"""
+        session = self.get_battle_session(update)
+        if session:
+            self.sessions.close(session.session_id)
+
     async def process_battle(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_data: dict):
         """Processes arena battle"""
         query = update.callback_query
         await query.answer()
 
-        user_team = user_data.get("arena_team", [])
-        enemy_data = context.user_data.get("enemy_data", {})
+        session = self.get_battle_session(update)
+        if not session:
+            await self.show_battle_expired(update)
+            return
 
-        if not enemy_data:
-            enemy_data = self.generate_bot_team()
+        user_team = user_data.get("arena_team", [])
+        enemy_data = session.enemy
 
         user_cards_data = []
         for card_name in user_team:
@@ -316,28 +489,25 @@ class ArenaSystem:
                     "max_health": card_data.get("health", 0)
                 })
 
-        context.user_data["battle_data"] = {
-            "user_cards": user_cards_data,
-            "enemy_cards": enemy_data["team"],
-            "current_round": 0,
-            "user_wins": 0,
-            "enemy_wins": 0
-        }
+        session.user_cards = user_cards_data
+        session.enemy_cards = enemy_data["team"]
+        session.current_round = 0
+        session.user_wins = 0
+        session.enemy_wins = 0
 
-        await self.show_round(update, context, user_data)
+        await self.show_round(update, context, user_data, session)
 
-    async def show_round(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_data: dict):
+    async def show_round(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_data: dict, session):
         """Shows current battle round"""
         query = update.callback_query
-        battle_data = context.user_data["battle_data"]
-        current_round = battle_data["current_round"]
+        current_round = session.current_round
 
-        if current_round >= 5 or current_round >= len(battle_data["user_cards"]) or current_round >= len(battle_data["enemy_cards"]):
-            await self.show_battle_result(update, context, user_data)
+        if current_round >= 5 or current_round >= len(session.user_cards) or current_round >= len(session.enemy_cards):
+            await self.show_battle_result(update, context, user_data, session)
             return
 
-        user_card = battle_data["user_cards"][current_round]
-        enemy_card = battle_data["enemy_cards"][current_round]
+        user_card = session.user_cards[current_round]
+        enemy_card = session.enemy_cards[current_round]
 
         user_card["health"] = user_card["max_health"]
         enemy_card["health"] = enemy_card.get("max_health", enemy_card["health"])
@@ -348,7 +518,7 @@ class ArenaSystem:
         round_text += f"🎯 {enemy_card['name']}: ⚔{enemy_card['attack']:,} ❤{enemy_card['health']:,}\n\n"
         round_text += "Ready for battle?"
 
-        context.user_data["current_round_data"] = {
+        session.round_data = {
             "user_card": user_card.copy(),
             "enemy_card": enemy_card.copy(),
             "round_log": [],
@@ -356,8 +526,8 @@ class ArenaSystem:
         }
 
         buttons = [
-            [InlineKeyboardButton("⚔️ Start Round", callback_data="start_round")],
-            [InlineKeyboardButton("🔙 Cancel Battle", callback_data="arena")]
+            [InlineKeyboardButton("⚔️ Start Round", callback_data=f"start_round_{session.session_id}")],
+            [InlineKeyboardButton("🔙 Cancel Battle", callback_data=f"battle_cancel_{session.session_id}")]
         ]
 
         if query:
@@ -370,16 +540,20 @@ class ArenaSystem:
         query = update.callback_query
         await query.answer()
 
-        battle_data = context.user_data["battle_data"]
-        round_data = context.user_data["current_round_data"]
-        current_round = battle_data["current_round"]
+        session = self.get_battle_session(update)
+        if not session or not session.round_data:
+            await self.show_battle_expired(update)
+            return
+
+        round_data = session.round_data
+        current_round = session.current_round
 
         user_card = round_data["user_card"]
         enemy_card = round_data["enemy_card"]
 
         if round_data["round_finished"]:
-            battle_data["current_round"] += 1
-            await self.show_round(update, context, user_data)
+            session.current_round += 1
+            await self.show_round(update, context, user_data, session)
             return
 
         round_log = round_data["round_log"]
@@ -398,7 +572,7 @@ class ArenaSystem:
 
         if enemy_card['health'] <= 0:
             round_log.append(f"💀 {enemy_card['name']} defeated!\n\n")
-            battle_data["user_wins"] += 1
+            session.user_wins += 1
             round_data["round_finished"] = True
         else:
             old_user_health = user_card['health']
@@ -411,7 +585,7 @@ class ArenaSystem:
 
             if user_card['health'] <= 0:
                 round_log.append(f"💀 {user_card['name']} defeated!\n\n")
-                battle_data["enemy_wins"] += 1
+                session.enemy_wins += 1
                 round_data["round_finished"] = True
 
         round_text = "".join(round_log)
@@ -424,44 +598,70 @@ class ArenaSystem:
 
         buttons = []
         if not round_data["round_finished"]:
-            buttons.append([InlineKeyboardButton("⚔️ Continue Battle", callback_data="continue_round")])
+            buttons.append([InlineKeyboardButton("⚔️ Continue Battle", callback_data=f"continue_round_{session.session_id}")])
         else:
             if current_round < 4:
-                buttons.append([InlineKeyboardButton("➡️ Next Round", callback_data="continue_round")])
+                buttons.append([InlineKeyboardButton("➡️ Next Round", callback_data=f"continue_round_{session.session_id}")])
             else:
-                buttons.append([InlineKeyboardButton("🏁 Finish Battle", callback_data="finish_battle")])
+                buttons.append([InlineKeyboardButton("🏁 Finish Battle", callback_data=f"finish_battle_{session.session_id}")])
 
-        buttons.append([InlineKeyboardButton("🔙 Cancel Battle", callback_data="arena")])
+        buttons.append([InlineKeyboardButton("🔙 Cancel Battle", callback_data=f"battle_cancel_{session.session_id}")])
 
         await query.edit_message_text(round_text, reply_markup=InlineKeyboardMarkup(buttons))
 
-    async def show_battle_result(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_data: dict):
+    async def show_battle_result(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_data: dict, session=None):
         """Shows battle result"""
         query = update.callback_query
-        battle_data = context.user_data["battle_data"]
 
-        user_wins = battle_data["user_wins"]
-        enemy_wins = battle_data["enemy_wins"]
+        if session is None:
+            session = self.get_battle_session(update)
+            if not session:
+                await self.show_battle_expired(update)
+                return
+
+        user_wins = session.user_wins
+        enemy_wins = session.enemy_wins
+
+        # Battle is over, free its state before rewarding
+        self.sessions.close(session.session_id)
 
         result_text = "🏁 BATTLE RESULT:\n\n"
         result_text += f"Your wins: {user_wins}\n"
         result_text += f"Opponent wins: {enemy_wins}\n\n"
 
+        # Seed is kept in the replay, so the cups roll can be reproduced
+        seed = random.getrandbits(32)
+        rng = random.Random(seed)
+        cups_change = 0
+
         if user_wins > enemy_wins:
             result_text += "🎉 VICTORY! Your team won!\n"
             user_data["battles_won"] = user_data.get("battles_won", 0) + 1
-            cups_earned = random.randint(1, 20)
+            events.emit("battle_won", session.user_id)
+            cups_earned = rng.randint(1, 20)
             user_data["arena_cups"] = user_data.get("arena_cups", 0) + cups_earned
+            cups_change = cups_earned
             result_text += f"🏆 Cups earned: +{cups_earned}\n"
         elif enemy_wins > user_wins:
             result_text += "💀 DEFEAT! Opponent's team won.\n"
             user_data["battles_lost"] = user_data.get("battles_lost", 0) + 1
-            cups_lost = random.randint(1, 10)
+            cups_lost = rng.randint(1, 10)
             user_data["arena_cups"] = max(0, user_data.get("arena_cups", 0) - cups_lost)
+            cups_change = -cups_lost
             result_text += f"🏆 Cups lost: -{cups_lost}\n"
         else:
             result_text += "🤝 DRAW! Both teams performed well.\n"
 
+        self.replays.append(
+            session.user_id,
+            session.enemy.get("user_id", 0),
+            seed,
+            (user_wins > enemy_wins) - (enemy_wins > user_wins),
+            cups_change,
+            [card["name"] for card in session.user_cards],
+            [card["name"] for card in session.enemy_cards]
+        )
+
         await query.edit_message_text(
             result_text,
             reply_markup=InlineKeyboardMarkup([
@@ -469,3 +669,66 @@ class ArenaSystem:
                 [InlineKeyboardButton("🔙 To Arena", callback_data="arena")]
             ])
         )
+
+    async def show_battle_history(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_data: dict):
+        """Shows user's last battles"""
+        query = update.callback_query
+        await query.answer()
+
+        replays = self.replays.get_user_replays(query.from_user.id, BATTLE_HISTORY_SIZE)
+
+        text = "📜 Last Battles\n\n"
+        if not replays:
+            text += "You haven't fought any battles yet."
+
+        buttons = []
+        outcome_icons = {1: "🎉", -1: "💀", 0: "🤝"}
+        for replay in replays:
+            opponent = self.get_opponent_name(replay["opponent_id"])
+            battle_time = datetime.fromtimestamp(replay["time"]).strftime('%d.%m %H:%M')
+            icon = outcome_icons.get(replay["outcome"], "❓")
+            text += f"{icon} {battle_time} vs {opponent} ({replay['cups_change']:+d} 🏆)\n"
+            buttons.append([InlineKeyboardButton(
+                f"{icon} {battle_time} vs {opponent}",
+                callback_data=f"replay_{replay['segment']}_{replay['record_no']}"
+            )])
+
+        buttons.append([InlineKeyboardButton("🔙 To Arena", callback_data="arena")])
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+
+    async def show_replay(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_data: dict):
+        """Re-renders a recorded battle round by round"""
+        query = update.callback_query
+
+        _, segment, record_no = query.data.split("_")
+        replay = self.replays.read(int(segment), int(record_no))
+        if not replay or replay["user_id"] != query.from_user.id:
+            await query.answer("❌ This replay is no longer available", show_alert=True)
+            return
+
+        await query.answer()
+
+        battle_time = datetime.fromtimestamp(replay["time"]).strftime('%d.%m.%Y %H:%M')
+        text = f"📜 Battle vs {self.get_opponent_name(replay['opponent_id'])}\n"
+        text += f"⏰ {battle_time}\n\n"
+        text += self.replays.render(replay)
+
+        if replay["outcome"] > 0:
+            text += f"\n🎉 VICTORY! Cups: {replay['cups_change']:+d}"
+        elif replay["outcome"] < 0:
+            text += f"\n💀 DEFEAT! Cups: {replay['cups_change']:+d}"
+        else:
+            text += "\n🤝 DRAW!"
+
+        await query.edit_message_text(
+            text,
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔙 Last Battles", callback_data="arena_history")]
+            ])
+        )
+
+    def get_opponent_name(self, opponent_id):
+        """Returns opponent display name for replays"""
+        if opponent_id and opponent_id in self.user_db:
+            return self.user_db[opponent_id].get("username") or f"Player {opponent_id}"
+        return "Bot Opponent"
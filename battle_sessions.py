@@ -0,0 +1,122 @@
+import time
+import secrets
+import logging
+from collections import OrderedDict
+
+# Default limits for arena battle sessions
+BATTLE_SESSION_TTL = 15 * 60      # 15 minutes of inactivity
+MAX_BATTLE_SESSIONS = 5000        # Hard cap on live sessions
+
+
+class BattleSession:
+    """State of one arena battle"""
+    __slots__ = (
+        "session_id", "user_id", "enemy", "user_cards", "enemy_cards",
+        "current_round", "user_wins", "enemy_wins", "round_data", "expires_at"
+    )
+
+    def __init__(self, session_id, user_id, enemy, expires_at):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.enemy = enemy
+        self.user_cards = []
+        self.enemy_cards = []
+        self.current_round = 0
+        self.user_wins = 0
+        self.enemy_wins = 0
+        self.round_data = None
+        self.expires_at = expires_at
+
+
+class BattleSessionStore:
+    """Bounded store of battle sessions with TTL and LRU eviction"""
+
+    def __init__(self, ttl=BATTLE_SESSION_TTL, max_sessions=MAX_BATTLE_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # Ordered from least to most recently used
+        self.sessions = OrderedDict()
+        self.user_sessions = {}
+        self.created_count = 0
+        self.expired_count = 0
+        self.evicted_count = 0
+        logging.info(f"🔄 Battle session store initialization (ttl={ttl}s, max={max_sessions})")
+
+    def _new_session_id(self):
+        """Generates short session ID for callback data"""
+        session_id = secrets.token_hex(4)
+        while session_id in self.sessions:
+            session_id = secrets.token_hex(4)
+        return session_id
+
+    def _remove(self, session_id):
+        """Removes session and its user link"""
+        session = self.sessions.pop(session_id, None)
+        if session and self.user_sessions.get(session.user_id) == session_id:
+            del self.user_sessions[session.user_id]
+        return session
+
+    def create(self, user_id, enemy):
+        """Creates new session, replacing user's previous one"""
+        self.purge_expired()
+
+        old_session_id = self.user_sessions.get(user_id)
+        if old_session_id:
+            self._remove(old_session_id)
+
+        # Evict least recently used sessions when cap is reached
+        while len(self.sessions) >= self.max_sessions:
+            self._remove(next(iter(self.sessions)))
+            self.evicted_count += 1
+
+        session_id = self._new_session_id()
+        session = BattleSession(session_id, user_id, enemy, time.time() + self.ttl)
+        self.sessions[session_id] = session
+        self.user_sessions[user_id] = session_id
+        self.created_count += 1
+        return session
+
+    def get(self, session_id, user_id):
+        """Returns live session owned by user or None"""
+        session = self.sessions.get(session_id)
+        if not session or session.user_id != user_id:
+            return None
+
+        current_time = time.time()
+        if session.expires_at <= current_time:
+            self._remove(session_id)
+            self.expired_count += 1
+            return None
+
+        session.expires_at = current_time + self.ttl
+        self.sessions.move_to_end(session_id)
+        return session
+
+    def close(self, session_id):
+        """Closes finished or cancelled session"""
+        return self._remove(session_id) is not None
+
+    def purge_expired(self):
+        """Removes expired sessions, returns removed count"""
+        # Every access refreshes expiry by the same TTL, so expiry order matches LRU order
+        current_time = time.time()
+        removed = 0
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if session.expires_at > current_time:
+                break
+            self._remove(session.session_id)
+            removed += 1
+
+        self.expired_count += removed
+        return removed
+
+    def get_stats(self):
+        """Returns session store statistics"""
+        return {
+            "live_sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "created": self.created_count,
+            "expired": self.expired_count,
+            "evicted": self.evicted_count
+        }
@@ -0,0 +1,142 @@
+import struct
+from array import array
+from bisect import bisect_left
+
+# Roaring-style bitmap of non-negative ints: values are split by their high
+# 16 bits into containers, sparse containers are sorted uint16 arrays and
+# dense ones are 8 KB bitsets
+ARRAY_CONTAINER_LIMIT = 4096
+BITSET_BYTES = 1 << 13
+
+# container key, kind (0 = array, 1 = bitset), payload bytes
+CONTAINER_HEADER = struct.Struct("<IBI")
+
+
+def bitset_count(bitset):
+    """Returns number of set bits in bitset container"""
+    return bin(int.from_bytes(bitset, "little")).count("1")
+
+
+class RoaringBitmap:
+    """Compressed set of dense user indexes"""
+
+    __slots__ = ("containers",)
+
+    def __init__(self, values=()):
+        self.containers = {}
+        for value in values:
+            self.add(value)
+
+    def add(self, value):
+        """Adds value, returns True if it was not present"""
+        high, low = value >> 16, value & 0xFFFF
+        container = self.containers.get(high)
+        if container is None:
+            self.containers[high] = array("H", [low])
+            return True
+
+        if isinstance(container, bytearray):
+            mask = 1 << (low & 7)
+            if container[low >> 3] & mask:
+                return False
+            container[low >> 3] |= mask
+            return True
+
+        position = bisect_left(container, low)
+        if position < len(container) and container[position] == low:
+            return False
+        container.insert(position, low)
+        if len(container) > ARRAY_CONTAINER_LIMIT:
+            bitset = bytearray(BITSET_BYTES)
+            for item in container:
+                bitset[item >> 3] |= 1 << (item & 7)
+            self.containers[high] = bitset
+        return True
+
+    def discard(self, value):
+        """Removes value, returns True if it was present"""
+        high, low = value >> 16, value & 0xFFFF
+        container = self.containers.get(high)
+        if container is None:
+            return False
+
+        if isinstance(container, bytearray):
+            mask = 1 << (low & 7)
+            if not container[low >> 3] & mask:
+                return False
+            container[low >> 3] &= ~mask
+            if not any(container):
+                del self.containers[high]
+            return True
+
+        position = bisect_left(container, low)
+        if position == len(container) or container[position] != low:
+            return False
+        del container[position]
+        if not container:
+            del self.containers[high]
+        return True
+
+    def __contains__(self, value):
+        container = self.containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(container, bytearray):
+            return bool(container[low >> 3] & (1 << (low & 7)))
+        position = bisect_left(container, low)
+        return position < len(container) and container[position] == low
+
+    def __len__(self):
+        return sum(
+            bitset_count(container) if isinstance(container, bytearray) else len(container)
+            for container in self.containers.values()
+        )
+
+    def __iter__(self):
+        for high in sorted(self.containers):
+            container = self.containers[high]
+            base = high << 16
+            if isinstance(container, bytearray):
+                for byte_index, byte in enumerate(container):
+                    while byte:
+                        bit = byte & -byte
+                        yield base + (byte_index << 3) + bit.bit_length() - 1
+                        byte ^= bit
+            else:
+                for low in container:
+                    yield base + low
+
+    def copy(self):
+        """Returns independent copy of bitmap"""
+        bitmap = RoaringBitmap()
+        bitmap.containers = {high: container[:] for high, container in self.containers.items()}
+        return bitmap
+
+    def to_bytes(self):
+        """Serializes bitmap"""
+        parts = []
+        for high in sorted(self.containers):
+            container = self.containers[high]
+            payload = bytes(container) if isinstance(container, bytearray) else container.tobytes()
+            parts.append(CONTAINER_HEADER.pack(high, isinstance(container, bytearray), len(payload)))
+            parts.append(payload)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Deserializes bitmap written by to_bytes"""
+        bitmap = cls()
+        offset = 0
+        while offset < len(data):
+            high, is_bitset, size = CONTAINER_HEADER.unpack_from(data, offset)
+            offset += CONTAINER_HEADER.size
+            payload = data[offset:offset + size]
+            offset += size
+            if is_bitset:
+                bitmap.containers[high] = bytearray(payload)
+            else:
+                container = array("H")
+                container.frombytes(payload)
+                bitmap.containers[high] = container
+        return bitmap
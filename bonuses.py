@@ -3,16 +3,72 @@ import time
 import json
 import os
 import random
+import bisect
+import counters
+from seasons import add_sp
+from card_grants import grant_cards
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 
+MILESTONES_FILE = "milestones.json"
+BONUS_FLUSH_INTERVAL = 60         # Seconds between deferred saves of claimed milestones
+
+# Money given with bonus cards
+MONEY_RANGES = {
+    "Common": {"min": 50, "max": 125},
+    "Rare": {"min": 175, "max": 500},
+    "Epic": {"min": 500, "max": 5000},
+    "Legend": {"min": 6000, "max": 100000},
+    "Mythic": {"min": 200000, "max": 500000},
+    "Ultimate": {"min": 0, "max": 0}
+}
+
+# Written to milestones.json on first start, edit the file to change thresholds
+DEFAULT_CARD_MILESTONES = [
+    {"required": 10, "cards_reward": 5, "shards_reward": 5},
+    {"required": 50, "cards_reward": 10, "shards_reward": 10},
+    {"required": 100, "cards_reward": 15, "shards_reward": 20},
+    {"required": 350, "cards_reward": 20, "shards_reward": 50},
+    {"required": 500, "cards_reward": 50, "shards_reward": 100},
+    {"required": 1000, "cards_reward": 100, "shards_reward": 200}
+]
+
 class BonusSystem:
     def __init__(self, user_db, cards_db, rarity_settings):
         self.user_db = user_db
         self.cards_db = cards_db
         self.rarity_settings = rarity_settings
+
+        # Sorted thresholds with prefix sums of rewards, so any range of milestones is O(1)
+        self.milestones = sorted(self.load_milestones(), key=lambda milestone: milestone["required"])
+        self.thresholds = [milestone["required"] for milestone in self.milestones]
+        self.cards_prefix = [0]
+        self.shards_prefix = [0]
+        for milestone in self.milestones:
+            self.cards_prefix.append(self.cards_prefix[-1] + milestone.get("cards_reward", 0))
+            self.shards_prefix.append(self.shards_prefix[-1] + milestone.get("shards_reward", 0))
+
         self.bonus_data = self.load_bonus_data()
-        logging.info("🔄 Bonus system initialization")
+        self.dirty = False
+        self.migrate_bonus_data()
+        logging.info(f"🔄 Bonus system initialization ({len(self.milestones)} milestones)")
+
+    def load_milestones(self):
+        """Loads card count milestones, creating default file if missing"""
+        if not os.path.exists(MILESTONES_FILE):
+            try:
+                with open(MILESTONES_FILE, "w", encoding="utf-8") as f:
+                    json.dump(DEFAULT_CARD_MILESTONES, f, indent=2)
+            except Exception as e:
+                logging.error(f"Error saving {MILESTONES_FILE}: {e}")
+            return DEFAULT_CARD_MILESTONES
+
+        try:
+            with open(MILESTONES_FILE, "r", encoding="utf-8") as f:
+                return [milestone for milestone in json.load(f) if "required" in milestone]
+        except Exception as e:
+            logging.error(f"Error loading {MILESTONES_FILE}: {e}")
+            return DEFAULT_CARD_MILESTONES
 
     def load_bonus_data(self):
         """Loads bonus data"""
@@ -30,50 +86,57 @@ class BonusSystem:
         try:
             with open("bonus_data.json", "w", encoding="utf-8") as f:
                 json.dump(self.bonus_data, f, indent=2, ensure_ascii=False)
+            self.dirty = False
         except Exception as e:
             logging.error(f"Error saving bonus_data.json: {e}")
 
+    def flush(self):
+        """Saves claimed milestones if they changed since last save"""
+        if self.dirty:
+            self.save_bonus_data()
+
+    async def flush_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """Deferred save of claimed milestones (JobQueue callback)"""
+        self.flush()
+
+    def migrate_bonus_data(self):
+        """Converts old per-milestone flags into a claimed-up-to threshold"""
+        for user_id_str, user_bonus_data in self.bonus_data.items():
+            if "claimed_up_to" in user_bonus_data:
+                continue
+            # Highest claimed flag wins, so nothing already paid can be claimed again
+            claimed = [int(key[10:]) for key, value in user_bonus_data.items() if key.startswith("milestone_") and value]
+            self.bonus_data[user_id_str] = {"claimed_up_to": max(claimed, default=0)}
+            self.dirty = True
+        self.flush()
+
+    def get_milestone_range(self, user_id: int):
+        """Returns (next unclaimed, first unreached) milestone indexes and total cards"""
+        total_cards = self.get_total_cards_count(user_id)
+        claimed_up_to = self.bonus_data.get(str(user_id), {}).get("claimed_up_to", 0)
+        next_index = bisect.bisect_right(self.thresholds, claimed_up_to)
+        reached_index = bisect.bisect_right(self.thresholds, total_cards)
+        return next_index, max(next_index, reached_index), total_cards
+
     def get_total_cards_count(self, user_id: int):
         """Returns total number of cards received"""
-        user_data = self.user_db[user_id]
-        total_cards = sum(len(cards) for cards in user_data["cards"].values())
-        # Add duplicates for accurate count
-        duplicates = sum(user_data.get("duplicates", {}).values())
-        return total_cards + duplicates
-
-    def get_card_milestones(self):
-        """Returns milestones for bonuses"""
-        return [
-            {"required": 10, "cards_reward": 5, "shards_reward": 5, "claimed": False},
-            {"required": 50, "cards_reward": 10, "shards_reward": 10, "claimed": False},
-            {"required": 100, "cards_reward": 15, "shards_reward": 20, "claimed": False},
-            {"required": 350, "cards_reward": 20, "shards_reward": 50, "claimed": False},
-            {"required": 500, "cards_reward": 50, "shards_reward": 100, "claimed": False},
-            {"required": 1000, "cards_reward": 100, "shards_reward": 200, "claimed": False}
-        ]
+        # Duplicates are counted too, and spending them on crafts doesn't lower the count
+        return counters.total_pulls(self.user_db[user_id])
 
     def get_user_milestones(self, user_id: int):
         """Returns milestones with user progress"""
-        total_cards = self.get_total_cards_count(user_id)
-        user_bonus_data = self.bonus_data.get(str(user_id), {})
-        milestones = self.get_card_milestones()
-
-        user_milestones = []
-        for milestone in milestones:
-            milestone_id = f"milestone_{milestone['required']}"
-            claimed = user_bonus_data.get(milestone_id, False)
-            completed = total_cards >= milestone["required"]
-
-            user_milestones.append({
+        next_index, reached_index, total_cards = self.get_milestone_range(user_id)
+        return [
+            {
                 "required": milestone["required"],
-                "cards_reward": milestone["cards_reward"],
-                "shards_reward": milestone["shards_reward"],
+                "cards_reward": milestone.get("cards_reward", 0),
+                "shards_reward": milestone.get("shards_reward", 0),
                 "current": total_cards,
-                "completed": completed,
-                "claimed": claimed
-            })
-
-        return user_milestones
+                "completed": index < reached_index,
+                "claimed": index < next_index
+            }
+            for index, milestone in enumerate(self.milestones)
+        ]
 
     async def show_bonuses_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
         """Shows bonus menu for attempts"""
@@ -104,7 +167,7 @@ class BonusSystem:
             text += f"{progress_text}\n{reward_text}\n➖➖➖➖➖➖\n"
 
         # Add current progress information
-        total_cards = self.get_total_cards_count(user_id)
+        total_cards = milestones[0]["current"] if milestones else self.get_total_cards_count(user_id)
         text += f"\n📊 Total cards received: {total_cards}"
 
         # Show current balances
@@ -125,41 +188,29 @@ class BonusSystem:
     async def claim_available_bonuses(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
         """Gives all available bonuses"""
         query = update.callback_query
-        await query.answer()
 
         user_data = self.user_db[user_id]
-        milestones = self.get_user_milestones(user_id)
-        user_id_str = str(user_id)
-
-        if user_id_str not in self.bonus_data:
-            self.bonus_data[user_id_str] = {}
-
-        total_cards_reward = 0
-        total_shards_reward = 0
-        claimed_milestones = 0
-
-        for milestone in milestones:
-            if milestone["completed"] and not milestone["claimed"]:
-                total_cards_reward += milestone["cards_reward"]
-                total_shards_reward += milestone["shards_reward"]
-                claimed_milestones += 1
-
-                # Mark milestone as claimed
-                milestone_id = f"milestone_{milestone['required']}"
-                self.bonus_data[user_id_str][milestone_id] = True
+        next_index, reached_index, _ = self.get_milestone_range(user_id)
+        claimed_milestones = reached_index - next_index
 
         if claimed_milestones == 0:
             await query.answer("❌ No available rewards to claim!", show_alert=True)
             return
 
+        await query.answer()
+
+        # All reached milestones at once: rewards are prefix sum differences
+        total_cards_reward = self.cards_prefix[reached_index] - self.cards_prefix[next_index]
+        total_shards_reward = self.shards_prefix[reached_index] - self.shards_prefix[next_index]
+        self.bonus_data[str(user_id)] = {"claimed_up_to": self.thresholds[reached_index - 1]}
+        self.dirty = True
+
         # ✅ FIXED: Give rewards to CORRECT fields
         # Attempts go to cards_today (this is what user sees as "attempts")
         user_data["cards_today"] = user_data.get("cards_today", 0) + total_cards_reward
         # Shards go to shards
         user_data["shards"] = user_data.get("shards", 0) + total_shards_reward
 
-        self.save_bonus_data()
-
         text = (
             f"🎉 Rewards claimed!\n\n"
             f"📦 Received for {claimed_milestones} achievements:\n"
@@ -185,48 +236,21 @@ class BonusSystem:
         # Can add additional logic if needed
         pass
 
-    async def give_bonus_card(self, user_id: int, rarity: str = None):
-        """Gives bonus card (ignores cooldown)"""
-        user_data = self.user_db[user_id]
-
-        if not rarity:
-            valid_rarities = [r for r, s in self.rarity_settings.items() if s["chance"] > 0 and r != "Ultimate"]
-            weights = [self.rarity_settings[r]["chance"] for r in valid_rarities]
-            rarity = random.choices(valid_rarities, weights=weights, k=1)[0]
-
-        card = random.choice(self.cards_db[rarity])
-
-        # ✅ IGNORE COOLDOWN FOR BONUSES
-        is_new = card["name"] not in user_data["cards"][rarity]
+    def give_bonus_cards(self, user_id: int, count: int, rarity: str = None):
+        """Gives count bonus cards in one batch (ignores cooldown), returns grant summary"""
+        return grant_cards(self.user_db[user_id], self.cards_db, self.rarity_settings, MONEY_RANGES, count, rarity)
 
-        if is_new:
-            user_data["cards"][rarity].add(card["name"])
-        else:
-            # Add duplicates but don't show user
-            user_data["duplicates"][rarity] = user_data["duplicates"].get(rarity, 0) + 1
-            shards_per_duplicate = {"Common": 1, "Rare": 2, "Epic": 3, "Legend": 5, "Mythic": 10}
-            user_data["shards"] = user_data.get("shards", 0) + shards_per_duplicate.get(rarity, 1)
-
-        card_sp = card.get("value", 0)
-        user_data["total_sp"] += card_sp
-
-        money_range = self.get_money_range(rarity)
-        card_money = random.randint(money_range["min"], money_range["max"])
-        user_data["money"] += card_money
-
-        return card, is_new
+    def give_bonus_card(self, user_id: int, rarity: str = None):
+        """Gives bonus card (ignores cooldown), returns (card, rarity, is_new) or None if no card could be drawn"""
+        summary = self.give_bonus_cards(user_id, 1, rarity)
+        if summary["best"] is None:
+            return None
+        card_rarity, card = summary["best"]
+        return card, card_rarity, bool(summary["new_cards"])
 
     def get_money_range(self, rarity: str):
         """Returns money range for rarity"""
-        money_ranges = {
-            "Common": {"min": 50, "max": 125},
-            "Rare": {"min": 175, "max": 500},
-            "Epic": {"min": 500, "max": 5000},
-            "Legend": {"min": 6000, "max": 100000},
-            "Mythic": {"min": 200000, "max": 500000},
-            "Ultimate": {"min": 0, "max": 0}
-        }
-        return money_ranges.get(rarity, {"min": 50, "max": 125})
+        return MONEY_RANGES.get(rarity, {"min": 50, "max": 125})
 
     async def claim_daily_bonus(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
         """Gives daily bonus with card (ignores cooldown)"""
@@ -241,21 +265,28 @@ class BonusSystem:
             return
 
         # Give bonus
-        user_data["total_sp"] += 1000
+        add_sp(user_data, 1000)
         user_data["last_bonus_time"] = time.time()
 
         # ✅ FIXED: Use new function to give card without cooldown
-        card, is_new = self.give_bonus_card(user_id)
+        bonus_card = self.give_bonus_card(user_id)
 
         # Show result
+        if bonus_card:
+            card, rarity, is_new = bonus_card
+            card_text = (
+                f"• 1 random card\n\n"
+                f"📦 Card: {self.rarity_settings[rarity]['emoji']} {card['name']}\n"
+                f"⭐ Rarity: {rarity}\n"
+                f"💎 Value: {card.get('value', 0):,} SP\n\n"
+            )
+        else:
+            card_text = "\n❌ No cards available to draw right now\n\n"
         text = (
             f"🎉 Daily bonus received!\n\n"
             f"🎁 You received:\n"
             f"• 1,000 SP\n"
-            f"• 1 random card\n\n"
-            f"📦 Card: {self.rarity_settings[card['rarity']]['emoji']} {card['name']}\n"
-            f"⭐ Rarity: {card['rarity']}\n"
-            f"💎 Value: {card.get('value', 0):,} SP\n\n"
+            f"{card_text}"
             f"✅ Bonus saved!\n"
             f"⏰ Next one in 24 hours"
         )
@@ -268,15 +299,19 @@ class BonusSystem:
         )
 
     async def give_promo_code_reward(self, user_id: int, reward_type: str = "card"):
-        """Gives promo code reward (ignores cooldown)"""
+        """Gives promo code reward (ignores cooldown), returns None if it could not be given"""
         user_data = self.user_db[user_id]
 
         if reward_type == "card":
             # ✅ IGNORE COOLDOWN: give card without checking
-            card, is_new = self.give_bonus_card(user_id)
+            bonus_card = self.give_bonus_card(user_id)
+            if bonus_card is None:
+                return None
+            card, rarity, is_new = bonus_card
             return {
                 "type": "card",
                 "card": card,
+                "rarity": rarity,
                 "is_new": is_new,
                 "sp": card.get("value", 0),
                 "money": random.randint(100, 500)
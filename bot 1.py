@@ -8,7 +8,14 @@ import time
 import asyncio
 import importlib
 import re
+import counters
+import events
+import epochs
 from collections import defaultdict
+from seasons import add_sp
+from card_grants import grant_cards, format_grant_summary
+from promo_campaigns import CAMPAIGN_MAX_CODES
+from promo_codes import PromoCodeSystem, PROMO_PAGE_SIZE, PROMO_SWEEP_INTERVAL, PROMO_JOURNAL_FLUSH_INTERVAL
 from telegram import (
     Update,
     InlineKeyboardMarkup,
@@ -63,6 +70,7 @@ MONEY_RANGES = {
 # Cooldown in seconds (2 hours) and cards before cooldown
 COOLDOWN_TIME = 2 * 60 * 60  # 2 hours
 CARDS_BEFORE_COOLDOWN = 3     # 3 cards before cooldown activation
+MULTI_PULL_SIZE = 10          # Cards drawn by "Get ×10"
 
 # ================== DATA ==================
 def load_data():
@@ -118,6 +126,7 @@ def load_data():
             logging.info(f"   🧬 {recipe.get('name', 'UNNAMED')} - Preview: {recipe.get('preview', 'NO')}")
 
 load_data()
+CATALOG_COUNTS = counters.count_catalog(CARDS_DB)
 
 # ================== DATABASE ==================
 user_db = defaultdict(lambda: {
@@ -141,8 +150,7 @@ user_db = defaultdict(lambda: {
     # NEW FIELDS FOR ARENA AND PROMO CODES
     "last_arena_battle": 0,
     "arena_battles_today": 0,
-    "last_arena_reset": time.time(),
-    "used_promo_codes": set()
+    "arena_day": epochs.day_epoch()
 })
 
 def save_user_data():
@@ -169,8 +177,10 @@ def save_user_data():
                 # New fields
                 "last_arena_battle": user_data.get("last_arena_battle", 0),
                 "arena_battles_today": user_data.get("arena_battles_today", 0),
-                "last_arena_reset": user_data.get("last_arena_reset", time.time()),
-                "used_promo_codes": list(user_data.get("used_promo_codes", set()))
+                "arena_day": user_data.get("arena_day", epochs.day_epoch()),
+                "total_pulls": counters.total_pulls(user_data),
+                "season_sp": user_data.get("season_sp", 0),
+                "earned_sp": user_data.get("earned_sp", 0)
             }
             for user_id, user_data in user_db.items()
         }
@@ -194,8 +204,6 @@ def load_user_data():
                         user_data["arena_battles_today"] = 0
                     if "last_arena_reset" not in user_data:
                         user_data["last_arena_reset"] = time.time()
-                    if "used_promo_codes" not in user_data:
-                        user_data["used_promo_codes"] = []
                     
                     user_db[user_id] = {
                         "cards": defaultdict(set, {k: set(v) for k, v in user_data.get("cards", {}).items()}),
@@ -218,9 +226,17 @@ def load_user_data():
                         # New fields
                         "last_arena_battle": user_data.get("last_arena_battle", 0),
                         "arena_battles_today": user_data.get("arena_battles_today", 0),
-                        "last_arena_reset": user_data.get("last_arena_reset", time.time()),
-                        "used_promo_codes": set(user_data.get("used_promo_codes", []))
+                        # Old accounts kept the time of the last 24h window reset instead
+                        "arena_day": user_data.get("arena_day", epochs.day_epoch(user_data["last_arena_reset"])),
+                        "season_sp": user_data.get("season_sp", 0),
+                        "earned_sp": user_data.get("earned_sp", 0)
                     }
+                    if "total_pulls" in user_data:
+                        user_db[user_id]["total_pulls"] = user_data["total_pulls"]
+                    # Moved into promo usage bitmaps by PromoCodeSystem.migrate_user_sets
+                    if user_data.get("used_promo_codes"):
+                        user_db[user_id]["used_promo_codes"] = user_data["used_promo_codes"]
+                    counters.backfill_counters(user_db[user_id])
     except Exception as e:
         logging.error(f"Error loading user data: {str(e)}")
 
@@ -286,201 +302,8 @@ class OneDriveHelper:
             return shared_url
 
 # ================== PROMO CODE SYSTEM ==================
-class PromoCodeSystem:
-    def __init__(self, user_db):
-        self.user_db = user_db
-        self.promo_codes_file = "promo_codes.json"
-        self.load_promo_codes()
-    
-    def load_promo_codes(self):
-        """Loads promo codes from file"""
-        if not os.path.exists(self.promo_codes_file):
-            self.promo_codes = {}
-            self.save_promo_codes()
-            return
-        
-        try:
-            with open(self.promo_codes_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                self.promo_codes = data
-        except Exception as e:
-            logging.error(f"Error loading promo codes: {e}")
-            self.promo_codes = {}
-    
-    def save_promo_codes(self):
-        """Saves promo codes to file"""
-        try:
-            with open(self.promo_codes_file, "w", encoding="utf-8") as f:
-                json.dump(self.promo_codes, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logging.error(f"Error saving promo codes: {e}")
-    
-    def create_promo_code(self, code: str, rewards: dict, 
-                         max_uses: int = None, 
-                         expires_in_hours: int = None,
-                         is_active: bool = True):
-        """Creates a new promo code"""
-        expires_at = None
-        if expires_in_hours:
-            expires_at = time.time() + (expires_in_hours * 3600)
-        
-        self.promo_codes[code.upper()] = {
-            "rewards": rewards,
-            "max_uses": max_uses,
-            "uses_count": 0,
-            "expires_at": expires_at,
-            "is_active": is_active,
-            "created_at": time.time()
-        }
-        self.save_promo_codes()
-        logging.info(f"✅ Promo code created: {code}")
-    
-    def deactivate_promo_code(self, code: str):
-        """Deactivates promo code"""
-        if code.upper() in self.promo_codes:
-            self.promo_codes[code.upper()]["is_active"] = False
-            self.save_promo_codes()
-            return True
-        return False
-    
-    def activate_promo_code(self, code: str):
-        """Activates promo code"""
-        if code.upper() in self.promo_codes:
-            self.promo_codes[code.upper()]["is_active"] = True
-            self.save_promo_codes()
-            return True
-        return False
-    
-    def delete_promo_code(self, code: str):
-        """Deletes promo code"""
-        if code.upper() in self.promo_codes:
-            del self.promo_codes[code.upper()]
-            self.save_promo_codes()
-            return True
-        return False
-    
-    def edit_promo_code(self, code: str, param: str, value):
-        """Edits promo code parameters"""
-        if code.upper() not in self.promo_codes:
-            return False
-        
-        promo = self.promo_codes[code.upper()]
-        
-        if param == "max_uses":
-            promo["max_uses"] = int(value) if value.lower() != "none" else None
-        elif param == "expires_hours":
-            if value.lower() == "none":
-                promo["expires_at"] = None
-            else:
-                promo["expires_at"] = time.time() + (int(value) * 3600)
-        elif param == "is_active":
-            promo["is_active"] = value.lower() == "true"
-        else:
-            return False
-        
-        self.save_promo_codes()
-        return True
-    
-    def check_promo_code(self, code: str, user_id: int):
-        """Checks promo code for user"""
-        code = code.upper()
-        
-        if code not in self.promo_codes:
-            return {"success": False, "message": "❌ Promo code not found"}
-        
-        promo = self.promo_codes[code]
-        
-        # Check activity
-        if not promo.get("is_active", True):
-            return {"success": False, "message": "❌ Promo code is not active"}
-        
-        # Check expiration
-        if promo.get("expires_at") and time.time() > promo["expires_at"]:
-            return {"success": False, "message": "❌ Promo code has expired"}
-        
-        # Check usage limit
-        if promo.get("max_uses") and promo.get("uses_count", 0) >= promo["max_uses"]:
-            return {"success": False, "message": "❌ Promo code usage limit reached"}
-        
-        # Check reuse
-        if user_id in self.user_db and code in self.user_db[user_id].get("used_promo_codes", set()):
-            return {"success": False, "message": "❌ You have already used this promo code"}
-        
-        return {"success": True, "promo": promo}
-    
-    def apply_promo_code(self, code: str, user_id: int):
-        """Applies promo code for user"""
-        check_result = self.check_promo_code(code, user_id)
-        if not check_result["success"]:
-            return check_result
-        
-        promo = check_result["promo"]
-        user_data = self.user_db[user_id]
-        rewards = promo["rewards"]
-        
-        # Give rewards
-        reward_text = "🎁 Rewards received:\n"
-        
-        if "money" in rewards:
-            user_data["money"] += rewards["money"]
-            reward_text += f"💰 Money: +{rewards['money']:,}\n"
-        
-        if "sp" in rewards:
-            user_data["total_sp"] += rewards["sp"]
-            reward_text += f"💎 SP: +{rewards['sp']:,}\n"
-        
-        if "cards_today" in rewards:
-            user_data["cards_today"] += rewards["cards_today"]
-            reward_text += f"🎴 Attempts: +{rewards['cards_today']}\n"
-        
-        if "arena_battles" in rewards:
-            user_data["arena_battles_today"] = max(0, user_data.get("arena_battles_today", 0) - rewards["arena_battles"])
-            reward_text += f"⚔️ Arena battles: +{rewards['arena_battles']}\n"
-        
-        if "shards" in rewards:
-            user_data["shards"] += rewards["shards"]
-            reward_text += f"🀄️ Shards: +{rewards['shards']}\n"
-        
-        # Add cards if specified
-        if "cards" in rewards:
-            for rarity, card_names in rewards["cards"].items():
-                for card_name in card_names:
-                    if card_name not in user_data["cards"][rarity]:
-                        user_data["cards"][rarity].add(card_name)
-                        reward_text += f"🃏 New card: {card_name} ({rarity})\n"
-        
-        # Update promo code statistics
-        self.promo_codes[code.upper()]["uses_count"] += 1
-        user_data["used_promo_codes"].add(code.upper())
-        
-        self.save_promo_codes()
-        
-        return {
-            "success": True, 
-            "message": f"✅ Promo code activated!\n\n{reward_text}"
-        }
-    
-    def get_promo_stats(self):
-        """Returns promo code statistics"""
-        active_codes = {code: data for code, data in self.promo_codes.items() 
-                       if data.get("is_active", True)}
-        
-        return {
-            "total_codes": len(self.promo_codes),
-            "active_codes": len(active_codes),
-            "details": active_codes
-        }
-    
-    def get_promo_info(self, code: str):
-        """Returns detailed info about specific promo code"""
-        code = code.upper()
-        if code not in self.promo_codes:
-            return None
-        
-        return self.promo_codes[code]
-
-# Initialize promo code system
 promo_system = PromoCodeSystem(user_db)
+atexit.register(promo_system.flush)
 logging.info("✅ Promo code system initialized")
 
 # ================== ARENA FUNCTIONS ==================
@@ -488,10 +311,8 @@ def check_arena_availability(user_data):
     """Checks arena availability for user"""
     current_time = time.time()
     
-    # Reset daily counter if a day has passed
-    if current_time - user_data["last_arena_reset"] >= 24 * 60 * 60:
-        user_data["arena_battles_today"] = 0
-        user_data["last_arena_reset"] = current_time
+    # Daily counter resets lazily on first check of a new day
+    epochs.roll(user_data, "arena_day", epochs.day_epoch(current_time), ["arena_battles_today"])
     
     # Check cooldown
     time_since_last_battle = current_time - user_data["last_arena_battle"]
@@ -506,7 +327,8 @@ def check_arena_availability(user_data):
         "available": is_available,
         "cooldown_remaining": max(0, cooldown_remaining),
         "battles_remaining": max(0, battles_remaining),
-        "battles_used": user_data["arena_battles_today"]
+        "battles_used": user_data["arena_battles_today"],
+        "reset_in": epochs.seconds_until_next("daily", current_time)
     }
 
 def is_arena_team_complete(user_data):
@@ -576,14 +398,26 @@ except Exception as e:
     logging.error(f"❌ Rating initialization error: {e}")
     rating_system = None
 
+try:
+    from analytics import UserAnalytics
+    user_analytics = UserAnalytics(user_db)
+    logging.info("✅ Analytics initialized")
+except Exception as e:
+    logging.error(f"❌ Analytics initialization error: {e}")
+    user_analytics = None
+
 try:
     from referral import ReferralSystem
     referral_system = ReferralSystem(user_db)
+    atexit.register(referral_system.guard.flush)
     logging.info("✅ Referral system initialized")
 except Exception as e:
     logging.error(f"❌ Referral initialization error: {e}")
     referral_system = None
 
+if rating_system and referral_system:
+    rating_system.set_referral_system(referral_system)
+
 try:
     from arena import ArenaSystem
     arena_system = ArenaSystem(user_db, CARDS_DB, RARITY_SETTINGS)
@@ -592,9 +426,34 @@ except Exception as e:
     logging.error(f"❌ Arena module loading error: {e}")
     arena_system = None
 
+try:
+    from sender import RateLimitedSender
+    message_sender = RateLimitedSender()
+    logging.info("✅ Rate limited sender initialized")
+except Exception as e:
+    logging.error(f"❌ Sender initialization error: {e}")
+    message_sender = None
+
+try:
+    from tournament import TournamentSystem
+    tournament_system = TournamentSystem(user_db, arena_system, message_sender)
+    logging.info("✅ Tournament system initialized")
+except Exception as e:
+    logging.error(f"❌ Tournament initialization error: {e}")
+    tournament_system = None
+
+try:
+    from seasons import SeasonSystem
+    season_system = SeasonSystem(user_db, rating_system)
+    logging.info("✅ Season system initialized")
+except Exception as e:
+    logging.error(f"❌ Season initialization error: {e}")
+    season_system = None
+
 try:
     from task import TaskSystem
     task_system = TaskSystem(user_db)
+    atexit.register(task_system.flush)
     logging.info("✅ Task system initialized")
 except Exception as e:
     logging.error(f"❌ Task initialization error: {e}")
@@ -603,6 +462,7 @@ except Exception as e:
 try:
     from bonuses import BonusSystem
     bonus_system = BonusSystem(user_db, CARDS_DB, RARITY_SETTINGS)
+    atexit.register(bonus_system.flush)
     logging.info("✅ Bonus system initialized")
 except Exception as e:
     logging.error(f"❌ Bonus initialization error: {e}")
@@ -610,17 +470,32 @@ except Exception as e:
 
 # ================== SYSTEM CHECKS ==================
 logging.info("=== SYSTEM CHECKS ===")
+logging.info(f"✅ Analytics: {user_analytics is not None}")
 logging.info(f"✅ Referrals: {referral_system is not None}")
 logging.info(f"✅ Arena: {arena_system is not None}") 
+logging.info(f"✅ Tournaments: {tournament_system is not None}")
+logging.info(f"✅ Seasons: {season_system is not None}")
 logging.info(f"✅ Craft: {craft_system is not None}")
 logging.info(f"✅ Tasks: {task_system is not None}")
 logging.info(f"✅ Bonuses: {bonus_system is not None}")
 logging.info(f"✅ Promo codes: {promo_system is not None}")
 
+# ================== RATING UPDATES ==================
+def touch_user(user_id):
+    """Re-indexes user in leaderboards and analytics after their stats may have changed"""
+    if rating_system and user_id:
+        rating_system.update_user(int(user_id))
+    if user_analytics and user_id:
+        user_analytics.sync_user(int(user_id))
+
+# Stats of users who are not acting themselves (prizes, payouts) change outside handlers
+events.subscribe("stats_changed", lambda event, user_id, amount, details: touch_user(user_id))
+
 # ================== KEYBOARDS ==================
 def get_main_keyboard():
     return ReplyKeyboardMarkup([
         [KeyboardButton("🎴 Get Card")],
+        [KeyboardButton("🎴 Get ×10"), KeyboardButton("🎴 Get All")],
         [KeyboardButton("📋 Menu"), KeyboardButton("🗂 My Cards")]
     ], resize_keyboard=True)
 
@@ -645,8 +520,8 @@ def get_collection_keyboard(user_id):
     
     buttons = []
     for rarity, settings in RARITY_SETTINGS.items():
-        user_card_count = len(user_db[user_id]["cards"][rarity])
-        total_cards = len(CARDS_DB.get(rarity, []))
+        user_card_count = counters.rarity_count(user_data, rarity)
+        total_cards = CATALOG_COUNTS.get(rarity, 0)
         dup_count = duplicates.get(rarity, 0)
         
         if user_card_count > 0:
@@ -1069,8 +944,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # New fields
             "last_arena_battle": 0,
             "arena_battles_today": 0,
-            "last_arena_reset": time.time(),
-            "used_promo_codes": set()
+            "arena_day": epochs.day_epoch()
         }
     else:
         user_db[user_id]["username"] = user.full_name
@@ -1087,10 +961,12 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if referral_system:
         await referral_system.process_referral_start(update, context, user.id)
+    touch_user(user_id)
     
     await update.message.reply_text(
         f"👋 Welcome, {user.full_name}!\n\n"
         f"🎴 Get Card - get a random card\n"
+        f"🎴 Get ×10 / Get All - draw several cards at once\n"
         f"💡 You have {user_db[user_id]['cards_today']} attempts to get cards",
         reply_markup=get_main_keyboard()
     )
@@ -1098,8 +974,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     user_data = user_db[user.id]
-    total_cards = sum(len(cards) for cards in user_data["cards"].values())
-    total_all_cards = sum(len(cards) for cards in CARDS_DB.values())
+    total_cards = counters.total_cards(user_data)
+    total_all_cards = CATALOG_COUNTS["total"]
 
     current_time = time.time()
     time_since_last_card = current_time - user_data["last_card_time"]
@@ -1123,7 +999,8 @@ async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"👤 {user_data['username']}:\n"
         f"🗺️ Universe: Skibidi Toilet\n"
         f"🃏 Total Cards: {total_cards} of {total_all_cards}\n"
-        f"🎖️ Season Points: {user_data['total_sp']:,} S.P\n"
+        f"🎖️ Season {season_system.get_season_number() if season_system else 1} Points: {user_data.get('season_sp', 0):,} S.P\n"
+        f"💎 Total SP: {user_data['total_sp']:,} S.P\n"
         f"💰 Money: {user_data['money']:,}\n"
         f"🎴 Available attempts: {available_cards}"
         f"{cooldown_status}"
@@ -1140,6 +1017,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if text == "🎴 Get Card":
         await send_random_card(update, context, user_id)
+    elif text == "🎴 Get ×10":
+        await send_multi_pull(update, context, user_id, MULTI_PULL_SIZE)
+    elif text == "🎴 Get All":
+        await send_multi_pull(update, context, user_id)
     elif text == "📋 Menu":
         await show_profile(update, context)
     elif text == "🗂 My Cards":
@@ -1157,29 +1038,40 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await update.message.reply_text("Use menu buttons for navigation", reply_markup=get_main_keyboard())
 
+    touch_user(user_id)
+
+async def take_card_attempts(update: Update, user_data: dict, count=None):
+    """Spends up to count attempts (all if None), returns number spent or 0 on cooldown"""
+    current_time = time.time()
+    
+    # Check if there are available attempts
+    if user_data["cards_today"] <= 0:
+        time_since_last_card = current_time - user_data["last_card_time"]
+        if time_since_last_card < COOLDOWN_TIME:
+            remaining_time = COOLDOWN_TIME - time_since_last_card
+            hours = int(remaining_time // 3600)
+            minutes = int((remaining_time % 3600) // 60)
+            await update.message.reply_text(
+                f"⏰ Next card available in {hours}h {minutes}m\n\n"
+                f"💡 You can craft additional attempts through the craft menu!"
+            )
+            return 0
+        else:
+            # If cooldown passed, give standard 3 attempts
+            user_data["cards_today"] = CARDS_BEFORE_COOLDOWN
+
+    spent = user_data["cards_today"] if count is None else min(count, user_data["cards_today"])
+    user_data["cards_today"] -= spent
+    user_data["last_card_time"] = current_time
+    return spent
+
 async def send_random_card(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     try:
         user_data = user_db[user_id]
-        current_time = time.time()
         
-        # Check if there are available attempts
-        if user_data["cards_today"] <= 0:
-            time_since_last_card = current_time - user_data["last_card_time"]
-            if time_since_last_card < COOLDOWN_TIME:
-                remaining_time = COOLDOWN_TIME - time_since_last_card
-                hours = int(remaining_time // 3600)
-                minutes = int((remaining_time % 3600) // 60)
-                await update.message.reply_text(
-                    f"⏰ Next card available in {hours}h {minutes}m\n\n"
-                    f"💡 You can craft additional attempts through the craft menu!"
-                )
-                return
-            else:
-                # If cooldown passed, give standard 3 attempts
-                user_data["cards_today"] = CARDS_BEFORE_COOLDOWN
-
         # Use one attempt
-        user_data["cards_today"] -= 1
+        if not await take_card_attempts(update, user_data, 1):
+            return
         
         valid_rarities = [r for r, s in RARITY_SETTINGS.items() if s["chance"] > 0]
         weights = [RARITY_SETTINGS[r]["chance"] for r in valid_rarities]
@@ -1187,11 +1079,10 @@ async def send_random_card(update: Update, context: ContextTypes.DEFAULT_TYPE, u
 
         card = random.choice(CARDS_DB[rarity])
         
-        is_new = card["name"] not in user_data["cards"][rarity]
+        is_new = counters.add_card(user_data, rarity, card["name"])
+        counters.record_pulls(user_data)
         
-        if is_new:
-            user_data["cards"][rarity].add(card["name"])
-        else:
+        if not is_new:
             user_data["duplicates"][rarity] = user_data["duplicates"].get(rarity, 0) + 1
             shards_per_duplicate = {
                 "Common": 1,
@@ -1203,17 +1094,13 @@ async def send_random_card(update: Update, context: ContextTypes.DEFAULT_TYPE, u
             user_data["shards"] = user_data.get("shards", 0) + shards_per_duplicate.get(rarity, 1)
 
         card_sp = card.get("value", 0)
-        user_data["total_sp"] += card_sp
+        add_sp(user_data, card_sp)
         
         money_range = MONEY_RANGES[rarity]
         card_money = random.randint(money_range["min"], money_range["max"])
         user_data["money"] += card_money
-        
-        user_data["last_card_time"] = current_time
 
-        if task_system:
-            task_system.update_quest_progress(user_id, "daily_cards", 1)
-            task_system.update_quest_progress(user_id, "weekly_cards", 1)
+        events.emit("card_pulled", user_id, rarity=rarity, is_new=is_new)
 
         media_url = card.get("animation") or card.get("photo")
 
@@ -1250,13 +1137,60 @@ async def send_random_card(update: Update, context: ContextTypes.DEFAULT_TYPE, u
         logging.error(f"Error giving card: {str(e)}")
         await update.message.reply_text("⚠️ Error occurred while getting card")
 
+async def send_multi_pull(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, count=None):
+    """Draws several cards at once (all attempts if count is None) with one summary message"""
+    try:
+        user_data = user_db[user_id]
+        
+        pulls = await take_card_attempts(update, user_data, count)
+        if not pulls:
+            return
+        
+        summary = grant_cards(user_data, CARDS_DB, RARITY_SETTINGS, MONEY_RANGES, pulls)
+        for rarity, rarity_count in summary["rarity_counts"].items():
+            events.emit("card_pulled", user_id, rarity_count, rarity=rarity)
+        
+        # Pulls that hit an empty rarity pool gave no card, their attempts are returned
+        user_data["cards_today"] += pulls - summary["count"]
+        if summary["best"] is None:
+            await update.message.reply_text(
+                f"⚠️ No cards could be drawn right now\n\n"
+                f"🎴 Attempts returned: {pulls}"
+            )
+            return
+        
+        # Only the rarest hit is sent as media
+        best_rarity, best_card = summary["best"]
+        is_new = any(card is best_card for _, card in summary["new_cards"])
+        caption = (
+            f"🎴 ×{summary['count']} pull!\n\n"
+            f"⭐ Best: {RARITY_SETTINGS[best_rarity]['emoji']} {best_card['name']}"
+            f"{' ✨ NEW' if is_new else ''}\n"
+            f"{RARITY_SETTINGS[best_rarity]['rarity_emoji']} Rarity: {best_rarity}\n\n"
+        )
+        caption += format_grant_summary(summary, RARITY_SETTINGS)
+        if summary["count"] < pulls:
+            caption += f"\n⚠️ Attempts returned for unavailable cards: {pulls - summary['count']}"
+        caption += f"\n🎴 Attempts left: {user_data['cards_today']}"
+        
+        await send_media(
+            context=context,
+            chat_id=update.message.chat_id,
+            media_url=best_card.get("animation") or best_card.get("photo"),
+            caption=caption
+        )
+    
+    except Exception as e:
+        logging.error(f"Error giving cards: {str(e)}")
+        await update.message.reply_text("⚠️ Error occurred while getting cards")
+
 async def show_collection(update: Update, user_id: int):
     try:
         user_data = user_db[user_id]
         duplicates = user_data.get("duplicates", {})
         shards = user_data.get("shards", 0)
         
-        total_cards = sum(len(cards) for cards in user_data["cards"].values())
+        total_cards = counters.total_cards(user_data)
         if total_cards == 0:
             text = "❌ You don't have any cards yet\n\nClick '🎴 Get Card' to start your collection!"
             if update.message:
@@ -1283,61 +1217,15 @@ async def show_collection(update: Update, user_id: int):
 
 # ================== CRAFT ALL MATERIALS ==================
 async def craft_all_materials(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+    from craft import craft, format_craft_all_result
     user_data = user_db[user_id]
-    duplicates = user_data.get("duplicates", {})
-    shards = user_data.get("shards", 0)
-    
-    total_attempts = 0
-    used_materials = []
-    
-    craft_settings = {
-        "Common": {"required": 10, "attempts": 1, "emoji": "⚡️", "name": "Common"},
-        "Rare": {"required": 10, "attempts": 2, "emoji": "✨", "name": "Rare"},
-        "Epic": {"required": 10, "attempts": 4, "emoji": "🐉", "name": "Epic"},
-        "Legend": {"required": 10, "attempts": 8, "emoji": "🎲", "name": "Legendary"},
-        "Mythic": {"required": 10, "attempts": 16, "emoji": "💎", "name": "Mythic"}
-    }
-    
-    for rarity, setting in craft_settings.items():
-        current_duplicates = duplicates.get(rarity, 0)
-        if current_duplicates >= setting["required"]:
-            batches = current_duplicates // setting["required"]
-            used_duplicates = batches * setting["required"]
-            attempts_from_rarity = batches * setting["attempts"]
-            
-            user_data["duplicates"][rarity] -= used_duplicates
-            total_attempts += attempts_from_rarity
-            used_materials.append(f"{used_duplicates} {setting['emoji']}")
-    
-    if shards >= 10:
-        batches = shards // 10
-        used_shards = batches * 10
-        attempts_from_shards = batches * 1
-        
-        user_data["shards"] -= used_shards
-        total_attempts += attempts_from_shards
-        used_materials.append(f"{used_shards} 🀄️")
     
+    plan, total_attempts = await craft(user_id, user_data)
     if total_attempts == 0:
         await update.message.reply_text("❌ Not enough materials for crafting!")
         return
     
-    # ADD ATTEMPTS TO cards_today
-    user_data["cards_today"] += total_attempts
-    
-    if task_system:
-        task_system.update_quest_progress(user_id, "craft_attempts", total_attempts)
-    
-    text = (
-        f"🎉 Mass crafting completed!\n\n"
-        f"📦 Materials used:\n"
-        f"{chr(10).join(f'• {material}' for material in used_materials)}\n\n"
-        f"🎁 Additional attempts received: {total_attempts}\n\n"
-        f"🎴 Total available attempts: {user_data['cards_today']}\n\n"
-        f"💡 Use the '🎴 Get Card' button!"
-    )
-    
-    await update.message.reply_text(text)
+    await update.message.reply_text(format_craft_all_result(plan, total_attempts, user_data))
 
 # ================== ARENA FUNCTIONS ==================
 async def show_arena_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1380,6 +1268,8 @@ async def show_arena_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     buttons = [
         [InlineKeyboardButton("🔍 Find Opponent", callback_data="arena_find")],
         [InlineKeyboardButton("👥 My Team", callback_data="arena_team")],
+        [InlineKeyboardButton("🏟 Tournament", callback_data="tournament")],
+        [InlineKeyboardButton("📜 Last Battles", callback_data="arena_history")],
         [InlineKeyboardButton("📊 Statistics", callback_data="arena_stats")],
         [InlineKeyboardButton("🔙 Back", callback_data="back_to_profile")]
     ]
@@ -1394,6 +1284,14 @@ async def show_arena_team(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_data = user_db[user_id]
     await arena_system.show_arena_team(update, context, user_data)
 
+async def auto_fill_arena_team(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if arena_system is None:
+        await update.callback_query.answer("❌ Arena module unavailable", show_alert=True)
+        return
+    user_id = update.callback_query.from_user.id
+    user_data = user_db[user_id]
+    await arena_system.auto_fill_team(update, context, user_data)
+
 async def show_team_slot(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if arena_system is None:
         await update.callback_query.answer("❌ Arena module unavailable", show_alert=True)
@@ -1478,8 +1376,11 @@ async def find_arena_enemy(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 show_alert=True
             )
         else:
+            hours = int(arena_status["reset_in"] // 3600)
+            minutes = int((arena_status["reset_in"] % 3600) // 60)
             await query.answer(
-                f"🎯 Daily limit reached: {ARENA_BATTLES_PER_DAY} battles",
+                f"🎯 Daily limit reached: {ARENA_BATTLES_PER_DAY} battles\n"
+                f"🔄 New battles in {hours:02d}:{minutes:02d}",
                 show_alert=True
             )
         return
@@ -1499,6 +1400,197 @@ async def process_battle(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_data = user_db[user_id]
     await arena_system.process_battle(update, context, user_data)
 
+async def purge_battle_sessions(context: ContextTypes.DEFAULT_TYPE):
+    """Removes expired arena battle sessions"""
+    if arena_system is None:
+        return
+    removed = arena_system.sessions.purge_expired()
+    stats = arena_system.sessions.get_stats()
+    logging.info(f"🧹 Battle sessions: {stats['live_sessions']} live, {removed} expired removed")
+
+async def refill_bot_pool(context: ContextTypes.DEFAULT_TYPE):
+    """Tops up pre-generated arena bot teams"""
+    if arena_system is None:
+        return
+    generated = arena_system.bot_pool.refill()
+    if generated:
+        logging.info(f"🤖 Bot pool refilled: +{generated} teams, tiers {arena_system.bot_pool.get_stats()}")
+
+# ================== TOURNAMENT MANAGEMENT ==================
+async def schedule_tournament_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Schedule tournament (admin only)"""
+    user_id = update.effective_user.id
+    ADMINS = [123456789]  # Replace with your Telegram ID
+    
+    if user_id not in ADMINS:
+        await update.message.reply_text("❌ Insufficient permissions")
+        return
+    
+    if tournament_system is None or arena_system is None or context.job_queue is None:
+        await update.message.reply_text("❌ Tournament system unavailable")
+        return
+    
+    if not context.args:
+        await update.message.reply_text(
+            "🏟 Schedule tournament:\n"
+            "▫️ /schedule_tournament HOURS [ROUNDS]\n\n"
+            "💡 Example: /schedule_tournament 24 5"
+        )
+        return
+    
+    try:
+        hours = float(context.args[0])
+        rounds = int(context.args[1]) if len(context.args) > 1 else 5
+    except ValueError:
+        await update.message.reply_text("❌ HOURS and ROUNDS must be numbers")
+        return
+    
+    if not 0 < hours < float("inf") or rounds <= 0:
+        await update.message.reply_text("❌ HOURS and ROUNDS must be positive")
+        return
+    
+    tournament_system.schedule(context.job_queue, hours * 3600, rounds)
+    await update.message.reply_text(
+        f"✅ Tournament scheduled in {hours:g} hours\n"
+        f"🌀 Swiss rounds: {rounds}\n"
+        f"👥 Registered teams: {len(tournament_system.tournament_data['registrations'])}"
+    )
+
+# ================== RATING MANAGEMENT ==================
+async def rating_interval_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Set rating snapshot refresh interval (admin only)"""
+    user_id = update.effective_user.id
+    ADMINS = [123456789]  # Replace with your Telegram ID
+    
+    if user_id not in ADMINS:
+        await update.message.reply_text("❌ Insufficient permissions")
+        return
+    
+    if rating_system is None:
+        await update.message.reply_text("❌ Rating system unavailable")
+        return
+    
+    if not context.args:
+        await update.message.reply_text(
+            f"📊 Rating refresh interval: {rating_system.refresh_interval}s\n"
+            "▫️ /rating_interval SECONDS\n\n"
+            "💡 Example: /rating_interval 120"
+        )
+        return
+    
+    try:
+        seconds = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text("❌ SECONDS must be a number")
+        return
+    
+    interval = rating_system.set_refresh_interval(context.job_queue, seconds)
+    await update.message.reply_text(f"✅ Rating snapshots will refresh every {interval}s")
+
+# ================== ANALYTICS ==================
+async def analytics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Population statistics over mirrored user fields (admin only)"""
+    user_id = update.effective_user.id
+    ADMINS = [123456789]  # Replace with your Telegram ID
+    
+    if user_id not in ADMINS:
+        await update.message.reply_text("❌ Insufficient permissions")
+        return
+    
+    if user_analytics is None:
+        await update.message.reply_text("❌ Analytics unavailable")
+        return
+    
+    from analytics import ANALYTICS_FIELDS, ANALYTICS_OPERATORS
+    args = context.args or []
+    users = user_analytics.size
+    
+    if not args:
+        money = user_analytics.summarize("money")
+        sp = user_analytics.summarize("total_sp")
+        cups = user_analytics.distribution("arena_cups", (50, 90, 99))
+        await update.message.reply_text(
+            f"📊 Analytics ({users:,} users)\n\n"
+            f"💰 Money: {money['total']:,} total, median {money['median']:,.0f}\n"
+            f"💎 SP: {sp['total']:,} total, median {sp['median']:,.0f}\n"
+            f"🪙 SP minted this week: {user_analytics.get_sp_minted_this_week():,}\n"
+            f"👑 Millionaires: {user_analytics.count_where('money', '>', 1_000_000):,}\n"
+            f"🏆 Cups p50/p90/p99: {cups[50]:,.0f} / {cups[90]:,.0f} / {cups[99]:,.0f}\n"
+            f"⚔️ Battles: {user_analytics.summarize('battles_won')['total']:,} won, "
+            f"{user_analytics.summarize('battles_lost')['total']:,} lost\n\n"
+            "▫️ /analytics FIELD - field statistics\n"
+            "▫️ /analytics FIELD > VALUE - count users\n\n"
+            f"📋 Fields: {', '.join(ANALYTICS_FIELDS)}"
+        )
+        return
+    
+    field = args[0]
+    if field not in ANALYTICS_FIELDS:
+        await update.message.reply_text(f"❌ Unknown field. Fields: {', '.join(ANALYTICS_FIELDS)}")
+        return
+    
+    if len(args) == 1:
+        summary = user_analytics.summarize(field)
+        percentiles = user_analytics.distribution(field)
+        text = (
+            f"📊 {field} ({users:,} users)\n\n"
+            f"Σ Total: {summary['total']:,}\n"
+            f"📈 Mean: {summary['mean']:,.1f}\n"
+            f"⬇️ Min: {summary['min']:,} ⬆️ Max: {summary['max']:,}\n\n"
+        )
+        text += "\n".join(f"p{percentile}: {value:,.0f}" for percentile, value in percentiles.items())
+        await update.message.reply_text(text)
+        return
+    
+    if len(args) != 3 or args[1] not in ANALYTICS_OPERATORS:
+        await update.message.reply_text(f"❌ Usage: /analytics FIELD {'|'.join(ANALYTICS_OPERATORS)} VALUE")
+        return
+    
+    try:
+        value = int(args[2])
+    except ValueError:
+        await update.message.reply_text("❌ VALUE must be a number")
+        return
+    
+    matched = user_analytics.count_where(field, args[1], value)
+    share = matched / users * 100 if users else 0
+    await update.message.reply_text(f"👥 Users with {field} {args[1]} {value:,}: {matched:,} ({share:.1f}%)")
+
+# ================== SEASON MANAGEMENT ==================
+async def check_season_rollover(context: ContextTypes.DEFAULT_TYPE):
+    """Starts next season when current one has ended"""
+    if season_system and season_system.is_season_over():
+        if season_system.rollover():
+            if user_analytics:
+                user_analytics.reload()
+            save_user_data()
+
+async def end_season_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """End current season now (admin only)"""
+    user_id = update.effective_user.id
+    ADMINS = [123456789]  # Replace with your Telegram ID
+    
+    if user_id not in ADMINS:
+        await update.message.reply_text("❌ Insufficient permissions")
+        return
+    
+    if season_system is None:
+        await update.message.reply_text("❌ Season system unavailable")
+        return
+    
+    archive = season_system.rollover()
+    if archive is None:
+        await update.message.reply_text("❌ Failed to archive season")
+        return
+    
+    if user_analytics:
+        user_analytics.reload()
+    save_user_data()
+    await update.message.reply_text(
+        f"🏁 Season {archive['season']} finished and archived\n"
+        f"🗓 Season {season_system.get_season_number()} started"
+    )
+
 # ================== PROMO CODE MANAGEMENT ==================
 async def promo_management(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Главное меню управления промо-кодами"""
@@ -1519,12 +1611,15 @@ async def promo_management(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "▫️ /activate_promo CODE - Активировать промо-код\n"
         "▫️ /delete_promo CODE - Удалить промо-код\n"
         "▫️ /promo_stats CODE - Статистика по промо-коду\n"
+        "▫️ /create_campaign NAME COUNT REWARDS - Кампания одноразовых кодов\n"
+        "▫️ /campaigns - Список кампаний\n"
+        "▫️ /promo_users CODE - Кто активировал код\n"
     )
     
     await update.message.reply_text(text, parse_mode="Markdown")
 
 async def list_promos_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показать все промо-коды"""
+    """Показать активные промо-коды постранично"""
     user_id = update.effective_user.id
     ADMINS = [123456789]
     
@@ -1532,31 +1627,39 @@ async def list_promos_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text("❌ Недостаточно прав")
         return
     
-    stats = promo_system.get_promo_stats()
+    try:
+        page = int(context.args[0]) if context.args else 1
+    except ValueError:
+        await update.message.reply_text("❌ Номер страницы должен быть числом: /list_promos PAGE")
+        return
     
-    if not stats['details']:
+    codes, page, pages = promo_system.get_active_page(page)
+    
+    if not codes:
         await update.message.reply_text("📭 Нет активных промо-кодов")
         return
     
-    text = "🎫 *Все промо-коды:*\n\n"
+    text = f"🎫 *Активные промо-коды* ({page}/{pages}):\n\n"
     
-    for code, details in stats['details'].items():
-        status = "🟢" if details.get('is_active', True) else "🔴"
-        uses = f"{details.get('uses_count', 0)}"
-        if details.get('max_uses'):
-            uses += f"/{details['max_uses']}"
+    for code, details in codes:
+        uses = f"{details.uses_count}"
+        if details.max_uses:
+            uses += f"/{details.max_uses}"
         
         expires = "Бессрочно"
-        if details.get('expires_at'):
+        if details.expires_at:
             from datetime import datetime
-            exp_time = datetime.fromtimestamp(details['expires_at']).strftime('%d.%m.%Y %H:%M')
+            exp_time = datetime.fromtimestamp(details.expires_at).strftime('%d.%m.%Y %H:%M')
             expires = exp_time
         
-        text += f"{status} *{code}*\n"
-        text += f"   🎁 {details['rewards']}\n"
+        text += f"🟢 *{code}*\n"
+        text += f"   🎁 {details.rewards}\n"
         text += f"   📊 Использовано: {uses}\n"
         text += f"   ⏰ Истекает: {expires}\n\n"
     
+    if page < pages:
+        text += f"➡️ Следующая страница: /list\\_promos {page + 1}"
+    
     await update.message.reply_text(text, parse_mode="Markdown")
 
 async def edit_promo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1587,7 +1690,7 @@ async def edit_promo_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     param = context.args[1]
     value = context.args[2]
     
-    if code not in promo_system.promo_codes:
+    if not promo_system.has_promo_code(code):
         await update.message.reply_text(f"❌ Промо-код {code} не найден")
         return
     
@@ -1681,27 +1784,56 @@ async def promo_info_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
     
     text = f"📊 *Статистика промо-кода {code}:*\n\n"
-    text += f"🎁 Награды: {promo_info['rewards']}\n"
-    text += f"📊 Использовано: {promo_info.get('uses_count', 0)}"
-    if promo_info.get('max_uses'):
-        text += f" / {promo_info['max_uses']}"
-    text += f"\n🔄 Активен: {'✅ Да' if promo_info.get('is_active', True) else '❌ Нет'}\n"
-    
-    if promo_info.get('expires_at'):
-        from datetime import datetime
-        exp_time = datetime.fromtimestamp(promo_info['expires_at']).strftime('%d.%m.%Y %H:%M')
-        remaining = promo_info['expires_at'] - time.time()
+    text += f"🎁 Награды: {promo_info.rewards}\n"
+    text += f"📊 Использовано: {promo_info.uses_count}"
+    if promo_info.max_uses:
+        text += f" / {promo_info.max_uses}"
+    text += f"\n👥 Игроков: {promo_system.count_audience(code)} (/promo\\_users {code})"
+    text += f"\n🔄 Активен: {'✅ Да' if promo_info.is_active else '❌ Нет'}\n"
+    
+    from datetime import datetime
+    if promo_info.expires_at:
+        exp_time = datetime.fromtimestamp(promo_info.expires_at).strftime('%d.%m.%Y %H:%M')
+        remaining = promo_info.expires_at - time.time()
         hours = int(remaining // 3600)
         text += f"⏰ Истекает: {exp_time}\n"
         text += f"⏳ Осталось: {hours} часов\n"
     else:
         text += "⏰ Срок: Бессрочно\n"
     
-    created_time = datetime.fromtimestamp(promo_info.get('created_at', time.time()))
+    created_time = datetime.fromtimestamp(promo_info.created_at)
     text += f"📅 Создан: {created_time.strftime('%d.%m.%Y %H:%M')}\n"
     
     await update.message.reply_text(text, parse_mode="Markdown")
 
+async def promo_users_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Игроки, активировавшие промо-код или код кампании"""
+    user_id = update.effective_user.id
+    ADMINS = [123456789]
+    
+    if user_id not in ADMINS:
+        await update.message.reply_text("❌ Недостаточно прав")
+        return
+    
+    if not context.args:
+        await update.message.reply_text("Укажите код или кампанию: /promo_users CODE")
+        return
+    
+    code = context.args[0].upper()
+    audience = promo_system.get_audience(code)
+    if not audience:
+        await update.message.reply_text(f"📭 {code} еще никто не активировал")
+        return
+    
+    text = f"👥 {code} активировали: {len(audience)}\n\n"
+    for audience_id in audience[:PROMO_PAGE_SIZE * 5]:
+        username = user_db[audience_id]["username"] if audience_id in user_db else ""
+        text += f"▫️ {username or 'Player'} ({audience_id})\n"
+    if len(audience) > PROMO_PAGE_SIZE * 5:
+        text += f"… и еще {len(audience) - PROMO_PAGE_SIZE * 5}"
+    
+    await update.message.reply_text(text)
+
 # ================== PROMO CODE SYSTEM ==================
 async def promo_code_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler for /promo command"""
@@ -1716,9 +1848,25 @@ async def promo_code_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     code = " ".join(context.args)
     user_id = update.effective_user.id
     
-    result = promo_system.apply_promo_code(code, user_id)
+    result = await promo_system.redeem_promo_code(code, user_id)
+    touch_user(user_id)
     await update.message.reply_text(result["message"])
 
+def parse_promo_rewards(rewards_str: str):
+    """Parses rewards argument like money:1000,sp:500,cards:Common-[Card1,Card2]"""
+    rewards = {}
+    for item in rewards_str.split(','):
+        if ':' in item:
+            key, value = item.split(':', 1)
+            if key in ['money', 'sp', 'cards_today', 'arena_battles', 'shards']:
+                rewards[key] = int(value)
+            elif key == 'cards':
+                # Format: Common-[Card1,Card2]
+                rarity, cards_str = value.split('-', 1)
+                card_names = [c.strip() for c in cards_str.strip('[]').split(',')]
+                rewards['cards'] = {rarity: card_names}
+    return rewards
+
 async def create_promo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Create promo code (admin only)"""
     user_id = update.effective_user.id
@@ -1741,20 +1889,7 @@ async def create_promo_command(update: Update, context: ContextTypes.DEFAULT_TYP
         return
     
     code = context.args[0]
-    rewards_str = context.args[1]
-    
-    # Parse rewards
-    rewards = {}
-    for item in rewards_str.split(','):
-        if ':' in item:
-            key, value = item.split(':', 1)
-            if key in ['money', 'sp', 'cards_today', 'arena_battles', 'shards']:
-                rewards[key] = int(value)
-            elif key == 'cards':
-                # Format: Common-[Card1,Card2]
-                rarity, cards_str = value.split('-', 1)
-                card_names = [c.strip() for c in cards_str.strip('[]').split(',')]
-                rewards['cards'] = {rarity: card_names}
+    rewards = parse_promo_rewards(context.args[1])
     
     # Additional parameters
     expires_hours = None
@@ -1766,7 +1901,9 @@ async def create_promo_command(update: Update, context: ContextTypes.DEFAULT_TYP
         elif context.args[i].startswith('uses:'):
             max_uses = int(context.args[i].split(':')[1])
     
-    promo_system.create_promo_code(code, rewards, max_uses, expires_hours)
+    if not promo_system.create_promo_code(code, rewards, max_uses, expires_hours):
+        await update.message.reply_text(f"❌ Name {code.upper()} is already used by a promo campaign")
+        return
     
     await update.message.reply_text(
         f"✅ Promo code created: {code.upper()}\n"
@@ -1775,6 +1912,99 @@ async def create_promo_command(update: Update, context: ContextTypes.DEFAULT_TYP
         f"🎯 Uses: {max_uses or '∞'}"
     )
 
+async def create_campaign_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Create campaign of single-use promo codes (admin only)"""
+    user_id = update.effective_user.id
+    ADMINS = [123456789]  # Replace with your Telegram ID
+    
+    if user_id not in ADMINS:
+        await update.message.reply_text("❌ Insufficient permissions")
+        return
+    
+    if len(context.args) < 3:
+        await update.message.reply_text(
+            "🔧 Create promo campaign:\n"
+            "▫️ /create_campaign NAME COUNT REWARDS [expires:HOURS]\n\n"
+            "💡 Example:\n"
+            "▫️ /create_campaign SUMMER 100000 money:1000,cards_today:3 expires:168\n\n"
+            "Each code is single-use, a player can redeem one code per campaign"
+        )
+        return
+    
+    name = context.args[0].upper()
+    try:
+        count = int(context.args[1])
+        rewards = parse_promo_rewards(context.args[2])
+        expires_hours = None
+        for arg in context.args[3:]:
+            if arg.startswith('expires:'):
+                expires_hours = int(arg.split(':')[1])
+    except ValueError:
+        await update.message.reply_text("❌ COUNT and HOURS must be numbers")
+        return
+    
+    if not 0 < count <= CAMPAIGN_MAX_CODES:
+        await update.message.reply_text(f"❌ COUNT must be between 1 and {CAMPAIGN_MAX_CODES:,}")
+        return
+    
+    codes = promo_system.create_campaign(name, rewards, count, expires_hours)
+    if codes is None:
+        await update.message.reply_text(f"❌ Name {name} is already used by a promo code or campaign")
+        return
+    
+    # Plain codes exist only in this file, the bot keeps their hashes
+    await update.message.reply_document(
+        document="\n".join(codes).encode("utf-8"),
+        filename=f"{name}_codes.txt",
+        caption=(
+            f"✅ Campaign created: {name}\n"
+            f"🎫 Codes: {count:,}\n"
+            f"🎁 Rewards: {rewards}\n"
+            f"⏰ Valid for: {expires_hours or '∞'} hours"
+        )
+    )
+
+async def list_campaigns_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """List promo campaigns (admin only)"""
+    user_id = update.effective_user.id
+    ADMINS = [123456789]  # Replace with your Telegram ID
+    
+    if user_id not in ADMINS:
+        await update.message.reply_text("❌ Insufficient permissions")
+        return
+    
+    campaigns = promo_system.campaigns.campaigns
+    if not campaigns:
+        await update.message.reply_text("📭 No promo campaigns")
+        return
+    
+    text = "🎫 Promo campaigns:\n\n"
+    for name, campaign in campaigns.items():
+        text += f"🔹 {name}: {campaign['redeemed']:,}/{campaign['size']:,} redeemed\n"
+        text += f"   🎁 {campaign['rewards']}\n"
+    text += "\n🗑️ Delete: /delete_campaign NAME"
+    
+    await update.message.reply_text(text)
+
+async def delete_campaign_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Delete promo campaign (admin only)"""
+    user_id = update.effective_user.id
+    ADMINS = [123456789]  # Replace with your Telegram ID
+    
+    if user_id not in ADMINS:
+        await update.message.reply_text("❌ Insufficient permissions")
+        return
+    
+    if not context.args:
+        await update.message.reply_text("Specify campaign: /delete_campaign NAME")
+        return
+    
+    name = context.args[0].upper()
+    if promo_system.delete_campaign(name):
+        await update.message.reply_text(f"🗑️ Campaign {name} deleted")
+    else:
+        await update.message.reply_text(f"❌ Campaign {name} not found")
+
 async def promo_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Promo code statistics (admin only)"""
     user_id = update.effective_user.id
@@ -1788,15 +2018,11 @@ async def promo_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     text = f"📊 Promo code statistics:\n\n"
     text += f"📁 Total codes: {stats['total_codes']}\n"
-    text += f"🟢 Active: {stats['active_codes']}\n\n"
-    
-    for code, details in stats['details'].items():
-        text += f"🔹 {code}:\n"
-        text += f"   🎁 {details['rewards']}\n"
-        text += f"   📊 Used: {details.get('uses_count', 0)}"
-        if details.get('max_uses'):
-            text += f"/{details['max_uses']}"
-        text += f"\n   ⏰ Expires: {details.get('expires_at', 'Never')}\n\n"
+    text += f"🟢 Active: {stats['active_codes']}\n"
+    text += f"🗄 Expired (archived): {stats['archived_codes']}\n"
+    text += f"🎫 Campaigns: {stats['campaigns']} ({stats['campaign_codes']:,} unredeemed codes)\n\n"
+    text += "📋 Active codes: /list_promos PAGE\n"
+    text += "🔎 Single code: /promo_info CODE"
     
     await update.message.reply_text(text)
 
@@ -1923,11 +2149,10 @@ async def execute_combine(query: CallbackQuery, context: ContextTypes.DEFAULT_TY
 
         for req in card["required_cards"]:
             for rarity in list(user_data["cards"]):
-                if req in user_data["cards"][rarity]:
-                    user_data["cards"][rarity].remove(req)
+                if counters.remove_card(user_data, rarity, req):
                     break
 
-        user_data["cards"]["Ultimate"].add(card["name"])
+        counters.add_card(user_data, "Ultimate", card["name"])
         user_data["total_sp"] -= card["required_sp"]
         user_data["money"] -= card["required_money"]
 
@@ -2035,8 +2260,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         "craft_attempts": 0,
                         "last_arena_battle": 0,
                         "arena_battles_today": 0,
-                        "last_arena_reset": time.time(),
-                        "used_promo_codes": set()
+                        "arena_day": epochs.day_epoch()
                     }
                 
                 logging.info(f"🔄 CALLING show_craft_menu for user_id: {user_id}")
@@ -2050,6 +2274,12 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
 
         # ================== CRAFT BUTTON HANDLERS ==================
+        elif data == "craft_all":
+            if craft_system:
+                await craft_system.craft_all(update, context, user_id)
+            else:
+                await query.answer("❌ Craft system unavailable", show_alert=True)
+                
         elif data == "craft_common":
             logging.info("🎯 Craft common cards")
             if craft_system:
@@ -2164,6 +2394,14 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif data == "rating":
             await rating_system.show_rating_menu(update, context, user_id)
             
+        elif data.startswith("rating_around_"):
+            category = data.split("_", 2)[2]
+            await rating_system.show_around(update, context, user_id, category)
+
+        elif data.startswith("rating_friends_"):
+            category = data.split("_", 2)[2]
+            await rating_system.show_friends(update, context, user_id, category)
+
         elif data.startswith("rating_"):
             category = data.split("_", 1)[1]
             if category == "back":
@@ -2171,6 +2409,19 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             else:
                 await rating_system.show_rating(update, context, user_id, category)
 
+        elif data == "seasons_past":
+            if season_system:
+                await season_system.show_past_seasons(update, context, user_id)
+            else:
+                await query.answer("❌ Season system unavailable", show_alert=True)
+
+        elif data.startswith("season_archive_"):
+            if season_system:
+                season = int(data.rsplit("_", 1)[1])
+                await season_system.show_season_archive(update, context, user_id, season)
+            else:
+                await query.answer("❌ Season system unavailable", show_alert=True)
+
         # ================== REFERRAL HANDLERS ==================
         elif data == "referral":
             await referral_system.show_referral_menu(update, context, user_id)
@@ -2255,6 +2506,39 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif data == "arena_team":
             await show_arena_team(update, context)
             
+        elif data == "tournament":
+            if tournament_system:
+                await tournament_system.show_tournament_menu(update, context, user_id)
+            else:
+                await query.answer("❌ Tournament system unavailable", show_alert=True)
+
+        elif data == "tournament_register":
+            if tournament_system:
+                await tournament_system.register_team(update, context, user_id)
+            else:
+                await query.answer("❌ Tournament system unavailable", show_alert=True)
+
+        elif data == "tournament_leave":
+            if tournament_system:
+                await tournament_system.leave_tournament(update, context, user_id)
+            else:
+                await query.answer("❌ Tournament system unavailable", show_alert=True)
+
+        elif data == "arena_autofill":
+            await auto_fill_arena_team(update, context)
+
+        elif data == "arena_history":
+            if arena_system:
+                await arena_system.show_battle_history(update, context, user_db[user_id])
+            else:
+                await query.answer("❌ Arena module unavailable", show_alert=True)
+
+        elif data.startswith("replay_"):
+            if arena_system:
+                await arena_system.show_replay(update, context, user_db[user_id])
+            else:
+                await query.answer("❌ Arena module unavailable", show_alert=True)
+            
         elif data.startswith("team_slot_"):
             await show_team_slot(update, context)
             
@@ -2267,18 +2551,22 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif data == "arena_find":
             await find_arena_enemy(update, context)
             
-        elif data == "battle_attack":
+        elif data.startswith("battle_attack_"):
             await arena_system.process_battle(update, context, user_db[user_id])
             
-        elif data == "start_round":
+        elif data.startswith("start_round_"):
             await arena_system.process_round(update, context, user_db[user_id])
             
-        elif data == "continue_round":
+        elif data.startswith("continue_round_"):
             await arena_system.process_round(update, context, user_db[user_id])
             
-        elif data == "finish_battle":
+        elif data.startswith("finish_battle_"):
             await arena_system.show_battle_result(update, context, user_db[user_id])
 
+        elif data.startswith("battle_cancel_"):
+            arena_system.cancel_battle(update)
+            await show_arena_menu(update, context)
+
         elif data == "change_universe":
             await show_universe_menu(update, context, user_id)
 
@@ -2300,6 +2588,8 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.answer("⚠️ An error occurred", show_alert=True)
         except:
             pass
+    finally:
+        touch_user(user_id)
 
 # ================== UNIVERSE CHANGE FUNCTION ==================
 async def show_universe_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
@@ -2354,11 +2644,23 @@ if __name__ == "__main__":
     # New promo management handlers
     app.add_handler(CommandHandler("promo_manage", promo_management))
     app.add_handler(CommandHandler("list_promos", list_promos_command))
+    app.add_handler(CommandHandler("create_campaign", create_campaign_command))
+    app.add_handler(CommandHandler("campaigns", list_campaigns_command))
+    app.add_handler(CommandHandler("delete_campaign", delete_campaign_command))
     app.add_handler(CommandHandler("edit_promo", edit_promo_command))
     app.add_handler(CommandHandler("deactivate_promo", deactivate_promo_command))
     app.add_handler(CommandHandler("activate_promo", activate_promo_command))
     app.add_handler(CommandHandler("delete_promo", delete_promo_command))
     app.add_handler(CommandHandler("promo_info", promo_info_command))
+    app.add_handler(CommandHandler("promo_users", promo_users_command))
+    
+    # Tournament handlers
+    app.add_handler(CommandHandler("schedule_tournament", schedule_tournament_command))
+    
+    # Rating handlers
+    app.add_handler(CommandHandler("rating_interval", rating_interval_command))
+    app.add_handler(CommandHandler("end_season", end_season_command))
+    app.add_handler(CommandHandler("analytics", analytics_command))
     
     # Debug handlers
     app.add_handler(CommandHandler("debug_card", debug_card))
@@ -2366,6 +2668,29 @@ if __name__ == "__main__":
     app.add_handler(CommandHandler("test_onedrive", test_onedrive))
     app.add_handler(CommandHandler("fix_cards", fix_problematic_cards))
 
+    # Background jobs
+    if app.job_queue:
+        app.job_queue.run_repeating(purge_battle_sessions, interval=5 * 60, first=5 * 60)
+        app.job_queue.run_repeating(refill_bot_pool, interval=30, first=30)
+        if tournament_system:
+            tournament_system.restore_schedule(app.job_queue)
+        if rating_system:
+            rating_system.schedule_refresh(app.job_queue)
+        app.job_queue.run_repeating(check_season_rollover, interval=60 * 60, first=60)
+        if task_system:
+            from task import QUESTS_FLUSH_INTERVAL
+            app.job_queue.run_repeating(task_system.flush_job, interval=QUESTS_FLUSH_INTERVAL, first=QUESTS_FLUSH_INTERVAL)
+        if bonus_system:
+            from bonuses import BONUS_FLUSH_INTERVAL
+            app.job_queue.run_repeating(bonus_system.flush_job, interval=BONUS_FLUSH_INTERVAL, first=BONUS_FLUSH_INTERVAL)
+        if referral_system:
+            from referral_guard import REFERRAL_RELEASE_INTERVAL
+            app.job_queue.run_repeating(referral_system.release_job, interval=REFERRAL_RELEASE_INTERVAL, first=REFERRAL_RELEASE_INTERVAL)
+        app.job_queue.run_repeating(promo_system.sweep_job, interval=PROMO_SWEEP_INTERVAL, first=PROMO_SWEEP_INTERVAL)
+        app.job_queue.run_repeating(promo_system.flush_job, interval=PROMO_JOURNAL_FLUSH_INTERVAL, first=PROMO_JOURNAL_FLUSH_INTERVAL)
+    else:
+        logging.warning("⚠️ JobQueue unavailable, background jobs disabled")
+
     async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logging.error(f"❌ Error in handler: {context.error}", exc_info=True)
     
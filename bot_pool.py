@@ -0,0 +1,113 @@
+import random
+import bisect
+import logging
+from collections import deque
+
+# Bot pool settings
+BOT_POOL_TIERS = 8            # Number of power tiers
+BOT_TEAMS_PER_TIER = 20       # Ready teams kept per tier
+BOT_TEAM_SIZE = 5
+
+
+def card_power(card):
+    """Returns card power used for matchmaking"""
+    return card.get("attack", 0) + card.get("health", 0)
+
+
+class BotOpponentPool:
+    """Pre-generated bot teams bucketed by total team power"""
+
+    def __init__(self, cards_db, tiers=BOT_POOL_TIERS, teams_per_tier=BOT_TEAMS_PER_TIER):
+        self.tiers = tiers
+        self.teams_per_tier = teams_per_tier
+
+        self.cards = []
+        for rarity in ["Common", "Rare", "Epic", "Legend", "Mythic", "Ultimate"]:
+            self.cards.extend(cards_db.get(rarity, []))
+        self.cards.sort(key=card_power)
+        self.powers = [card_power(card) for card in self.cards]
+
+        self.tier_bounds = self.build_tier_bounds()
+        self.buckets = [deque(maxlen=teams_per_tier) for _ in range(tiers)]
+        logging.info(f"🔄 Bot opponent pool initialization ({len(self.cards)} cards, {tiers} tiers)")
+
+    def build_tier_bounds(self):
+        """Builds geometric power boundaries between tiers"""
+        if not self.powers:
+            return []
+
+        min_power = max(1, self.powers[0] * BOT_TEAM_SIZE)
+        max_power = max(min_power + 1, self.powers[-1] * BOT_TEAM_SIZE)
+        ratio = (max_power / min_power) ** (1 / self.tiers)
+        return [min_power * ratio ** i for i in range(1, self.tiers)]
+
+    def get_tier(self, power):
+        """Returns tier index for team power"""
+        return bisect.bisect_right(self.tier_bounds, power)
+
+    def get_tier_target(self, tier):
+        """Returns typical team power of tier"""
+        lower = self.tier_bounds[tier - 1] if tier > 0 else self.powers[0] * BOT_TEAM_SIZE
+        upper = self.tier_bounds[tier] if tier < len(self.tier_bounds) else self.powers[-1] * BOT_TEAM_SIZE
+        return (lower * upper) ** 0.5 if lower > 0 else (lower + upper) / 2
+
+    def generate_team(self, tier):
+        """Generates team of cards close to tier power"""
+        if len(self.cards) < BOT_TEAM_SIZE:
+            return (self.cards * BOT_TEAM_SIZE)[:BOT_TEAM_SIZE]
+
+        # Pick cards around the average card power of the tier
+        card_target = self.get_tier_target(tier) / BOT_TEAM_SIZE
+        center = bisect.bisect_left(self.powers, card_target)
+        spread = max(BOT_TEAM_SIZE, len(self.cards) // 20)
+        start = max(0, min(center - spread, len(self.cards) - 2 * spread))
+        window = self.cards[start:start + 2 * spread]
+        return random.sample(window, min(BOT_TEAM_SIZE, len(window)))
+
+    def refill(self):
+        """Tops up tiers that ran low, returns generated teams count"""
+        if not self.cards:
+            return 0
+
+        generated = 0
+        attempts = self.tiers * self.teams_per_tier * 4
+        for tier in range(self.tiers):
+            while len(self.buckets[tier]) < self.teams_per_tier and attempts > 0:
+                attempts -= 1
+                team = self.generate_team(tier)
+                # Teams that drift into a neighbour tier still fill that tier
+                actual_tier = self.get_tier(sum(card_power(card) for card in team))
+                if len(self.buckets[actual_tier]) < self.teams_per_tier:
+                    self.buckets[actual_tier].append(team)
+                    generated += 1
+
+        return generated
+
+    def draw(self, power=None):
+        """Returns ready bot opponent for player power"""
+        if power is None:
+            tier = random.randrange(self.tiers)
+        else:
+            tier = self.get_tier(power)
+
+        bucket = self.buckets[tier]
+        team_cards = bucket.popleft() if bucket else self.generate_team(tier) if self.cards else []
+
+        return {
+            "user_id": 0,
+            "username": "Bot Opponent",
+            "team": [
+                {
+                    "name": card["name"],
+                    "attack": card.get("attack", 0),
+                    "health": card.get("health", 0)
+                }
+                for card in team_cards
+            ],
+            "cups": random.randint(tier * 1000 // self.tiers, (tier + 1) * 1000 // self.tiers),
+            "is_bot": True
+        }
+
+    def get_stats(self):
+        """Returns ready teams count per tier"""
+        return [len(bucket) for bucket in self.buckets]
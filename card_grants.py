@@ -0,0 +1,96 @@
+import random
+from collections import Counter
+import counters
+from seasons import add_sp
+
+# Shards given for a duplicate instead of the card
+SHARDS_PER_DUPLICATE = {"Common": 1, "Rare": 2, "Epic": 3, "Legend": 5, "Mythic": 10}
+RARITY_ORDER = ["Common", "Rare", "Epic", "Legend", "Mythic", "Ultimate"]
+
+
+def rarity_rank(rarity):
+    """Returns position of rarity from common to ultimate"""
+    return RARITY_ORDER.index(rarity) if rarity in RARITY_ORDER else -1
+
+
+def draw_rarity_counts(rarity_settings, count, rng=random):
+    """Splits count cards between droppable rarities by their chances (multinomial)"""
+    rarities = [rarity for rarity, settings in rarity_settings.items() if settings["chance"] > 0 and rarity != "Ultimate"]
+    weights = [rarity_settings[rarity]["chance"] for rarity in rarities]
+    return Counter(rng.choices(rarities, weights=weights, k=count))
+
+
+def grant_cards(user_data, cards_db, rarity_settings, money_ranges, count, rarity=None, rng=random):
+    """Gives count random cards (of rarity, if given) in one pass, returns aggregate summary"""
+    summary = {
+        "count": 0,
+        "rarity_counts": {},
+        "new_cards": [],
+        "duplicates": {},
+        "shards": 0,
+        "sp": 0,
+        "money": 0,
+        "best": None
+    }
+
+    rarity_counts = {rarity: count} if rarity else draw_rarity_counts(rarity_settings, count, rng)
+    for rarity, rarity_count in rarity_counts.items():
+        pool = cards_db.get(rarity)
+        if not pool:
+            continue
+
+        drawn = rng.choices(pool, k=rarity_count)
+        money_range = money_ranges.get(rarity, {"min": 0, "max": 0})
+        summary["count"] += rarity_count
+        summary["rarity_counts"][rarity] = rarity_count
+        for card in drawn:
+            if counters.add_card(user_data, rarity, card["name"]):
+                summary["new_cards"].append((rarity, card))
+            else:
+                summary["duplicates"][rarity] = summary["duplicates"].get(rarity, 0) + 1
+            summary["sp"] += card.get("value", 0)
+            summary["money"] += rng.randint(money_range["min"], money_range["max"])
+
+        rank = rarity_rank(rarity)
+        if summary["best"] is None or rank > summary["best"][0]:
+            summary["best"] = (rank, rarity, max(drawn, key=lambda card: card.get("value", 0)))
+
+    # Counters and balances are touched once per grant, not once per card
+    duplicates = user_data.setdefault("duplicates", {})
+    for rarity, duplicate_count in summary["duplicates"].items():
+        duplicates[rarity] = duplicates.get(rarity, 0) + duplicate_count
+        summary["shards"] += SHARDS_PER_DUPLICATE.get(rarity, 1) * duplicate_count
+
+    counters.record_pulls(user_data, summary["count"])
+    user_data["shards"] = user_data.get("shards", 0) + summary["shards"]
+    add_sp(user_data, summary["sp"])
+    user_data["money"] += summary["money"]
+
+    if summary["best"]:
+        summary["best"] = summary["best"][1:]
+    return summary
+
+
+def format_grant_summary(summary, rarity_settings):
+    """Renders grant summary as message text"""
+    text = f"🎴 Cards received: {summary['count']}\n"
+    for rarity in sorted(summary["rarity_counts"], key=rarity_rank, reverse=True):
+        emoji = rarity_settings.get(rarity, {}).get("emoji", "🃏")
+        new_count = sum(1 for new_rarity, _ in summary["new_cards"] if new_rarity == rarity)
+        text += f"{emoji} {rarity}: {summary['rarity_counts'][rarity]}"
+        if new_count:
+            text += f" ({new_count} new)"
+        text += "\n"
+
+    if summary["new_cards"]:
+        rarest_first = sorted(summary["new_cards"], key=lambda item: rarity_rank(item[0]), reverse=True)
+        shown = [card["name"] for _, card in rarest_first[:5]]
+        more = len(summary["new_cards"]) - len(shown)
+        text += f"\n✨ New: {', '.join(shown)}"
+        text += f" and {more} more\n" if more else "\n"
+
+    text += f"\n💎 +{summary['sp']:,} SP\n"
+    text += f"💰 +{summary['money']:,} money\n"
+    if summary["shards"]:
+        text += f"🀄️ +{summary['shards']} shards for duplicates\n"
+    return text
@@ -0,0 +1,74 @@
+# Per-user card counters kept next to the card sets, so totals are O(1) reads
+
+
+def backfill_counters(user_data):
+    """Recomputes counters from user's card sets"""
+    card_counts = {rarity: len(cards) for rarity, cards in user_data["cards"].items() if cards}
+    user_data["card_counts"] = card_counts
+    user_data["total_cards"] = sum(card_counts.values())
+    if "total_pulls" not in user_data:
+        # Best estimate for old accounts: every unique card plus unspent duplicates
+        user_data["total_pulls"] = user_data["total_cards"] + sum(user_data.get("duplicates", {}).values())
+
+
+def ensure_counters(user_data):
+    """Creates counters for accounts that don't have them yet"""
+    if "card_counts" not in user_data:
+        backfill_counters(user_data)
+
+
+def add_card(user_data, rarity, card_name):
+    """Adds card to collection, returns True if it is new"""
+    ensure_counters(user_data)
+    cards = user_data["cards"][rarity]
+    if card_name in cards:
+        return False
+
+    cards.add(card_name)
+    user_data["card_counts"][rarity] = user_data["card_counts"].get(rarity, 0) + 1
+    user_data["total_cards"] += 1
+    return True
+
+
+def remove_card(user_data, rarity, card_name):
+    """Removes card from collection, returns True if it was owned"""
+    ensure_counters(user_data)
+    cards = user_data["cards"].get(rarity)
+    if not cards or card_name not in cards:
+        return False
+
+    cards.remove(card_name)
+    user_data["card_counts"][rarity] -= 1
+    user_data["total_cards"] -= 1
+    return True
+
+
+def record_pulls(user_data, count=1):
+    """Counts received cards, duplicates included"""
+    ensure_counters(user_data)
+    user_data["total_pulls"] += count
+
+
+def total_cards(user_data):
+    """Returns number of unique cards owned"""
+    ensure_counters(user_data)
+    return user_data["total_cards"]
+
+
+def rarity_count(user_data, rarity):
+    """Returns number of unique cards of rarity owned"""
+    ensure_counters(user_data)
+    return user_data["card_counts"].get(rarity, 0)
+
+
+def total_pulls(user_data):
+    """Returns number of cards ever received, duplicates included"""
+    ensure_counters(user_data)
+    return user_data["total_pulls"]
+
+
+def count_catalog(cards_db):
+    """Returns catalog card counts per rarity and in total"""
+    catalog_counts = {rarity: len(cards) for rarity, cards in cards_db.items()}
+    catalog_counts["total"] = sum(catalog_counts.values())
+    return catalog_counts
@@ -1,240 +1,202 @@
 import logging
+import events
+from locks import user_lock
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
-from collections import defaultdict
 
 # Additional logging setup for craft system
 craft_logger = logging.getLogger('craft_system')
 craft_logger.setLevel(logging.DEBUG)
 
+# The only craft recipe table: "material" is a duplicates rarity or "shards"
+CRAFT_RECIPES = {
+    "common": {"material": "Common", "required": 10, "attempts": 1, "emoji": "⚡️", "name": "Common"},
+    "rare": {"material": "Rare", "required": 10, "attempts": 2, "emoji": "✨", "name": "Rare"},
+    "epic": {"material": "Epic", "required": 10, "attempts": 4, "emoji": "🐉", "name": "Epic"},
+    "legend": {"material": "Legend", "required": 10, "attempts": 8, "emoji": "🎲", "name": "Legendary"},
+    "mythic": {"material": "Mythic", "required": 10, "attempts": 16, "emoji": "💎", "name": "Mythic"},
+    "shards": {"material": "shards", "required": 10, "attempts": 1, "emoji": "🀄️", "name": "Shards"}
+}
+
+
+def ensure_craft_fields(user_data):
+    """Creates craft related fields for old accounts"""
+    duplicates = user_data.setdefault("duplicates", {})
+    for recipe in CRAFT_RECIPES.values():
+        if recipe["material"] != "shards":
+            duplicates.setdefault(recipe["material"], 0)
+    user_data.setdefault("shards", 0)
+    user_data.setdefault("cards_today", 0)
+
+
+def get_material_count(user_data, recipe):
+    """Returns how much of recipe's material user has"""
+    if recipe["material"] == "shards":
+        return user_data.get("shards", 0)
+    return user_data.get("duplicates", {}).get(recipe["material"], 0)
+
+
+def plan_craft(user_data, recipe_keys=None, max_batches=None):
+    """Returns [(recipe, batches)] of the largest craft possible, computed arithmetically"""
+    plan = []
+    for key in recipe_keys or CRAFT_RECIPES:
+        recipe = CRAFT_RECIPES[key]
+        batches = get_material_count(user_data, recipe) // recipe["required"]
+        if max_batches is not None:
+            batches = min(batches, max_batches)
+        if batches > 0:
+            plan.append((recipe, batches))
+    return plan
+
+
+def apply_craft(user_data, plan):
+    """Spends materials of planned craft and gives attempts, returns attempts given"""
+    attempts = 0
+    for recipe, batches in plan:
+        used = batches * recipe["required"]
+        if recipe["material"] == "shards":
+            user_data["shards"] -= used
+        else:
+            user_data["duplicates"][recipe["material"]] -= used
+        attempts += batches * recipe["attempts"]
+    user_data["cards_today"] += attempts
+    return attempts
+
+
+async def craft(user_id, user_data, recipe_keys=None, max_batches=None):
+    """Plans and applies craft under the user lock, returns (plan, attempts)"""
+    async with user_lock(user_id):
+        ensure_craft_fields(user_data)
+        plan = plan_craft(user_data, recipe_keys, max_batches)
+        attempts = apply_craft(user_data, plan)
+
+    if attempts:
+        events.emit("craft_done", user_id, attempts)
+        craft_logger.info(f"✅ Craft completed for {user_id}: {attempts} additional attempts")
+    return plan, attempts
+
+
+def format_used_materials(plan):
+    """Returns list of materials spent by craft plan"""
+    return [f"{batches * recipe['required']} {recipe['emoji']}" for recipe, batches in plan]
+
+
+def format_craft_all_result(plan, attempts, user_data):
+    """Returns mass craft result message"""
+    return (
+        f"🎉 Mass crafting completed!\n\n"
+        f"📦 Materials used:\n"
+        f"{chr(10).join(f'• {material}' for material in format_used_materials(plan))}\n\n"
+        f"🎁 Additional attempts received: {attempts}\n\n"
+        f"🎴 Total available attempts: {user_data['cards_today']}\n\n"
+        f"💡 Use the '🎴 Get Card' button!"
+    )
+
+
 class CraftSystem:
     def __init__(self, user_db, cards_db):
         self.user_db = user_db
         self.cards_db = cards_db
-        craft_logger.info("🎯 CraftSystem.__init__ called")
-        craft_logger.info(f"📊 user_db type: {type(user_db)}, cards_db type: {type(cards_db)}")
         craft_logger.info("✅ Craft system initialized")
 
     async def show_craft_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
         """Shows craft menu"""
-        craft_logger.info(f"🎯🎯🎯 show_craft_menu CALLED for user_id: {user_id}")
-        print(f"🚨🚨🚨 SHOW_CRAFT_MENU CALLED FOR USER: {user_id}")
+        craft_logger.info(f"🎯 show_craft_menu called for user_id: {user_id}")
+        query = update.callback_query
 
         try:
-            craft_logger.info("🔄 Getting callback_query...")
-            query = update.callback_query
-            craft_logger.info(f"📞 callback_query received: {type(query)}")
-            craft_logger.info("🔄 Calling query.answer()...")
             await query.answer()
-            craft_logger.info("✅ query.answer() executed")
 
-            # Get user data
-            craft_logger.info(f"🔍 Getting user_data for user_id: {user_id}")
             user_data = self.user_db.get(user_id)
-            craft_logger.info(f"📊 user_data: {user_data is not None}")
-
             if not user_data:
                 craft_logger.error(f"❌ User data not found for {user_id}")
-                craft_logger.info("🔄 Trying to create error message...")
                 await query.edit_message_text("❌ Error: user data not found")
-                craft_logger.info("✅ Error message sent")
                 return
 
-            # Initialize duplicates if not exists
-            if "duplicates" not in user_data:
-                craft_logger.info("🆕 Initializing duplicates for user")
-                user_data["duplicates"] = {
-                    "Common": 0, "Rare": 0, "Epic": 0, "Legend": 0, "Mythic": 0
-                }
-
-            # Initialize shards if not exists
-            if "shards" not in user_data:
-                craft_logger.info("🆕 Initializing shards for user")
-                user_data["shards"] = 0
-
-            # Initialize cards_today if not exists
-            if "cards_today" not in user_data:
-                craft_logger.info("🆕 Initializing cards_today for user")
-                user_data["cards_today"] = 0
-
+            ensure_craft_fields(user_data)
             username = user_data.get("username", "Player")
-            duplicates = user_data.get("duplicates", {})
-            shards = user_data.get("shards", 0)
-            cards_today = user_data.get("cards_today", 0)
-
-            craft_logger.info(f"📊 User data: username={username}, duplicates={duplicates}, shards={shards}, cards_today={cards_today}")
 
-            # Format text
-            craft_logger.info("🔄 Formatting menu text...")
             text = f"🍙 {username}, you can craft additional attempts from duplicates and shards.\n\n"
             text += "🌀 Your duplicates and shards\n"
 
-            # Rarity list for display
-            rarities = [
-                ("Common", "⚡️", "Common"),
-                ("Rare", "✨", "Rare"),
-                ("Epic", "🐉", "Epic"),
-                ("Legend", "🎲", "Legendary"),
-                ("Mythic", "💎", "Mythic")
-            ]
+            recipes = list(CRAFT_RECIPES.values())
+            for i, recipe in enumerate(recipes):
+                corner = "┏" if i == 0 else "┗" if i == len(recipes) - 1 else "┣"
+                text += f"{corner}{recipe['emoji']} {recipe['name']} - {get_material_count(user_data, recipe)}\n"
 
-            # Add rarities in ASCII format
-            for i, (rarity, emoji, name) in enumerate(rarities):
-                count = duplicates.get(rarity, 0)
-                if i == 0:
-                    text += f"┏{emoji} {name} - {count}\n"
-                elif i == len(rarities) - 1:
-                    text += f"┣{emoji} {name} - {count}\n"
-                    text += f"┗🀄️ Shards - {shards}\n"
-                else:
-                    text += f"┣{emoji} {name} - {count}\n"
-
-            text += f"\n🎴 Available attempts: {cards_today}\n\n"
+            text += f"\n🎴 Available attempts: {user_data['cards_today']}\n\n"
             text += "🍡 Craft costs\n"
-            text += "╔10 ⚡️ cards ➠ 1 additional attempt\n"
-            text += "╠10 ✨ cards ➠ 2 additional attempts\n"
-            text += "╠10 🐉 cards ➠ 4 additional attempts\n"
-            text += "╠10 🎲 cards ➠ 8 additional attempts\n"
-            text += "╠10 💎 cards ➠ 16 additional attempts\n"
-            text += "╚10 🀄️ shards ➠ 1 additional attempt\n\n"
-            text += "💡 Additional attempts can be used immediately via '🎴 Get Card' button!\n"
-            text += "🛢️ To craft from all materials at once, type command 'Craft all'"
-
-            craft_logger.info("✅ Menu text formatted")
-
-            # Create buttons
-            craft_logger.info("🔄 Creating craft buttons...")
-            buttons = []
-
-            # Check which rarities can be crafted
-            craftable_rarities = []
-            for rarity, emoji, name in rarities:
-                count = duplicates.get(rarity, 0)
-                craft_logger.info(f"🔍 Checking {rarity}: {count} duplicates")
-                if count >= 10:
-                    craftable_rarities.append((rarity, emoji, name))
-                    craft_logger.info(f"✅ Craft available for {rarity}")
-
-            # Add buttons for available crafts
-            for rarity, emoji, name in craftable_rarities:
-                callback_data = f"craft_{rarity.lower()}"
-                craft_logger.info(f"➕ Adding button: {callback_data}")
-                buttons.append([InlineKeyboardButton(f"Craft from {emoji}", callback_data=callback_data)])
-
-            # Button for shards if available
-            if shards >= 10:
-                craft_logger.info("✅ Adding button for shards")
-                buttons.append([InlineKeyboardButton("Craft from 🀄️", callback_data="craft_shards")])
+            for i, recipe in enumerate(recipes):
+                corner = "╔" if i == 0 else "╚" if i == len(recipes) - 1 else "╠"
+                material = "shards" if recipe["material"] == "shards" else "cards"
+                plural = "s" if recipe["attempts"] > 1 else ""
+                text += f"{corner}{recipe['required']} {recipe['emoji']} {material} ➠ {recipe['attempts']} additional attempt{plural}\n"
+            text += "\n💡 Additional attempts can be used immediately via '🎴 Get Card' button!\n"
+            text += "🛢️ To craft from all materials at once, press 'Craft All' or type 'Craft all'"
+
+            plan = plan_craft(user_data)
+            buttons = [
+                [InlineKeyboardButton(f"Craft from {recipe['emoji']}", callback_data=f"craft_{key}")]
+                for key, recipe in CRAFT_RECIPES.items()
+                if get_material_count(user_data, recipe) >= recipe["required"]
+            ]
+            if len(plan) > 1:
+                buttons.append([InlineKeyboardButton("🛢️ Craft All", callback_data="craft_all")])
 
             # If no available crafts
             if not buttons:
-                craft_logger.info("❌ No available crafts")
                 buttons.append([InlineKeyboardButton("❌ Not enough materials", callback_data="none")])
 
             buttons.append([InlineKeyboardButton("🔙 Back", callback_data="back_to_profile")])
 
-            craft_logger.info(f"📋 Created {len(buttons)} button rows")
-            craft_logger.info(f"🔘 Total buttons: {sum(len(row) for row in buttons)}")
-
-            # Create keyboard
-            craft_logger.info("🔄 Creating InlineKeyboardMarkup...")
-            keyboard = InlineKeyboardMarkup(buttons)
-            craft_logger.info("✅ Keyboard created")
-
-            craft_logger.info(f"📤 Sending menu with {len(buttons)} buttons")
-            craft_logger.info(f"📝 Text length: {len(text)}")
-
-            craft_logger.info("🔄 Calling query.edit_message_text...")
             await query.edit_message_text(
                 text,
-                reply_markup=keyboard
+                reply_markup=InlineKeyboardMarkup(buttons)
             )
 
-            craft_logger.info("✅ Craft menu successfully sent")
-            print(f"🎉🎉🎉 SHOW_CRAFT_MENU SUCCESSFULLY EXECUTED FOR USER: {user_id}")
-
         except Exception as e:
             craft_logger.error(f"❌ Critical error in show_craft_menu: {e}", exc_info=True)
-            print(f"💥💥💥 ERROR IN SHOW_CRAFT_MENU: {e}")
             try:
-                craft_logger.info("🔄 Trying to send alert...")
                 await query.answer("❌ Error loading craft menu", show_alert=True)
-                craft_logger.info("✅ Alert sent")
             except Exception as alert_error:
                 craft_logger.error(f"❌ Error sending alert: {alert_error}")
 
-    async def craft_from_duplicates(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, rarity: str):
-        """Craft from duplicates - adds attempts to cards_today"""
-        craft_logger.info(f"🎯 craft_from_duplicates called: user_id={user_id}, rarity={rarity}")
-        print(f"🔨 CRAFT_FROM_DUPLICATES CALLED: user_id={user_id}, rarity={rarity}")
+    async def craft_one_batch(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, recipe_key: str):
+        """Crafts one batch of recipe"""
+        craft_logger.info(f"🎯 craft_one_batch called: user_id={user_id}, recipe={recipe_key}")
+        query = update.callback_query
 
         try:
-            query = update.callback_query
-            craft_logger.info("✅ callback_query received")
-
-            await query.answer()
-            craft_logger.info("✅ query.answer() executed")
-
             user_data = self.user_db.get(user_id)
-            if not user_data:
-                craft_logger.error(f"❌ User data not found for {user_id}")
-                await query.answer("❌ Error: user data not found", show_alert=True)
+            recipe = CRAFT_RECIPES.get(recipe_key)
+            if not user_data or not recipe:
+                await query.answer("❌ Unknown craft", show_alert=True)
                 return
 
-            # Initialize duplicates if not exists
-            if "duplicates" not in user_data:
-                user_data["duplicates"] = {
-                    "Common": 0, "Rare": 0, "Epic": 0, "Legend": 0, "Mythic": 0
-                }
-
-            # Initialize cards_today if not exists
-            if "cards_today" not in user_data:
-                user_data["cards_today"] = 0
-
-            duplicates = user_data.get("duplicates", {})
-
-            # Craft settings
-            craft_settings = {
-                "common": {"required": 10, "attempts": 1, "emoji": "⚡️", "name": "Common", "key": "Common"},
-                "rare": {"required": 10, "attempts": 2, "emoji": "✨", "name": "Rare", "key": "Rare"},
-                "epic": {"required": 10, "attempts": 4, "emoji": "🐉", "name": "Epic", "key": "Epic"},
-                "legend": {"required": 10, "attempts": 8, "emoji": "🎲", "name": "Legendary", "key": "Legend"},
-                "mythic": {"required": 10, "attempts": 16, "emoji": "💎", "name": "Mythic", "key": "Mythic"}
-            }
-
-            setting = craft_settings.get(rarity.lower())
-            if not setting:
-                craft_logger.error(f"❌ Unknown rarity: {rarity}")
-                await query.answer("❌ Unknown rarity", show_alert=True)
+            plan, attempts = await craft(user_id, user_data, [recipe_key], max_batches=1)
+            if not attempts:
+                current = get_material_count(user_data, recipe)
+                material = "shards" if recipe["material"] == "shards" else f"{recipe['name']} duplicates"
+                await query.answer(
+                    f"❌ Not enough {material}! Need {recipe['required']}, you have {current}",
+                    show_alert=True
+                )
                 return
 
-            # Get duplicates count
-            rarity_key = setting["key"]
-            current_duplicates = duplicates.get(rarity_key, 0)
-            craft_logger.info(f"📊 {rarity_key} duplicates: {current_duplicates}")
-
-            if current_duplicates < setting["required"]:
-                error_msg = f"❌ Not enough {setting['name']} duplicates! Need {setting['required']}, you have {current_duplicates}"
-                craft_logger.warning(error_msg)
-                await query.answer(error_msg, show_alert=True)
-                return
-
-            # Execute craft - ADD ATTEMPTS TO cards_today
-            user_data["duplicates"][rarity_key] = current_duplicates - setting["required"]
-            user_data["cards_today"] = user_data.get("cards_today", 0) + setting["attempts"]
-            craft_logger.info(f"✅ Craft completed: used {setting['required']} {setting['emoji']}, received {setting['attempts']} additional attempts")
-
+            await query.answer()
+            material = "🀄️ shards" if recipe["material"] == "shards" else f"{recipe['emoji']} {recipe['name']} duplicates"
+            remaining = "shards" if recipe["material"] == "shards" else f"{recipe['name']} duplicates"
             text = (
                 f"🎉 Successful craft!\n\n"
-                f"📦 Used: {setting['required']} {setting['emoji']} {setting['name']} duplicates\n"
-                f"🎁 Received: {setting['attempts']} additional attempts\n\n"
-                f"🌀 Remaining {setting['name']} duplicates: {user_data['duplicates'][rarity_key]}\n\n"
+                f"📦 Used: {recipe['required']} {material}\n"
+                f"🎁 Received: {attempts} additional attempt{'s' if attempts > 1 else ''}\n\n"
+                f"🌀 Remaining {remaining}: {get_material_count(user_data, recipe)}\n\n"
                 f"🎴 Total available attempts: {user_data['cards_today']}\n\n"
                 f"💡 Use the '🎴 Get Card' button!"
             )
 
             buttons = [
-                [InlineKeyboardButton("🔄 Craft more", callback_data=f"craft_{rarity.lower()}")],
+                [InlineKeyboardButton("🔄 Craft more", callback_data=f"craft_{recipe_key}")],
                 [InlineKeyboardButton("📋 To craft menu", callback_data="craft_menu")],
                 [InlineKeyboardButton("🎴 Get Card", callback_data="none")],
                 [InlineKeyboardButton("🔙 Back", callback_data="back_to_profile")]
@@ -245,84 +207,39 @@ class CraftSystem:
                 reply_markup=InlineKeyboardMarkup(buttons)
             )
 
-            craft_logger.info("✅ Craft message successfully sent")
-
         except Exception as e:
-            craft_logger.error(f"❌ Error in craft_from_duplicates: {e}", exc_info=True)
+            craft_logger.error(f"❌ Error in craft_one_batch: {e}", exc_info=True)
             try:
                 await query.answer("❌ Error during craft", show_alert=True)
             except Exception as alert_error:
                 craft_logger.error(f"❌ Error sending alert: {alert_error}")
 
+    async def craft_from_duplicates(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, rarity: str):
+        """Craft from duplicates - adds attempts to cards_today"""
+        await self.craft_one_batch(update, context, user_id, rarity.lower())
+
     async def craft_from_shards(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
         """Craft from shards - adds attempts to cards_today"""
-        craft_logger.info(f"🎯 craft_from_shards called: user_id={user_id}")
-        print(f"🔨 CRAFT_FROM_SHARDS CALLED: user_id={user_id}")
-
-        try:
-            query = update.callback_query
-            craft_logger.info("✅ callback_query received")
-
-            await query.answer()
-            craft_logger.info("✅ query.answer() executed")
-
-            user_data = self.user_db.get(user_id)
-            if not user_data:
-                craft_logger.error(f"❌ User data not found for {user_id}")
-                await query.answer("❌ Error: user data not found", show_alert=True)
-                return
-
-            # Initialize shards if not exists
-            if "shards" not in user_data:
-                user_data["shards"] = 0
-
-            # Initialize cards_today if not exists
-            if "cards_today" not in user_data:
-                user_data["cards_today"] = 0
-
-            shards = user_data.get("shards", 0)
-            required_shards = 10
-            attempts_given = 1
-
-            craft_logger.info(f"📊 Shards: {shards}, required: {required_shards}")
-
-            if shards < required_shards:
-                error_msg = f"❌ Not enough shards! Need {required_shards}, you have {shards}"
-                craft_logger.warning(error_msg)
-                await query.answer(error_msg, show_alert=True)
-                return
-
-            # Execute craft - ADD ATTEMPTS TO cards_today
-            user_data["shards"] = shards - required_shards
-            user_data["cards_today"] = user_data.get("cards_today", 0) + attempts_given
-            craft_logger.info(f"✅ Craft from shards completed: used {required_shards}, received {attempts_given} additional attempts")
-
-            text = (
-                f"🎉 Successful craft!\n\n"
-                f"📦 Used: {required_shards} 🀄️ shards\n"
-                f"🎁 Received: {attempts_given} additional attempt\n\n"
-                f"🌀 Remaining shards: {user_data['shards']}\n\n"
-                f"🎴 Total available attempts: {user_data['cards_today']}\n\n"
-                f"💡 Use the '🎴 Get Card' button!"
-            )
-
-            buttons = [
-                [InlineKeyboardButton("🔄 Craft more", callback_data="craft_shards")],
+        await self.craft_one_batch(update, context, user_id, "shards")
+
+    async def craft_all(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+        """Crafts from all materials at once (menu button)"""
+        query = update.callback_query
+        user_data = self.user_db.get(user_id)
+        if not user_data:
+            await query.answer("❌ Error: user data not found", show_alert=True)
+            return
+
+        plan, attempts = await craft(user_id, user_data)
+        if not attempts:
+            await query.answer("❌ Not enough materials for crafting!", show_alert=True)
+            return
+
+        await query.answer()
+        await query.edit_message_text(
+            format_craft_all_result(plan, attempts, user_data),
+            reply_markup=InlineKeyboardMarkup([
                 [InlineKeyboardButton("📋 To craft menu", callback_data="craft_menu")],
-                [InlineKeyboardButton("🎴 Get Card", callback_data="none")],
                 [InlineKeyboardButton("🔙 Back", callback_data="back_to_profile")]
-            ]
-
-            await query.edit_message_text(
-                text,
-                reply_markup=InlineKeyboardMarkup(buttons)
-            )
-
-            craft_logger.info("✅ Shard craft message successfully sent")
-
-        except Exception as e:
-            craft_logger.error(f"❌ Error in craft_from_shards: {e}", exc_info=True)
-            try:
-                await query.answer("❌ Error during craft", show_alert=True)
-            except Exception as alert_error:
-                craft_logger.error(f"❌ Error sending alert: {alert_error}")
+            ])
+        )
@@ -0,0 +1,125 @@
+# Closed-form arena duel rules, free of Telegram imports so they can run in worker processes
+import random
+
+ROUNDS_PER_BATTLE = 5
+
+
+def hits_to_kill(attack, health):
+    """Returns attacks needed to defeat card, None if it can't be defeated"""
+    # Health is checked after each attack, so even a defeated card takes one
+    if health <= 0:
+        return 1
+    if attack <= 0:
+        return None
+    return -(-health // attack)
+
+
+def duel_winner(attack, health, enemy_attack, enemy_health):
+    """Returns 1 if first card wins, -1 if enemy card wins, 0 if nobody can win
+
+    First card attacks first, then cards exchange attacks until one is defeated.
+    """
+    hits_needed = hits_to_kill(attack, enemy_health)
+    enemy_hits_needed = hits_to_kill(enemy_attack, health)
+
+    if hits_needed is None and enemy_hits_needed is None:
+        return 0
+    if enemy_hits_needed is None or (hits_needed is not None and hits_needed <= enemy_hits_needed):
+        return 1
+    return -1
+
+
+def battle_rounds(team, enemy_team):
+    """Returns (wins, enemy_wins) for two teams of card dicts"""
+    wins = 0
+    enemy_wins = 0
+    for card, enemy_card in list(zip(team, enemy_team))[:ROUNDS_PER_BATTLE]:
+        result = duel_winner(
+            card.get("attack", 0), card.get("max_health", card.get("health", 0)),
+            enemy_card.get("attack", 0), enemy_card.get("max_health", enemy_card.get("health", 0))
+        )
+        if result > 0:
+            wins += 1
+        elif result < 0:
+            enemy_wins += 1
+    return wins, enemy_wins
+
+
+def play_match(team, enemy_team):
+    """Returns (wins, enemy_wins) for two teams of (attack, health) tuples"""
+    wins = 0
+    enemy_wins = 0
+    for (attack, health), (enemy_attack, enemy_health) in list(zip(team, enemy_team))[:ROUNDS_PER_BATTLE]:
+        result = duel_winner(attack, health, enemy_attack, enemy_health)
+        if result > 0:
+            wins += 1
+        elif result < 0:
+            enemy_wins += 1
+    return wins, enemy_wins
+
+
+def run_swiss_tournament(entries, rounds, seed):
+    """Plays Swiss rounds and returns standings sorted by place
+
+    entries: list of (user_id, team) where team is a list of (attack, health).
+    Win gives 1 point, draw 0.5, bye 1. Ties are broken by opponents' points
+    (Buchholz), then by rounds won minus rounds lost.
+    """
+    rng = random.Random(seed)
+    teams = dict(entries)
+    players = {
+        user_id: {"user_id": user_id, "points": 0.0, "round_diff": 0,
+                  "wins": 0, "draws": 0, "losses": 0, "byes": 0}
+        for user_id in teams
+    }
+    opponents = {user_id: [] for user_id in teams}
+
+    seeding = list(teams)
+    rng.shuffle(seeding)
+
+    for _ in range(rounds):
+        # Stable sort keeps the random seeding as the last tie-break
+        ranking = sorted(seeding, key=lambda user_id: (-players[user_id]["points"], -players[user_id]["round_diff"]))
+
+        if len(ranking) % 2:
+            bye_player = next(
+                (user_id for user_id in reversed(ranking) if not players[user_id]["byes"]),
+                ranking[-1]
+            )
+            ranking.remove(bye_player)
+            players[bye_player]["byes"] += 1
+            players[bye_player]["points"] += 1
+
+        while ranking:
+            player = ranking.pop(0)
+            # Closest-ranked opponent not met yet, rematch only if unavoidable
+            opponent = next((user_id for user_id in ranking if user_id not in opponents[player]), ranking[0])
+            ranking.remove(opponent)
+            opponents[player].append(opponent)
+            opponents[opponent].append(player)
+
+            wins, enemy_wins = play_match(teams[player], teams[opponent])
+            players[player]["round_diff"] += wins - enemy_wins
+            players[opponent]["round_diff"] += enemy_wins - wins
+
+            if wins > enemy_wins:
+                winner, loser = player, opponent
+            elif enemy_wins > wins:
+                winner, loser = opponent, player
+            else:
+                for user_id in (player, opponent):
+                    players[user_id]["points"] += 0.5
+                    players[user_id]["draws"] += 1
+                continue
+
+            players[winner]["points"] += 1
+            players[winner]["wins"] += 1
+            players[loser]["losses"] += 1
+
+    for user_id, stats in players.items():
+        stats["buchholz"] = sum(players[opponent]["points"] for opponent in opponents[user_id])
+
+    return sorted(
+        players.values(),
+        key=lambda stats: (-stats["points"], -stats["buchholz"], -stats["round_diff"])
+    )
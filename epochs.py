@@ -0,0 +1,49 @@
+import time
+
+# Day/week numbers in local time. A counter remembers the epoch it was
+# written in and is reset lazily on first access in a newer epoch, so no job
+# has to walk every user at midnight.
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def day_epoch(timestamp=None):
+    """Returns number of local days since 1970-01-01"""
+    timestamp = time.time() if timestamp is None else timestamp
+    return int((timestamp + time.localtime(timestamp).tm_gmtoff) // SECONDS_PER_DAY)
+
+
+def week_epoch(timestamp=None):
+    """Returns number of local Monday-started weeks since 1970-01-01"""
+    # 1970-01-01 was a Thursday
+    return (day_epoch(timestamp) + 3) // 7
+
+
+def current_epoch(period, timestamp=None):
+    """Returns epoch of daily/weekly period, 0 for periods that never reset"""
+    if period == "daily":
+        return day_epoch(timestamp)
+    if period == "weekly":
+        return week_epoch(timestamp)
+    return 0
+
+
+def seconds_until_next(period, timestamp=None):
+    """Returns seconds left until period's next reset"""
+    timestamp = time.time() if timestamp is None else timestamp
+    offset = time.localtime(timestamp).tm_gmtoff
+    if period == "weekly":
+        next_start = (week_epoch(timestamp) + 1) * 7 - 3
+    else:
+        next_start = day_epoch(timestamp) + 1
+    return max(0, next_start * SECONDS_PER_DAY - offset - timestamp)
+
+
+def roll(record, epoch_field, epoch, counter_fields):
+    """Zeroes counter fields if record was last written in an older epoch, returns True on reset"""
+    if record.get(epoch_field) == epoch:
+        return False
+    for field in counter_fields:
+        record[field] = 0
+    record[epoch_field] = epoch
+    return True
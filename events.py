@@ -0,0 +1,21 @@
+import logging
+from collections import defaultdict
+
+# In-process game events: game code emits them, systems like quests subscribe
+# card_pulled(rarity, is_new), battle_won, craft_done(amount = attempts), referral_joined
+
+_handlers = defaultdict(list)
+
+
+def subscribe(event, handler):
+    """Registers handler(event, user_id, amount, details) for event"""
+    _handlers[event].append(handler)
+
+
+def emit(event, user_id, amount=1, **details):
+    """Delivers event to every subscribed handler"""
+    for handler in _handlers.get(event, ()):
+        try:
+            handler(event, user_id, amount, details)
+        except Exception as e:
+            logging.error(f"Error handling {event} event: {e}")
@@ -0,0 +1,415 @@
+import math
+import heapq
+import random
+from collections import defaultdict
+
+# Enough levels for tens of millions of entries
+SKIP_LIST_MAX_LEVEL = 24
+# Histogram bucket boundaries grow by 5%, about 570 buckets up to 10^12
+HISTOGRAM_GROWTH = 1.05
+# Largest score bucket scanned to find neighbours outside the skip list
+WINDOW_SCAN_LIMIT = 50000
+
+
+class SkipNode:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, level):
+        self.key = key
+        self.next = [None] * level
+        # Number of positions each link skips over
+        self.width = [1] * level
+
+
+class IndexedSkipList:
+    """Sorted list of unique keys with O(log n) insert, remove, rank and index"""
+
+    def __init__(self):
+        self.head = SkipNode(None, SKIP_LIST_MAX_LEVEL)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def random_level(self):
+        """Returns level for new node"""
+        level = 1
+        while level < SKIP_LIST_MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        return level
+
+    def find_chain(self, key):
+        """Returns last node before key on each level and their positions"""
+        chain = [None] * SKIP_LIST_MAX_LEVEL
+        positions = [0] * SKIP_LIST_MAX_LEVEL
+        node = self.head
+        position = 0
+        for level in reversed(range(SKIP_LIST_MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+            positions[level] = position
+        return chain, positions
+
+    def insert(self, key):
+        """Inserts key"""
+        chain, positions = self.find_chain(key)
+        level_count = self.random_level()
+        new_node = SkipNode(key, level_count)
+
+        for level in range(level_count):
+            prev = chain[level]
+            steps = positions[0] - positions[level]
+            new_node.next[level] = prev.next[level]
+            prev.next[level] = new_node
+            new_node.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+
+        for level in range(level_count, SKIP_LIST_MAX_LEVEL):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        """Removes key, raises KeyError if it is missing"""
+        chain, _ = self.find_chain(key)
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+
+        for level in range(len(target.next), SKIP_LIST_MAX_LEVEL):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def rank(self, key):
+        """Returns number of keys smaller than key"""
+        node = self.head
+        position = 0
+        for level in reversed(range(SKIP_LIST_MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def slice(self, start, count):
+        """Returns up to count keys starting at index start"""
+        if start < 0 or start >= self.size or count <= 0:
+            return []
+
+        node = self.head
+        remaining = start + 1
+        for level in reversed(range(SKIP_LIST_MAX_LEVEL)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class ScoreHistogram:
+    """Log-bucketed score counts for approximate rank of any score"""
+
+    def __init__(self, growth=HISTOGRAM_GROWTH):
+        self.log_growth = math.log(growth)
+        self.counts = []
+        self.total = 0
+
+    def get_position(self, score):
+        """Returns fractional bucket position of score"""
+        return math.log1p(max(0, score)) / self.log_growth
+
+    def get_bucket(self, score):
+        """Returns bucket index of score"""
+        return int(self.get_position(score))
+
+    def add(self, score, count=1):
+        """Counts score"""
+        bucket = self.get_bucket(score)
+        if bucket >= len(self.counts):
+            self.counts.extend([0] * (bucket + 1 - len(self.counts)))
+        self.counts[bucket] += count
+        self.total += count
+
+    def remove(self, score):
+        """Forgets score"""
+        self.add(score, -1)
+
+    def count_above(self, score):
+        """Estimates number of scores higher than score"""
+        position = self.get_position(score)
+        bucket = int(position)
+        if bucket >= len(self.counts):
+            return 0
+
+        # Scores are assumed to be spread evenly inside a bucket
+        higher = sum(self.counts[bucket + 1:])
+        return higher + self.counts[bucket] * (bucket + 1 - position)
+
+    def count_above_bucket(self, bucket):
+        """Returns exact number of scores in higher buckets"""
+        return sum(self.counts[bucket + 1:])
+
+
+class Leaderboard:
+    """Per-category rankings updated incrementally as scores change
+
+    With exact_band set, each skip list only keeps the best players (about twice
+    the band); everyone else is counted in the score histogram only.
+    """
+
+    def __init__(self, score_functions, exact_band=None):
+        self.score_functions = score_functions
+        self.exact_band = exact_band
+        self.boards = {category: IndexedSkipList() for category in score_functions}
+        self.scores = {category: {} for category in score_functions}
+        self.histograms = {category: ScoreHistogram() for category in score_functions}
+        # Users of each histogram bucket, for neighbours outside the skip list
+        self.bucket_members = {category: defaultdict(set) for category in score_functions}
+        # Users whose key sorts before the boundary are in the skip list, None means everyone
+        self.boundaries = {category: None for category in score_functions}
+        # Users re-scored while a board is rebuilt from a copy of the scores, None when no rebuild runs
+        self.changed = {category: None for category in score_functions}
+
+    def __len__(self):
+        return len(next(iter(self.scores.values()), ()))
+
+    def in_board(self, category, key):
+        """Returns True if key belongs to category's skip list"""
+        boundary = self.boundaries[category]
+        return boundary is None or key < boundary
+
+    def count(self, category, user_id, score):
+        """Adds score to histogram and its bucket members"""
+        histogram = self.histograms[category]
+        histogram.add(score)
+        self.bucket_members[category][histogram.get_bucket(score)].add(user_id)
+
+    def uncount(self, category, user_id, score):
+        """Removes score from histogram and its bucket members"""
+        histogram = self.histograms[category]
+        histogram.remove(score)
+        bucket = histogram.get_bucket(score)
+        members = self.bucket_members[category][bucket]
+        members.discard(user_id)
+        if not members:
+            del self.bucket_members[category][bucket]
+
+    def load(self, users):
+        """Indexes (user_id, user_data) pairs in bulk"""
+        for user_id, user_data in users:
+            for category, score_function in self.score_functions.items():
+                score = score_function(user_data)
+                previous = self.scores[category].get(user_id)
+                if previous is not None:
+                    self.uncount(category, user_id, previous)
+                self.scores[category][user_id] = score
+                self.count(category, user_id, score)
+
+        for category in self.score_functions:
+            # A rebuild started before the load would swap in a stale board
+            self.changed[category] = None
+            self.rebuild_board(category)
+
+    def build_board(self, scores):
+        """Returns (skip list, boundary) built from {user_id: score}, touches no shared state (O(n))"""
+        keys = ((-score, user_id) for user_id, score in scores.items())
+        boundary = None
+        if self.exact_band:
+            keep = 2 * self.exact_band
+            keys = heapq.nsmallest(keep + 1, keys)
+            boundary = keys[keep] if len(keys) > keep else None
+            keys = keys[:keep]
+
+        board = IndexedSkipList()
+        for key in keys:
+            board.insert(key)
+        return board, boundary
+
+    def rebuild_board(self, category):
+        """Rebuilds skip list from all scores of category (O(n))"""
+        self.boards[category], self.boundaries[category] = self.build_board(self.scores[category])
+
+    def begin_rebuild(self, category):
+        """Starts tracking re-scored users, returns copy of scores to build the board from or None if a rebuild runs"""
+        if self.changed[category] is not None:
+            return None
+        self.changed[category] = set()
+        return dict(self.scores[category])
+
+    def finish_rebuild(self, category, scores, board, boundary):
+        """Swaps in board built from scores, replaying users re-scored meanwhile"""
+        changed = self.changed[category]
+        self.changed[category] = None
+        if changed is None:
+            return False
+
+        current = self.scores[category]
+        for user_id in changed:
+            if user_id in scores:
+                old_key = (-scores[user_id], user_id)
+                if boundary is None or old_key < boundary:
+                    board.remove(old_key)
+            if user_id in current:
+                key = (-current[user_id], user_id)
+                if boundary is None or key < boundary:
+                    board.insert(key)
+
+        self.boards[category] = board
+        self.boundaries[category] = boundary
+        return True
+
+    def update(self, user_id, user_data):
+        """Re-scores user in every category"""
+        for category, score_function in self.score_functions.items():
+            score = score_function(user_data)
+            scores = self.scores[category]
+            if scores.get(user_id) == score:
+                continue
+            if self.changed[category] is not None:
+                self.changed[category].add(user_id)
+
+            if user_id in scores:
+                old_key = (-scores[user_id], user_id)
+                if self.in_board(category, old_key):
+                    self.boards[category].remove(old_key)
+                self.uncount(category, user_id, scores[user_id])
+
+            # Higher score first, lower user ID first on ties
+            key = (-score, user_id)
+            if self.in_board(category, key):
+                self.boards[category].insert(key)
+            self.count(category, user_id, score)
+            scores[user_id] = score
+
+    def remove(self, user_id):
+        """Removes user from every category"""
+        for category, scores in self.scores.items():
+            if user_id in scores:
+                if self.changed[category] is not None:
+                    self.changed[category].add(user_id)
+                score = scores.pop(user_id)
+                if self.in_board(category, (-score, user_id)):
+                    self.boards[category].remove((-score, user_id))
+                self.uncount(category, user_id, score)
+
+    def trim(self, category):
+        """Keeps skip list close to twice the exact band, returns True if it needs a rebuild"""
+        if not self.exact_band:
+            return False
+
+        board = self.boards[category]
+        keep = 2 * self.exact_band
+        if len(board) > 2 * keep:
+            # Cheap: drop the tail, everyone after it is already outside
+            tail = board.slice(keep, len(board))
+            for key in tail:
+                board.remove(key)
+            self.boundaries[category] = tail[0]
+        # Top players lost score, the band has to be refilled from all scores (rare)
+        return len(board) < self.exact_band and len(self.scores[category]) > len(board)
+
+    def get_score(self, category, user_id):
+        """Returns indexed score or None"""
+        return self.scores[category].get(user_id)
+
+    def get_board_size(self, category):
+        """Returns number of players with exact rank"""
+        return len(self.boards[category])
+
+    def top(self, category, limit=10, start=0):
+        """Returns [(user_id, score)] ordered by place"""
+        return [(user_id, -negative_score) for negative_score, user_id in self.boards[category].slice(start, limit)]
+
+    def rank(self, category, user_id):
+        """Returns exact 1-based place of user or None if it is outside the skip list"""
+        score = self.scores[category].get(user_id)
+        if score is None or not self.in_board(category, (-score, user_id)):
+            return None
+        return self.boards[category].rank((-score, user_id)) + 1
+
+    def approximate_rank(self, category, score):
+        """Returns estimated 1-based place for score"""
+        histogram = self.histograms[category]
+        rank = min(histogram.total, int(histogram.count_above(score)) + 1)
+        # Everyone in the skip list is ahead of players outside it
+        return max(rank, len(self.boards[category]) + 1)
+
+    def keys_after_board(self, category, count):
+        """Returns up to count best keys of players outside the skip list, best first"""
+        boundary = self.boundaries[category]
+        if boundary is None or count <= 0:
+            return []
+
+        # Everyone in the skip list sorts before the boundary, so buckets from the
+        # boundary's one downwards hold the next players in order
+        histogram = self.histograms[category]
+        scores = self.scores[category]
+        keys = []
+        bucket = histogram.get_bucket(-boundary[0])
+        while len(keys) < count and bucket >= 0:
+            members = self.bucket_members[category].get(bucket, ())
+            if len(members) > WINDOW_SCAN_LIMIT:
+                break
+            bucket_keys = ((-scores[member_id], member_id) for member_id in members)
+            keys += heapq.nsmallest(count - len(keys), (other for other in bucket_keys if other >= boundary))
+            bucket -= 1
+        return keys
+
+    def window(self, category, user_id, radius=5):
+        """Returns [(rank, user_id, score)] of players around user, or [] if user is unknown"""
+        score = self.scores[category].get(user_id)
+        if score is None:
+            return []
+
+        key = (-score, user_id)
+        if self.in_board(category, key):
+            board = self.boards[category]
+            start = max(0, board.rank(key) - radius)
+            keys = board.slice(start, 2 * radius + 1)
+            # Skip list ran out: players right after it come from the histogram buckets
+            keys += self.keys_after_board(category, 2 * radius + 1 - len(keys))
+            return [(start + offset + 1, neighbour_id, -negative_score) for offset, (negative_score, neighbour_id) in enumerate(keys)]
+
+        # Outside the skip list: exact rank from higher buckets plus a scan of own bucket
+        histogram = self.histograms[category]
+        bucket = histogram.get_bucket(score)
+        members = self.bucket_members[category].get(bucket, ())
+        if len(members) > WINDOW_SCAN_LIMIT:
+            return [(self.approximate_rank(category, score), user_id, score)]
+
+        scores = self.scores[category]
+        bucket_keys = [(-scores[member_id], member_id) for member_id in members]
+        rank = histogram.count_above_bucket(bucket) + sum(1 for other in bucket_keys if other < key) + 1
+
+        above = heapq.nlargest(radius, (other for other in bucket_keys if other < key))
+        below = heapq.nsmallest(radius, (other for other in bucket_keys if other > key))
+
+        # Borrow from neighbouring buckets when own bucket has too few players
+        higher_bucket = bucket + 1
+        while len(above) < radius and higher_bucket < len(histogram.counts):
+            higher_members = self.bucket_members[category].get(higher_bucket, ())
+            if len(higher_members) > WINDOW_SCAN_LIMIT:
+                break
+            above += heapq.nlargest(radius - len(above), ((-scores[member_id], member_id) for member_id in higher_members))
+            higher_bucket += 1
+
+        lower_bucket = bucket - 1
+        while len(below) < radius and lower_bucket >= 0:
+            lower_members = self.bucket_members[category].get(lower_bucket, ())
+            if len(lower_members) > WINDOW_SCAN_LIMIT:
+                break
+            below += heapq.nsmallest(radius - len(below), ((-scores[member_id], member_id) for member_id in lower_members))
+            lower_bucket -= 1
+
+        keys = list(reversed(above)) + [key] + below
+        first_rank = rank - len(above)
+        return [(first_rank + offset, neighbour_id, -negative_score) for offset, (negative_score, neighbour_id) in enumerate(keys)]
@@ -0,0 +1,25 @@
+import asyncio
+import weakref
+
+# One asyncio lock per user (or promo code), dropped automatically once nobody holds it
+_user_locks = weakref.WeakValueDictionary()
+_promo_locks = weakref.WeakValueDictionary()
+
+
+def _get_lock(locks, key):
+    """Returns lock stored under key, creating it if needed"""
+    lock = locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        locks[key] = lock
+    return lock
+
+
+def user_lock(user_id):
+    """Returns lock serializing changes to one user's balances"""
+    return _get_lock(_user_locks, user_id)
+
+
+def promo_lock(code):
+    """Returns lock serializing redemptions of one promo code"""
+    return _get_lock(_promo_locks, code)
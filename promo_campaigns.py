@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import secrets
+import logging
+from array import array
+
+# Campaign storage settings
+CAMPAIGN_DIR = "promo_campaigns"
+CAMPAIGN_MAX_CODES = 200000       # Codes per /create_campaign call
+CAMPAIGN_CODE_LENGTH = 8          # Random base32 characters after the prefix (40 bits)
+
+
+def hash_code(code):
+    """Returns 64-bit hash of normalized code; plain codes are never stored"""
+    digest = hashlib.blake2b(code.upper().encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def generate_codes(prefix, count, taken=()):
+    """Returns count unique random codes PREFIX-XXXXXXXX whose hashes are not in taken"""
+    codes = set()
+    hashes = set()
+    while len(codes) < count:
+        random_part = base64.b32encode(secrets.token_bytes(CAMPAIGN_CODE_LENGTH * 5 // 8)).decode("ascii")
+        code = f"{prefix}-{random_part}"
+        code_hash = hash_code(code)
+        if code_hash in taken or code_hash in hashes:
+            continue
+        codes.add(code)
+        hashes.add(code_hash)
+    return sorted(codes)
+
+
+class PromoCampaigns:
+    """Bulk single-use codes sharing one reward template per campaign"""
+
+    def __init__(self, directory=CAMPAIGN_DIR):
+        self.directory = directory
+        self.meta_file = os.path.join(directory, "campaigns.json")
+        os.makedirs(directory, exist_ok=True)
+
+        self.campaigns = {}
+        # Hash of every unredeemed code -> campaign name, one dict lookup per redemption
+        self.code_index = {}
+        # Codes taken by redemptions in flight, still saved as unredeemed
+        self.held = {}
+        # Campaigns whose code file is behind code_index
+        self.changed = set()
+        self.load_campaigns()
+        logging.info(f"🔄 Promo campaigns initialization ({len(self.campaigns)} campaigns, {len(self.code_index)} codes)")
+
+    def codes_path(self, name):
+        """Returns file with sorted unredeemed code hashes of campaign"""
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def load_campaigns(self):
+        """Loads campaign templates and their code hashes"""
+        if not os.path.exists(self.meta_file):
+            return
+
+        try:
+            with open(self.meta_file, "r", encoding="utf-8") as f:
+                self.campaigns = json.load(f)
+        except Exception as e:
+            logging.error(f"Error loading promo campaigns: {e}")
+            return
+
+        for name in self.campaigns:
+            hashes = array("Q")
+            try:
+                with open(self.codes_path(name), "rb") as f:
+                    hashes.frombytes(f.read())
+            except Exception as e:
+                logging.error(f"Error loading codes of campaign {name}: {e}")
+            self.code_index.update(dict.fromkeys(hashes, name))
+
+    def save_campaigns(self, journal_seq):
+        """Saves templates and rewrites code files of changed campaigns"""
+        try:
+            for campaign in self.campaigns.values():
+                campaign["journal_seq"] = journal_seq
+            with open(self.meta_file, "w", encoding="utf-8") as f:
+                json.dump(self.campaigns, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            logging.error(f"Error saving promo campaigns: {e}")
+            return
+
+        if not self.changed:
+            return
+        hashes = {name: [] for name in self.changed}
+        for index in (self.code_index, self.held):
+            for code_hash, owner in index.items():
+                if owner in hashes:
+                    hashes[owner].append(code_hash)
+        for name, campaign_hashes in hashes.items():
+            self.save_codes(name, campaign_hashes)
+        self.changed.clear()
+
+    def save_codes(self, name, hashes):
+        """Writes campaign's code hashes as sorted uint64 array"""
+        try:
+            with open(self.codes_path(name), "wb") as f:
+                array("Q", sorted(hashes)).tofile(f)
+        except Exception as e:
+            logging.error(f"Error saving codes of campaign {name}: {e}")
+
+    def create_campaign(self, name, rewards, count, expires_in_hours=None, created_seq=0):
+        """Generates count single-use codes for new campaign, returns them in plain text once"""
+        name = name.upper()
+        codes = generate_codes(name, count, self.code_index)
+        hashes = [hash_code(code) for code in codes]
+
+        self.campaigns[name] = {
+            "rewards": rewards,
+            "size": count,
+            "redeemed": 0,
+            "expires_at": time.time() + expires_in_hours * 3600 if expires_in_hours else None,
+            "created_at": time.time(),
+            # Journal entries up to this seq belong to an earlier campaign of the same name
+            "created_seq": created_seq
+        }
+        self.code_index.update(dict.fromkeys(hashes, name))
+        self.save_codes(name, hashes)
+        logging.info(f"✅ Promo campaign created: {name} ({count} codes)")
+        return codes
+
+    def delete_campaign(self, name):
+        """Deletes campaign with its unredeemed codes"""
+        name = name.upper()
+        if name not in self.campaigns:
+            return False
+
+        del self.campaigns[name]
+        self.code_index = {code_hash: owner for code_hash, owner in self.code_index.items() if owner != name}
+        self.changed.discard(name)
+        try:
+            os.remove(self.codes_path(name))
+        except FileNotFoundError:
+            pass
+        return True
+
+    def find(self, code):
+        """Returns campaign name of unredeemed code, or None"""
+        return self.code_index.get(hash_code(code))
+
+    def take(self, code):
+        """Holds unredeemed code for redemption in flight, returns its hash"""
+        code_hash = hash_code(code)
+        self.held[code_hash] = self.code_index.pop(code_hash)
+        return code_hash
+
+    def put_back(self, code_hash):
+        """Returns held code to unredeemed ones"""
+        name = self.held.pop(code_hash)
+        if name in self.campaigns:
+            self.code_index[code_hash] = name
+
+    def mark_redeemed(self, code_hash):
+        """Counts held code as redeemed, returns its campaign name"""
+        name = self.held.pop(code_hash)
+        if name in self.campaigns:
+            self.campaigns[name]["redeemed"] += 1
+            self.changed.add(name)
+        return name
+
+    def replay(self, entry):
+        """Applies journaled redemption newer than campaign's snapshot"""
+        campaign = self.campaigns.get(entry["code"])
+        if not campaign or entry["seq"] <= campaign.get("journal_seq", 0):
+            return False
+        if self.code_index.pop(entry["hash"], None) is None:
+            return False
+        campaign["redeemed"] += 1
+        self.changed.add(entry["code"])
+        return True
@@ -1,114 +1,549 @@
-import json
 import os
+import json
+import time
+import heapq
+import bisect
+import struct
 import logging
-from datetime import datetime, timedelta
+import counters
+from collections import defaultdict
+from datetime import datetime
+from telegram.ext import ContextTypes
+from seasons import add_sp
+from locks import user_lock, promo_lock
+from bitmap import RoaringBitmap
+from user_index import UserIndex
+from promo_campaigns import PromoCampaigns
+
+# Promo code settings
+PROMO_SWEEP_INTERVAL = 60     # Seconds between expired code sweeps
+PROMO_PAGE_SIZE = 10          # Codes per /list_promos page
+PROMO_JOURNAL_FLUSH_INTERVAL = 5       # Seconds between batched redemption journal writes
+PROMO_JOURNAL_COMPACT_SIZE = 10000     # Journal entries before counters are snapshotted
+PROMO_USAGE_HEADER = struct.Struct("<HI")  # key bytes, bitmap bytes of one code in promo_usage.bin
+
+
+def to_epoch(value):
+    """Returns epoch seconds of stored date; older files kept ISO strings"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return value
+
+
+class PromoCode:
+    """Promo code record, dates are epoch seconds"""
+
+    __slots__ = ("rewards", "max_uses", "uses_count", "expires_at", "is_active", "created_at",
+                 "journal_seq", "created_seq", "migrated")
+
+    def __init__(self, rewards, max_uses=None, uses_count=0, expires_at=None, is_active=True,
+                 created_at=None, journal_seq=0, created_seq=0):
+        self.rewards = rewards
+        self.max_uses = max_uses
+        self.uses_count = uses_count
+        self.expires_at = expires_at
+        self.is_active = is_active
+        self.created_at = time.time() if created_at is None else created_at
+        self.journal_seq = journal_seq
+        # Journal entries up to this seq belong to an earlier code of the same name
+        self.created_seq = created_seq
+        # Loaded from ISO dates and must be saved in the current format
+        self.migrated = False
+
+    @classmethod
+    def from_dict(cls, data):
+        """Builds record from stored dict"""
+        promo = cls(
+            data.get("rewards", {}),
+            data.get("max_uses"),
+            data.get("uses_count", 0),
+            to_epoch(data.get("expires_at")),
+            data.get("is_active", True),
+            to_epoch(data.get("created_at")),
+            data.get("journal_seq", 0),
+            data.get("created_seq", 0)
+        )
+        promo.migrated = isinstance(data.get("expires_at"), str) or isinstance(data.get("created_at"), str)
+        return promo
+
+    def to_dict(self):
+        """Returns dict for storage"""
+        return {
+            "rewards": self.rewards,
+            "max_uses": self.max_uses,
+            "uses_count": self.uses_count,
+            "expires_at": self.expires_at,
+            "is_active": self.is_active,
+            "created_at": self.created_at,
+            "journal_seq": self.journal_seq,
+            "created_seq": self.created_seq
+        }
+
+
+def load_records(data):
+    """Returns {code: PromoCode} of stored codes"""
+    return {code: PromoCode.from_dict(details) for code, details in data.items()}
+
+
+def dump_records(promo_codes):
+    """Returns storable dict of promo codes"""
+    return {code: promo.to_dict() for code, promo in promo_codes.items()}
+
 
 class PromoCodeSystem:
     def __init__(self, user_db):
         self.user_db = user_db
         self.promo_codes_file = "promo_codes.json"
+        self.archive_file = "promo_archive.json"
+        self.journal_file = "promo_journal.jsonl"
+        self.usage_file = "promo_usage.bin"
+        # Redemptions in flight: counted against max_uses, not yet in uses_count
+        self.reserved = defaultdict(int)
+        # (code or campaign, user index) marked used by redemptions in flight
+        self.held_usage = set()
+        self.pending_journal = []
+        self.campaigns = PromoCampaigns()
+        self.user_index = UserIndex()
+        self.load_usage()
         self.load_promo_codes()
+        self.migrate_user_sets()
 
     def load_promo_codes(self):
         """Loads promo codes from file"""
+        self.promo_codes = {}
+        self.archived_codes = {}
+        self.journal_seq = 0
         if not os.path.exists(self.promo_codes_file):
-            self.promo_codes = {}
             self.save_promo_codes()
+        else:
+            try:
+                with open(self.promo_codes_file, "r", encoding="utf-8") as f:
+                    self.promo_codes = load_records(json.load(f))
+            except Exception as e:
+                logging.error(f"Error loading promo codes: {e}")
+
+        if os.path.exists(self.archive_file):
+            try:
+                with open(self.archive_file, "r", encoding="utf-8") as f:
+                    self.archived_codes = load_records(json.load(f))
+            except Exception as e:
+                logging.error(f"Error loading promo archive: {e}")
+
+        self.replay_journal()
+        self.rebuild_indexes()
+        if any(promo.migrated for promo in self.promo_codes.values()):
+            self.save_promo_codes()
+        if any(promo.migrated for promo in self.archived_codes.values()):
+            self.save_archive()
+
+    def replay_journal(self):
+        """Applies journaled redemptions newer than the snapshot of their code"""
+        self.journal_seq = max(
+            [promo.journal_seq for promo in self.promo_codes.values()] +
+            [promo.journal_seq for promo in self.archived_codes.values()] +
+            [campaign.get("journal_seq", 0) for campaign in self.campaigns.campaigns.values()] + [0]
+        )
+        self.journal_entries = 0
+        if not os.path.exists(self.journal_file):
             return
 
         try:
-            with open(self.promo_codes_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                # Convert date strings back to objects
-                for code, details in data.items():
-                    if details.get("expires_at"):
-                        details["expires_at"] = datetime.fromisoformat(details["expires_at"])
-                self.promo_codes = data
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                lines = f.readlines()
         except Exception as e:
-            logging.error(f"Error loading promo codes: {e}")
-            self.promo_codes = {}
+            logging.error(f"Error loading promo journal: {e}")
+            return
+
+        replayed = 0
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Torn last line after a crash
+                continue
+
+            self.journal_entries += 1
+            self.journal_seq = max(self.journal_seq, entry["seq"])
+            if "hash" in entry:
+                # Campaign code: entry's "code" is the campaign name
+                campaign = self.campaigns.campaigns.get(entry["code"])
+                if not campaign or entry["seq"] <= campaign.get("created_seq", 0):
+                    continue
+                replayed += self.campaigns.replay(entry)
+            else:
+                promo = self.promo_codes.get(entry["code"]) or self.archived_codes.get(entry["code"])
+                if not promo or entry["seq"] <= promo.created_seq:
+                    continue
+                if entry["seq"] > promo.journal_seq:
+                    promo.uses_count += 1
+                    replayed += 1
+
+            # Marking usage is idempotent, so it is redone even for snapshotted entries,
+            # but never for entries of a deleted code recreated under the same name
+            self.mark_used(entry["code"], entry["user_id"])
+
+        if replayed:
+            logging.info(f"🧾 Replayed promo redemptions from journal: {replayed}")
 
     def save_promo_codes(self):
         """Saves promo codes to file"""
         try:
-            # Convert datetime to strings for JSON
-            data_to_save = {}
-            for code, details in self.promo_codes.items():
-                data_to_save[code] = details.copy()
-                if data_to_save[code].get("expires_at"):
-                    data_to_save[code]["expires_at"] = data_to_save[code]["expires_at"].isoformat()
-
+            # Snapshot covers every redemption journaled so far
+            for promo in self.promo_codes.values():
+                promo.journal_seq = self.journal_seq
             with open(self.promo_codes_file, "w", encoding="utf-8") as f:
-                json.dump(data_to_save, f, indent=2, ensure_ascii=False)
+                json.dump(dump_records(self.promo_codes), f, indent=2, ensure_ascii=False)
         except Exception as e:
             logging.error(f"Error saving promo codes: {e}")
 
+    def save_archive(self):
+        """Saves expired promo codes to archive file"""
+        try:
+            for promo in self.archived_codes.values():
+                promo.journal_seq = self.journal_seq
+            with open(self.archive_file, "w", encoding="utf-8") as f:
+                json.dump(dump_records(self.archived_codes), f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            logging.error(f"Error saving promo archive: {e}")
+
+    def load_usage(self):
+        """Loads per-code bitmaps of users who redeemed it"""
+        # code or campaign name -> RoaringBitmap of dense user indexes
+        self.usage = {}
+        if not os.path.exists(self.usage_file):
+            return
+
+        try:
+            with open(self.usage_file, "rb") as f:
+                data = f.read()
+        except Exception as e:
+            logging.error(f"Error loading promo usage: {e}")
+            return
+
+        offset = 0
+        while offset < len(data):
+            key_size, bitmap_size = PROMO_USAGE_HEADER.unpack_from(data, offset)
+            offset += PROMO_USAGE_HEADER.size
+            key = data[offset:offset + key_size].decode("utf-8")
+            offset += key_size
+            self.usage[key] = RoaringBitmap.from_bytes(data[offset:offset + bitmap_size])
+            offset += bitmap_size
+
+    def save_usage(self):
+        """Saves per-code usage bitmaps, leaving out redemptions in flight"""
+        held = defaultdict(list)
+        for key, index in self.held_usage:
+            held[key].append(index)
+
+        parts = []
+        for key, bitmap in self.usage.items():
+            if key in held:
+                bitmap = bitmap.copy()
+                for index in held[key]:
+                    bitmap.discard(index)
+            key_bytes = key.encode("utf-8")
+            bitmap_bytes = bitmap.to_bytes()
+            parts.append(PROMO_USAGE_HEADER.pack(len(key_bytes), len(bitmap_bytes)))
+            parts.append(key_bytes)
+            parts.append(bitmap_bytes)
+
+        try:
+            with open(self.usage_file, "wb") as f:
+                f.write(b"".join(parts))
+        except Exception as e:
+            logging.error(f"Error saving promo usage: {e}")
+
+    def migrate_user_sets(self):
+        """Moves used_promo_codes of old user records into usage bitmaps"""
+        migrated = 0
+        for user_id, user_data in self.user_db.items():
+            for key in user_data.pop("used_promo_codes", ()):
+                self.mark_used(key, user_id)
+                migrated += 1
+        if migrated:
+            self.save_usage()
+            logging.info(f"🔄 Promo usage migrated from user records: {migrated}")
+
+    def has_used(self, key: str, user_id: int):
+        """Checks if user redeemed code (or a code of campaign)"""
+        index = self.user_index.get(user_id)
+        return index is not None and key in self.usage and index in self.usage[key]
+
+    def mark_used(self, key: str, user_id: int):
+        """Records that user redeemed code, returns user's dense index"""
+        index = self.user_index.get_or_add(user_id)
+        self.usage.setdefault(key, RoaringBitmap()).add(index)
+        return index
+
+    def unmark_used(self, key: str, user_id: int):
+        """Forgets redemption of code by user"""
+        index = self.user_index.get(user_id)
+        if index is not None and key in self.usage:
+            self.usage[key].discard(index)
+
+    def get_audience(self, key: str):
+        """Returns user IDs that redeemed code (or codes of campaign)"""
+        return [self.user_index.user_id(index) for index in self.usage.get(key.upper(), ())]
+
+    def count_audience(self, key: str):
+        """Returns how many users redeemed code (or codes of campaign)"""
+        return len(self.usage.get(key.upper(), ()))
+
+    def rebuild_indexes(self):
+        """Builds expiry heap and sorted active code index"""
+        # Heap entries are (expires_at, code); stale ones are skipped when popped
+        self.expiry_heap = [
+            (promo.expires_at, code) for code, promo in self.promo_codes.items()
+            if promo.expires_at
+        ]
+        heapq.heapify(self.expiry_heap)
+        self.active_codes = sorted(
+            code for code, promo in self.promo_codes.items() if promo.is_active
+        )
+
+    def index_code(self, code: str):
+        """Updates heap and active index after code was created or changed"""
+        promo = self.promo_codes[code]
+        if promo.expires_at:
+            heapq.heappush(self.expiry_heap, (promo.expires_at, code))
+
+        position = bisect.bisect_left(self.active_codes, code)
+        indexed = position < len(self.active_codes) and self.active_codes[position] == code
+        if promo.is_active and not indexed:
+            self.active_codes.insert(position, code)
+        elif not promo.is_active and indexed:
+            del self.active_codes[position]
+
+    def unindex_code(self, code: str):
+        """Removes code from active index"""
+        position = bisect.bisect_left(self.active_codes, code)
+        if position < len(self.active_codes) and self.active_codes[position] == code:
+            del self.active_codes[position]
+
+    def sweep_expired(self, now: float = None):
+        """Moves expired codes to archive, returns how many were archived"""
+        now = time.time() if now is None else now
+        expired = 0
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            expires_at, code = heapq.heappop(self.expiry_heap)
+            promo = self.promo_codes.get(code)
+            # Entry is stale if code was deleted or its expiry was edited
+            if not promo or promo.expires_at != expires_at:
+                continue
+
+            promo.is_active = False
+            self.archived_codes[code] = self.promo_codes.pop(code)
+            self.unindex_code(code)
+            expired += 1
+
+        if expired:
+            self.save_promo_codes()
+            self.save_archive()
+            logging.info(f"🧹 Archived expired promo codes: {expired}")
+        return expired
+
+    async def sweep_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """JobQueue callback archiving expired codes"""
+        self.sweep_expired()
+
+    def restore_archived(self, code: str):
+        """Moves archived code back to live codes, returns True if it was archived"""
+        if code not in self.archived_codes:
+            return False
+        self.promo_codes[code] = self.archived_codes.pop(code)
+        self.save_archive()
+        return True
+
     def create_promo_code(self, code: str, rewards: dict,
                          max_uses: int = None,
                          expires_in_hours: int = None,
                          is_active: bool = True):
-        """Creates new promo code"""
+        """Creates a new promo code, returns False if a campaign has this name"""
+        code = code.upper()
+        # Codes and campaigns share usage keys, so names must not collide
+        if code in self.campaigns.campaigns:
+            return False
+
         expires_at = None
         if expires_in_hours:
-            expires_at = datetime.now() + timedelta(hours=expires_in_hours)
-
-        self.promo_codes[code.upper()] = {
-            "rewards": rewards,
-            "max_uses": max_uses,
-            "uses_count": 0,
-            "expires_at": expires_at,
-            "is_active": is_active,
-            "created_at": datetime.now().isoformat()
-        }
+            expires_at = time.time() + (expires_in_hours * 3600)
+
+        if self.archived_codes.pop(code, None) is not None:
+            self.save_archive()
+        self.promo_codes[code] = PromoCode(rewards, max_uses, expires_at=expires_at, is_active=is_active,
+                                           created_seq=self.journal_seq)
+        self.index_code(code)
         self.save_promo_codes()
         logging.info(f"✅ Promo code created: {code}")
+        return True
 
     def deactivate_promo_code(self, code: str):
         """Deactivates promo code"""
         if code.upper() in self.promo_codes:
-            self.promo_codes[code.upper()]["is_active"] = False
+            self.promo_codes[code.upper()].is_active = False
+            self.unindex_code(code.upper())
+            self.save_promo_codes()
+            return True
+        return code.upper() in self.archived_codes
+
+    def activate_promo_code(self, code: str):
+        """Activates promo code"""
+        code = code.upper()
+        if code in self.promo_codes or self.restore_archived(code):
+            self.promo_codes[code].is_active = True
+            self.index_code(code)
             self.save_promo_codes()
+            # Code restored from archive with a past expiry goes back right away
+            self.sweep_expired()
             return True
         return False
 
+    def delete_promo_code(self, code: str):
+        """Deletes promo code"""
+        code = code.upper()
+        if code in self.promo_codes:
+            del self.promo_codes[code]
+            self.unindex_code(code)
+            self.save_promo_codes()
+        elif code in self.archived_codes:
+            del self.archived_codes[code]
+            self.save_archive()
+        else:
+            return False
+
+        if self.usage.pop(code, None) is not None:
+            self.save_usage()
+        return True
+
+    def edit_promo_code(self, code: str, param: str, value):
+        """Edits promo code parameters"""
+        code = code.upper()
+        if code not in self.promo_codes and not self.restore_archived(code):
+            return False
+
+        promo = self.promo_codes[code]
+
+        if param == "max_uses":
+            promo.max_uses = int(value) if value.lower() != "none" else None
+        elif param == "expires_hours":
+            if value.lower() == "none":
+                promo.expires_at = None
+            else:
+                promo.expires_at = time.time() + (int(value) * 3600)
+            # Extending an archived code brings it back into play
+            promo.is_active = True
+        elif param == "is_active":
+            promo.is_active = value.lower() == "true"
+        else:
+            return False
+
+        self.index_code(code)
+        self.save_promo_codes()
+        self.sweep_expired()
+        return True
+
+    def has_promo_code(self, code: str):
+        """Checks if code exists, live or archived"""
+        code = code.upper()
+        return code in self.promo_codes or code in self.archived_codes
+
     def check_promo_code(self, code: str, user_id: int):
         """Checks promo code for user"""
         code = code.upper()
 
+        # Cheap when nothing is due: only the heap top is looked at
+        self.sweep_expired()
+
+        if code in self.archived_codes:
+            return {"success": False, "message": "❌ Promo code has expired"}
+
         if code not in self.promo_codes:
-            return {"success": False, "message": "❌ Promo code not found"}
+            return self.check_campaign_code(code, user_id)
 
         promo = self.promo_codes[code]
 
         # Check activity
-        if not promo.get("is_active", True):
+        if not promo.is_active:
             return {"success": False, "message": "❌ Promo code is not active"}
 
-        # Check expiration
-        if promo.get("expires_at") and datetime.now() > promo["expires_at"]:
-            return {"success": False, "message": "❌ Promo code has expired"}
-
         # Check usage limit
-        if promo.get("max_uses") and promo.get("uses_count", 0) >= promo["max_uses"]:
+        if promo.max_uses and promo.uses_count + self.reserved.get(code, 0) >= promo.max_uses:
             return {"success": False, "message": "❌ Promo code usage limit reached"}
 
         # Check reuse
-        if user_id in self.user_db and code in self.user_db[user_id].get("used_promo_codes", set()):
+        if self.has_used(code, user_id):
             return {"success": False, "message": "❌ You have already used this promo code"}
 
-        return {"success": True, "promo": promo}
+        return {"success": True, "promo": promo, "rewards": promo.rewards, "code": code}
+
+    def check_campaign_code(self, code: str, user_id: int):
+        """Checks single-use campaign code for user"""
+        name = self.campaigns.find(code)
+        if name is None:
+            return {"success": False, "message": "❌ Promo code not found"}
+
+        campaign = self.campaigns.campaigns[name]
+        if campaign.get("expires_at") and time.time() > campaign["expires_at"]:
+            return {"success": False, "message": "❌ Promo code has expired"}
+
+        # One code per campaign for each user
+        if self.has_used(name, user_id):
+            return {"success": False, "message": "❌ You have already used a code of this campaign"}
+
+        return {"success": True, "promo": campaign, "rewards": campaign["rewards"], "code": code, "campaign": name}
 
-    def apply_promo_code(self, code: str, user_id: int):
-        """Applies promo code for user"""
+    def reserve_redemption(self, code: str, user_id: int):
+        """Checks promo code and holds one use of it for user"""
         check_result = self.check_promo_code(code, user_id)
         if not check_result["success"]:
             return check_result
 
-        promo = check_result["promo"]
-        user_data = self.user_db[user_id]
-        rewards = promo["rewards"]
+        if "campaign" in check_result:
+            check_result["hash"] = self.campaigns.take(code)
+            check_result["key"] = check_result["campaign"]
+        else:
+            self.reserved[code] += 1
+            check_result["key"] = code
+        index = self.mark_used(check_result["key"], user_id)
+        self.held_usage.add((check_result["key"], index))
+        return check_result
+
+    def release_redemption(self, reservation: dict, user_id: int):
+        """Gives back use held by reserve_redemption"""
+        self.held_usage.discard((reservation["key"], self.user_index.get(user_id)))
+        self.unmark_used(reservation["key"], user_id)
+        if "campaign" in reservation:
+            self.campaigns.put_back(reservation["hash"])
+            return
+
+        code = reservation["code"]
+        self.reserved[code] -= 1
+        if not self.reserved[code]:
+            del self.reserved[code]
+
+    def commit_redemption(self, reservation: dict, user_id: int):
+        """Turns held use into a counted one and journals it"""
+        self.held_usage.discard((reservation["key"], self.user_index.get(user_id)))
+        self.journal_seq += 1
+        entry = {"seq": self.journal_seq, "code": reservation["code"], "user_id": user_id, "time": int(time.time())}
+
+        if "campaign" in reservation:
+            self.campaigns.mark_redeemed(reservation["hash"])
+            entry["code"] = reservation["campaign"]
+            entry["hash"] = reservation["hash"]
+        else:
+            code = reservation["code"]
+            self.reserved[code] -= 1
+            if not self.reserved[code]:
+                del self.reserved[code]
+            promo = self.promo_codes.get(code) or self.archived_codes.get(code)
+            if promo:
+                promo.uses_count += 1
+
+        self.pending_journal.append(entry)
 
-        # Give rewards
+    def give_rewards(self, user_data, rewards: dict):
+        """Gives promo rewards to user, returns rewards text"""
         reward_text = "🎁 Rewards received:\n"
 
         if "money" in rewards:
@@ -116,7 +551,7 @@ class PromoCodeSystem:
             reward_text += f"💰 Money: +{rewards['money']:,}\n"
 
         if "sp" in rewards:
-            user_data["total_sp"] += rewards["sp"]
+            add_sp(user_data, rewards["sp"])
             reward_text += f"💎 SP: +{rewards['sp']:,}\n"
 
         if "cards_today" in rewards:
@@ -135,31 +570,105 @@ class PromoCodeSystem:
         if "cards" in rewards:
             for rarity, card_names in rewards["cards"].items():
                 for card_name in card_names:
-                    if card_name not in user_data["cards"][rarity]:
-                        user_data["cards"][rarity].add(card_name)
+                    if counters.add_card(user_data, rarity, card_name):
+                        counters.record_pulls(user_data)
                         reward_text += f"🃏 New card: {card_name} ({rarity})\n"
 
-        # Update promo code statistics
-        self.promo_codes[code.upper()]["uses_count"] += 1
-        user_data["used_promo_codes"].add(code.upper())
+        return reward_text
 
-        self.save_promo_codes()
+    async def redeem_promo_code(self, code: str, user_id: int):
+        """Redeems promo code for user: reserve, give rewards, commit"""
+        code = code.upper()
+        async with promo_lock(code):
+            reservation = self.reserve_redemption(code, user_id)
+        if not reservation["success"]:
+            return reservation
 
+        try:
+            async with user_lock(user_id):
+                reward_text = self.give_rewards(self.user_db[user_id], reservation["rewards"])
+        except Exception as e:
+            logging.error(f"Error applying promo code {code}: {e}")
+            self.release_redemption(reservation, user_id)
+            return {"success": False, "message": "❌ Error applying promo code, try again later"}
+
+        self.commit_redemption(reservation, user_id)
         return {
             "success": True,
             "message": f"✅ Promo code activated!\n\n{reward_text}"
         }
 
+    def flush(self):
+        """Appends pending redemptions to journal, compacts it once it grows large"""
+        if not self.pending_journal:
+            return
+
+        try:
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in self.pending_journal))
+        except Exception as e:
+            logging.error(f"Error writing promo journal: {e}")
+            return
+
+        self.journal_entries += len(self.pending_journal)
+        self.pending_journal = []
+        if self.journal_entries >= PROMO_JOURNAL_COMPACT_SIZE:
+            self.compact_journal()
+
+    def compact_journal(self):
+        """Snapshots counters and truncates journal"""
+        # Snapshots are stamped with journal_seq, so a crash before truncation
+        # cannot make replay count a redemption twice
+        self.save_promo_codes()
+        self.save_archive()
+        self.campaigns.save_campaigns(self.journal_seq)
+        self.save_usage()
+        try:
+            open(self.journal_file, "w").close()
+            self.journal_entries = 0
+        except Exception as e:
+            logging.error(f"Error compacting promo journal: {e}")
+
+    async def flush_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """JobQueue callback for batched journal writes"""
+        self.flush()
+
     def get_promo_stats(self):
         """Returns promo code statistics"""
-        active_codes = {code: data for code, data in self.promo_codes.items()
-                       if data.get("is_active", True)}
-
         return {
-            "total_codes": len(self.promo_codes),
-            "active_codes": len(active_codes),
-            "details": active_codes
+            "total_codes": len(self.promo_codes) + len(self.archived_codes),
+            "active_codes": len(self.active_codes),
+            "archived_codes": len(self.archived_codes),
+            "campaigns": len(self.campaigns.campaigns),
+            "campaign_codes": len(self.campaigns.code_index)
         }
 
-# Create global instance
-promo_system = None
+    def create_campaign(self, name: str, rewards: dict, count: int, expires_in_hours: int = None):
+        """Creates campaign of single-use codes, returns codes or None if name is taken"""
+        name = name.upper()
+        if self.has_promo_code(name) or name in self.campaigns.campaigns:
+            return None
+        codes = self.campaigns.create_campaign(name, rewards, count, expires_in_hours, self.journal_seq)
+        self.campaigns.save_campaigns(self.journal_seq)
+        return codes
+
+    def delete_campaign(self, name: str):
+        """Deletes campaign with its unredeemed codes"""
+        if not self.campaigns.delete_campaign(name):
+            return False
+        self.campaigns.save_campaigns(self.journal_seq)
+        if self.usage.pop(name.upper(), None) is not None:
+            self.save_usage()
+        return True
+
+    def get_active_page(self, page: int, page_size: int = PROMO_PAGE_SIZE):
+        """Returns ([(code, details)], page, pages) for one page of active codes"""
+        pages = max(1, -(-len(self.active_codes) // page_size))
+        page = min(max(page, 1), pages)
+        codes = self.active_codes[(page - 1) * page_size:page * page_size]
+        return [(code, self.promo_codes[code]) for code in codes], page, pages
+
+    def get_promo_info(self, code: str):
+        """Returns detailed info about specific promo code"""
+        code = code.upper()
+        return self.promo_codes.get(code) or self.archived_codes.get(code)
@@ -1,19 +1,181 @@
+import os
+import json
+import math
+import time
+import heapq
+import asyncio
 import logging
+import threading
+from datetime import datetime
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
+import counters
+from leaderboard import Leaderboard
+
+# Snapshot settings
+RATING_REFRESH_INTERVAL = 60      # Seconds between snapshot rebuilds
+RATING_MIN_REFRESH_INTERVAL = 5
+RATING_TOP_SIZE = 10
+RATING_EXACT_BAND = 1000          # Places with exact rank, below it rank is estimated
+RATING_JOB_NAME = "rating_refresh"
+RATING_AROUND_RADIUS = 5          # Players shown above and below the caller
+RATING_FRIENDS_TOP_SIZE = 10
 
 class RatingSystem:
     def __init__(self, user_db, cards_db):
         self.user_db = user_db
         self.cards_db = cards_db
-        logging.info("🔄 Rating system initialization")
+        self.referral_system = None
+        self.leaderboard = Leaderboard({
+            "total": self.calculate_total_score,
+            "sp": lambda user_data: user_data.get("total_sp", 0),
+            "money": lambda user_data: user_data.get("money", 0),
+            "mythic": lambda user_data: counters.rarity_count(user_data, "Mythic"),
+            "season": lambda user_data: user_data.get("season_sp", 0),
+            "cups": lambda user_data: user_data.get("arena_cups", 0)
+        }, exact_band=RATING_EXACT_BAND)
+        self.leaderboard.load(list(user_db.items()))
+
+        # Leaderboard is read by the snapshot worker thread
+        self.lock = threading.Lock()
+        self.snapshots = {}
+        self.snapshot_time = None
+        self.refresh_interval = self.load_rating_settings().get("refresh_interval", RATING_REFRESH_INTERVAL)
+        logging.info(f"🔄 Rating system initialization ({len(self.leaderboard)} players indexed)")
+
+    def set_referral_system(self, referral_system):
+        """Connects referral system used for friend leaderboards"""
+        self.referral_system = referral_system
+
+    def load_rating_settings(self):
+        """Loads rating settings"""
+        try:
+            if os.path.exists("rating_settings.json"):
+                with open("rating_settings.json", "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except Exception as e:
+            logging.error(f"Error loading rating_settings.json: {e}")
+        return {}
+
+    def save_rating_settings(self):
+        """Saves rating settings"""
+        try:
+            with open("rating_settings.json", "w", encoding="utf-8") as f:
+                json.dump({"refresh_interval": self.refresh_interval}, f, indent=2)
+        except Exception as e:
+            logging.error(f"Error saving rating_settings.json: {e}")
+
+    def update_user(self, user_id):
+        """Re-indexes user after their stats changed"""
+        if user_id in self.user_db:
+            with self.lock:
+                self.leaderboard.update(user_id, self.user_db[user_id])
+
+    def reload(self):
+        """Re-indexes all users in one pass (after bulk changes like season reset)"""
+        with self.lock:
+            self.leaderboard.load(list(self.user_db.items()))
+        self.snapshots = {}
+
+    def rebuild_board(self, category):
+        """Rebuilds category's skip list outside the lock and swaps it in under it"""
+        with self.lock:
+            scores = self.leaderboard.begin_rebuild(category)
+        if scores is None:
+            return
+        board, boundary = self.leaderboard.build_board(scores)
+        with self.lock:
+            self.leaderboard.finish_rebuild(category, scores, board, boundary)
+
+    def build_snapshots(self):
+        """Builds top-N and exact band ranks of every category (runs in worker thread)"""
+        snapshots = {}
+        for category in self.leaderboard.scores:
+            with self.lock:
+                needs_rebuild = self.leaderboard.trim(category)
+            if needs_rebuild:
+                self.rebuild_board(category)
+            with self.lock:
+                band = self.leaderboard.top(category, RATING_EXACT_BAND)
+                total_players = len(self.leaderboard)
+
+            top = []
+            for user_id, score in band[:RATING_TOP_SIZE]:
+                user_data = self.user_db.get(user_id, {})
+                top.append({
+                    "user_id": user_id,
+                    "username": user_data.get("username", f"Player {user_id}"),
+                    "score": score
+                })
+
+            snapshots[category] = {
+                "top": top,
+                "ranks": {user_id: (rank, score) for rank, (user_id, score) in enumerate(band, 1)},
+                "total_players": total_players
+            }
+
+        self.snapshots = snapshots
+        self.snapshot_time = time.time()
+        return snapshots
+
+    async def refresh_snapshots(self, context: ContextTypes.DEFAULT_TYPE):
+        """Rebuilds snapshots off the event loop (JobQueue callback)"""
+        started = time.monotonic()
+        await asyncio.to_thread(self.build_snapshots)
+        logging.info(f"📊 Rating snapshots rebuilt in {time.monotonic() - started:.2f}s")
+
+    def schedule_refresh(self, job_queue):
+        """(Re)starts periodic snapshot rebuild"""
+        for job in job_queue.get_jobs_by_name(RATING_JOB_NAME):
+            job.schedule_removal()
+        job_queue.run_repeating(self.refresh_snapshots, interval=self.refresh_interval, first=0, name=RATING_JOB_NAME)
+
+    def set_refresh_interval(self, job_queue, seconds: int):
+        """Changes snapshot refresh interval"""
+        self.refresh_interval = max(RATING_MIN_REFRESH_INTERVAL, int(seconds))
+        self.save_rating_settings()
+        if job_queue:
+            self.schedule_refresh(job_queue)
+        return self.refresh_interval
+
+    def get_snapshot(self, category):
+        """Returns latest snapshot of category"""
+        if not self.snapshots:
+            # No refresh job ran yet (or JobQueue is unavailable)
+            self.build_snapshots()
+        return self.snapshots.get(category)
+
+    def get_rank_info(self, user_id, category):
+        """Returns (rank, score, is_exact, percentile) of user"""
+        snapshot = self.get_snapshot(category)
+        if snapshot and user_id in snapshot["ranks"]:
+            rank, score = snapshot["ranks"][user_id]
+            is_exact = True
+        else:
+            score = self.get_user_score(user_id, category)
+            with self.lock:
+                rank = self.leaderboard.rank(category, user_id)
+                is_exact = rank is not None
+                if not is_exact:
+                    # Below the exact band the rank is estimated from the score histogram
+                    rank = self.leaderboard.approximate_rank(category, score)
+
+        total_players = max(len(self.leaderboard), rank)
+        return rank, score, is_exact, rank / total_players * 100
+
+    def get_user_score(self, user_id, category):
+        """Returns user's score in category"""
+        if category not in self.leaderboard.scores:
+            return 0
+        self.update_user(user_id)
+        return self.leaderboard.get_score(category, user_id) or 0
 
     def calculate_total_score(self, user_data):
         """Calculates total rating based on all indicators"""
-        total_cards = sum(len(cards) for cards in user_data["cards"].values())
+        total_cards = counters.total_cards(user_data)
         total_sp = user_data.get("total_sp", 0)
         money = user_data.get("money", 0)
-        mythic_cards = len(user_data["cards"].get("Mythic", []))
+        mythic_cards = counters.rarity_count(user_data, "Mythic")
         arena_wins = user_data.get("battles_won", 0)
         arena_cups = user_data.get("arena_cups", 0)
 
@@ -31,51 +193,73 @@ class RatingSystem:
 
     def get_top_players(self, category="total", limit=10):
         """Returns top players by category"""
-        players = []
+        if category not in self.leaderboard.scores:
+            return []
 
-        for user_id, user_data in self.user_db.items():
-            # Remove username filter to show all players
-            # Even if someone doesn't have username, use default name
-            username = user_data.get("username", f"Player {user_id}")                                                  
-            if category == "total":                                                                                                   
-                score = self.calculate_total_score(user_data)
-            elif category == "sp":
-                score = user_data.get("total_sp", 0)
-            elif category == "money":                                                                                                 
-                score = user_data.get("money", 0)
-            elif category == "mythic":
-                score = len(user_data["cards"].get("Mythic", []))                                                                 
-            else:
-                score = 0
-                                                                                                                                  
+        players = []
+        for user_id, score in self.leaderboard.top(category, limit):
+            user_data = self.user_db[user_id]
             players.append({
                 "user_id": user_id,
-                "username": username,                                                                                                 
+                "username": user_data.get("username", f"Player {user_id}"),
                 "score": score,
-                "total_cards": sum(len(cards) for cards in user_data["cards"].values()),
-                "total_sp": user_data.get("total_sp", 0),                                                                             
+                "total_cards": counters.total_cards(user_data),
+                "total_sp": user_data.get("total_sp", 0),
                 "money": user_data.get("money", 0),
-                "mythic_cards": len(user_data["cards"].get("Mythic", [])),
-                "arena_wins": user_data.get("battles_won", 0),                                                                        
+                "mythic_cards": counters.rarity_count(user_data, "Mythic"),
+                "arena_wins": user_data.get("battles_won", 0),
                 "arena_cups": user_data.get("arena_cups", 0)
             })
-                                                                                                                              
-        # Sort by descending score
-        players.sort(key=lambda x: x["score"], reverse=True)
-        return players[:limit]                                                                                        
-    
+        return players
+
     def get_user_rank(self, user_id, category="total"):
-        """Returns user's position in rating"""                                                                        
-        players = self.get_top_players(category, limit=10000)  # Take all players for accurate position
+        """Returns user's position in rating"""
+        if category not in self.leaderboard.scores:
+            return len(self.leaderboard) + 1
+        self.update_user(user_id)
+        with self.lock:
+            rank = self.leaderboard.rank(category, user_id)
+            if rank is None:
+                rank = self.leaderboard.approximate_rank(category, self.leaderboard.get_score(category, user_id) or 0)
+        return rank
+
+    def get_around(self, user_id, category="total", radius=RATING_AROUND_RADIUS):
+        """Returns [(rank, user_id, score)] of players around user"""
+        if category not in self.leaderboard.scores:
+            return []
+        self.update_user(user_id)
+        with self.lock:
+            return self.leaderboard.window(category, user_id, radius)
+
+    def get_friends(self, user_id):
+        """Returns IDs of user's referral circle, user included"""
+        friends = {user_id}
+        if self.referral_system:
+            referrer_id = self.referral_system.get_user_referrer(user_id)
+            if referrer_id:
+                friends.add(int(referrer_id))
+            friends.update(int(referral_id) for referral_id in self.referral_system.get_user_referrals(user_id))
+        return friends
+
+    def get_friends_top(self, user_id, category="total", limit=RATING_FRIENDS_TOP_SIZE):
+        """Returns (top [(user_id, score)], user's place, circle size) among friends"""
+        if category not in self.leaderboard.scores:
+            return [], 1, 1
+        self.update_user(user_id)
+        friends = self.get_friends(user_id)
+
+        # Scores come from the index, only the circle itself is ordered
+        keys = []
+        with self.lock:
+            for friend_id in friends:
+                score = self.leaderboard.get_score(category, friend_id)
+                if score is not None:
+                    keys.append((-score, friend_id))
+            user_key = (-(self.leaderboard.get_score(category, user_id) or 0), user_id)
+        place = sum(1 for key in keys if key < user_key) + 1
+        top = [(friend_id, -negative_score) for negative_score, friend_id in heapq.nsmallest(limit, keys)]
+        return top, place, len(keys)
 
-        # Find user index in sorted list                                                                
-        for index, player in enumerate(players):
-            if player["user_id"] == user_id:
-                return index + 1                                                                                      
-        
-        # If user not found in top, return total count + 1
-        return len(players) + 1                                                                                       
-    
     def format_score(self, score, category):
         """Formats score for display"""                                                                                
         if category == "total":
@@ -101,6 +285,10 @@ class RatingSystem:
                 return f"{score:,} $"                                                                                         
         elif category == "mythic":
             return f"{score:,} cards"
+        elif category == "season":
+            return self.format_score(score, "sp")
+        elif category == "cups":
+            return f"{score:,} 🏆"
         return f"{score:,}"                                                                                           
     
     def get_category_name(self, category):                                                                                    
@@ -109,7 +297,9 @@ class RatingSystem:
             "total": "🏆 Overall Top",
             "sp": "💎 Top SP",                                                                                                    
             "money": "💰 Top Money",
-            "mythic": "🔮 Top Mythic"
+            "mythic": "🔮 Top Mythic",
+            "season": "🗓 Season Top",
+            "cups": "🏆 Top Cups"
         }                                                                                                                     
         return names.get(category, "Rating")
                                                                                                                           
@@ -128,6 +318,9 @@ class RatingSystem:
             [InlineKeyboardButton("💎 Top SP", callback_data="rating_sp")],
             [InlineKeyboardButton("💰 Top Money", callback_data="rating_money")],                                                 
             [InlineKeyboardButton("🔮 Top Mythic", callback_data="rating_mythic")],
+            [InlineKeyboardButton("🗓 Season Top", callback_data="rating_season")],
+            [InlineKeyboardButton("🏆 Top Cups", callback_data="rating_cups")],
+            [InlineKeyboardButton("📜 Past Seasons", callback_data="seasons_past")],
             [InlineKeyboardButton("🔙 Back", callback_data="back_to_profile")]                                               
         ]
                                                                                                                               
@@ -144,13 +337,15 @@ class RatingSystem:
         user_data = self.user_db[user_id]
         username = user_data.get("username", "Player")                                                                 
         
-        # Get top players (ALL players, not just current)
-        top_players = self.get_top_players(category, 10)
-        user_rank = self.get_user_rank(user_id, category)                                                                     
+        # Every viewer is served from the same periodically rebuilt snapshot
+        snapshot = self.get_snapshot(category)
+        user_rank, user_score, is_exact, percentile = self.get_rank_info(user_id, category)
+        top_players = snapshot["top"] if snapshot else []
         category_name = self.get_category_name(category)
                                                                                                                               
         # Format text
-        text = f"🏆 {username}, here are top-10 players of all time in Skibidi Toilet universe.\n"
+        period = "of this season" if category == "season" else "of all time"
+        text = f"🏆 {username}, here are top-10 players {period} in Skibidi Toilet universe.\n"
         text += f"📊 Category: {category_name}\n"                                                                            
         text += "➖➖➖➖➖➖\n"
 
@@ -177,26 +372,21 @@ class RatingSystem:
         text += "➖➖➖➖➖➖\n"                                                                                      
         
         # Show current user's position among all                                                                   
-        total_players = len(self.user_db)
-        text += f"⏺️ Your position: {user_rank} of {total_players}\n"
+        total_players = max(len(self.leaderboard), user_rank)
+        rank_text = f"{user_rank:,}" if is_exact else f"~{user_rank:,}"
+        text += f"⏺️ Your position: {rank_text} of {total_players:,} (top {math.ceil(percentile * 10) / 10:.1f}%)\n"
                                                                                                                               
         # Add user statistics
-        user_score = 0
-        if category == "total":                                                                                                   
-            user_score = self.calculate_total_score(user_data)
-        elif category == "sp":                                                                                                    
-            user_score = user_data.get("total_sp", 0)
-        elif category == "money":                                                                                                 
-            user_score = user_data.get("money", 0)
-        elif category == "mythic":                                                                                                
-            user_score = len(user_data["cards"].get("Mythic", []))
-                                                                                                                              
         user_score_text = self.format_score(user_score, category)
         text += f"📈 Your score: {user_score_text}\n"
                                                                                                                               
         # If user not in top-10, show them separately
         if user_rank > 10:
-            text += f"\n🎯 Your position: {user_rank}. {username} - {user_score_text}\n"                               
+            text += f"\n🎯 Your position: {rank_text}. {username} - {user_score_text}\n"                               
+
+        if self.snapshot_time:
+            updated_time = datetime.fromtimestamp(self.snapshot_time).strftime('%H:%M:%S')
+            text += f"\n🕒 Updated: {updated_time} (every {self.refresh_interval}s)\n"
         
         # VERTICAL NAVIGATION BUTTONS (in columns)                                                                           
         buttons = [
@@ -204,6 +394,10 @@ class RatingSystem:
             [InlineKeyboardButton("💎 Top SP", callback_data="rating_sp")],
             [InlineKeyboardButton("💰 Top Money", callback_data="rating_money")],                                                 
             [InlineKeyboardButton("🔮 Top Mythic", callback_data="rating_mythic")],
+            [InlineKeyboardButton("🗓 Season Top", callback_data="rating_season")],
+            [InlineKeyboardButton("🏆 Top Cups", callback_data="rating_cups")],
+            [InlineKeyboardButton("🎯 Around Me", callback_data=f"rating_around_{category}"),
+             InlineKeyboardButton("👥 Friends", callback_data=f"rating_friends_{category}")],
             [InlineKeyboardButton("🔄 Refresh", callback_data=f"rating_{category}")],                                            
             [InlineKeyboardButton("🔙 Back", callback_data="rating_back")]
         ]
@@ -212,3 +406,67 @@ class RatingSystem:
             text,                                                                                                                 
             reply_markup=InlineKeyboardMarkup(buttons)
         )
+
+    def format_player_line(self, rank, player_id, score, category, user_id, is_exact=True):
+        """Formats one leaderboard line, marking the viewer"""
+        display_name = self.user_db.get(player_id, {}).get("username", f"Player {player_id}")
+        if len(display_name) > 20:
+            display_name = display_name[:17] + "..."
+        rank_text = f"{rank:,}" if is_exact else f"~{rank:,}"
+        marker = "👉 " if player_id == user_id else ""
+        return f"{marker}{rank_text}. {display_name} - {self.format_score(score, category)}\n"
+
+    async def show_around(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, category="total"):
+        """Shows players ranked right above and below user"""
+        query = update.callback_query
+        await query.answer()
+
+        window = self.get_around(user_id, category)
+        text = "🎯 Players around you\n"
+        text += f"📊 Category: {self.get_category_name(category)}\n"
+        text += "➖➖➖➖➖➖\n"
+
+        if len(window) > 1:
+            for rank, player_id, score in window:
+                text += self.format_player_line(rank, player_id, score, category, user_id)
+        elif window:
+            # Too many players share this score to list neighbours
+            rank, player_id, score = window[0]
+            text += self.format_player_line(rank, player_id, score, category, user_id, is_exact=False)
+            text += "\n💡 Many players have the same score as you."
+        else:
+            text += "📭 You are not in the rating yet."
+
+        buttons = [
+            [InlineKeyboardButton("👥 Friends", callback_data=f"rating_friends_{category}")],
+            [InlineKeyboardButton("🔄 Refresh", callback_data=f"rating_around_{category}")],
+            [InlineKeyboardButton("🔙 Back", callback_data=f"rating_{category}")]
+        ]
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+
+    async def show_friends(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, category="total"):
+        """Shows rating among user's referrer and referrals"""
+        query = update.callback_query
+        await query.answer()
+
+        top, place, circle_size = self.get_friends_top(user_id, category)
+        text = f"👥 Friends rating ({circle_size} players)\n"
+        text += f"📊 Category: {self.get_category_name(category)}\n"
+        text += "➖➖➖➖➖➖\n"
+
+        for rank, (player_id, score) in enumerate(top, 1):
+            text += self.format_player_line(rank, player_id, score, category, user_id)
+
+        if place > len(top):
+            text += "...\n"
+            text += self.format_player_line(place, user_id, self.leaderboard.get_score(category, user_id) or 0, category, user_id)
+
+        if circle_size <= 1:
+            text += "\n💡 Invite friends with your referral link to compete with them!"
+
+        buttons = [
+            [InlineKeyboardButton("🎯 Around Me", callback_data=f"rating_around_{category}")],
+            [InlineKeyboardButton("🔄 Refresh", callback_data=f"rating_friends_{category}")],
+            [InlineKeyboardButton("🔙 Back", callback_data=f"rating_{category}")]
+        ]
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(buttons))
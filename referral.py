@@ -1,13 +1,32 @@
 import logging
 import json
 import os
+import time
+import events
+from collections import defaultdict
+from referral_guard import ReferralGuard
+from seasons import add_sp
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 
+# Append-only referral graph log, one JSON record per line:
+# {"referrer", "referral", "time"} for a join, plus earned rewards of the referrer
+REFERRAL_LOG_FILE = "referral_log.jsonl"
+LEGACY_REFERRAL_FILE = "referral_data.json"
+
+
 class ReferralSystem:
     def __init__(self, user_db):
         self.user_db = user_db
-        self.referral_data = self.load_referral_data()
+        # invitee -> referrer, answers "already referred anywhere" in O(1)
+        self.referrer_of = {}
+        # referrer -> {invitee: join time}, dicts keep join order for listing
+        self.referrals = defaultdict(dict)
+        # referrer -> referrals of their referrals, kept up to date on every join
+        self.second_level = defaultdict(int)
+        self.earned = defaultdict(lambda: {"sp": 0, "money": 0, "attempts": 0})
+        self.guard = ReferralGuard(user_db)
+        self.load_referral_data()
         self.bot_username = None
         logging.info("🔄 Referral system initialization")
 
@@ -17,23 +36,87 @@ class ReferralSystem:
         logging.info(f"✅ Bot username set: {username}")
 
     def load_referral_data(self):
-        """Loads referral data from file"""
+        """Rebuilds referral graph from log, migrating old referral_data.json once"""
+        if not os.path.exists(REFERRAL_LOG_FILE) and os.path.exists(LEGACY_REFERRAL_FILE):
+            self.migrate_legacy_data()
+            return
+
         try:
-            if os.path.exists("referral_data.json"):
-                with open("referral_data.json", "r", encoding="utf-8") as f:
-                    return json.load(f)
-            return {}
+            if os.path.exists(REFERRAL_LOG_FILE):
+                with open(REFERRAL_LOG_FILE, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # Torn last line after a crash
+                            continue
+                        self.apply_record(record)
         except Exception as e:
-            logging.error(f"Error loading referral_data.json: {e}")
-            return {}
+            logging.error(f"Error loading {REFERRAL_LOG_FILE}: {e}")
 
-    def save_referral_data(self):
-        """Saves referral data to file"""
+    def migrate_legacy_data(self):
+        """Converts referral_data.json into log records"""
         try:
-            with open("referral_data.json", "w", encoding="utf-8") as f:
-                json.dump(self.referral_data, f, indent=2, ensure_ascii=False)
+            with open(LEGACY_REFERRAL_FILE, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
         except Exception as e:
-            logging.error(f"Error saving referral_data.json: {e}")
+            logging.error(f"Error loading {LEGACY_REFERRAL_FILE}: {e}")
+            return
+
+        records = []
+        for referrer_id, data in legacy.items():
+            for referral_id in data.get("referrals", []):
+                records.append({"referrer": int(referrer_id), "referral": int(referral_id), "time": 0})
+        for referral_id, data in legacy.items():
+            if data.get("referrer"):
+                records.append({"referrer": int(data["referrer"]), "referral": int(referral_id), "time": 0})
+        for referrer_id, data in legacy.items():
+            if data.get("total_earned_sp") or data.get("total_earned_money") or data.get("total_attempts"):
+                records.append({
+                    "referrer": int(referrer_id),
+                    "sp": data.get("total_earned_sp", 0),
+                    "money": data.get("total_earned_money", 0),
+                    "attempts": data.get("total_attempts", 0)
+                })
+
+        # Both sides of old data name the same joins, only the first one counts
+        records = [record for record in records if self.apply_record(record)]
+        self.append_records(records)
+        logging.info(f"🔄 Referral data migrated to {REFERRAL_LOG_FILE}: {len(self.referrer_of)} joins")
+
+    def apply_record(self, record):
+        """Applies log record to in-memory graph, returns False for a repeated join"""
+        referrer_id = record["referrer"]
+        if "referral" in record:
+            referral_id = record["referral"]
+            if referral_id in self.referrer_of or referral_id == referrer_id:
+                return False
+            self.referrer_of[referral_id] = referrer_id
+            self.referrals[referrer_id][referral_id] = record.get("time", 0)
+
+            # Invitee's own referrals become second level ones of the referrer,
+            # invitee becomes second level one of the referrer's referrer
+            self.second_level[referrer_id] += len(self.referrals.get(referral_id, ()))
+            grand_referrer_id = self.referrer_of.get(referrer_id)
+            if grand_referrer_id is not None:
+                self.second_level[grand_referrer_id] += 1
+
+        if "sp" in record:
+            earned = self.earned[referrer_id]
+            earned["sp"] += record["sp"]
+            earned["money"] += record["money"]
+            earned["attempts"] += record["attempts"]
+        return True
+
+    def append_records(self, records):
+        """Appends records to referral log"""
+        if not records:
+            return
+        try:
+            with open(REFERRAL_LOG_FILE, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(record) + "\n" for record in records))
+        except Exception as e:
+            logging.error(f"Error saving {REFERRAL_LOG_FILE}: {e}")
 
     def generate_referral_link(self, user_id: int):
         """Generates referral link"""
@@ -46,49 +129,37 @@ class ReferralSystem:
         return link
 
     def get_user_referrals(self, user_id: int):
-        """Returns user's referral list"""
-        user_id_str = str(user_id)
-        if user_id_str not in self.referral_data:
-            return []
-        return self.referral_data[user_id_str].get("referrals", [])
+        """Returns IDs of users invited by user, in join order"""
+        return list(self.referrals.get(user_id, ()))
 
     def get_user_referrer(self, user_id: int):
         """Returns user's referrer ID"""
-        user_id_str = str(user_id)
-        if user_id_str not in self.referral_data:
-            return None
-        return self.referral_data[user_id_str].get("referrer")
+        return self.referrer_of.get(user_id)
+
+    def count_referrals(self, user_id: int, level: int = 1):
+        """Returns number of user's referrals (level 1) or referrals of referrals (level 2)"""
+        if level == 1:
+            return len(self.referrals.get(user_id, ()))
+        return self.second_level.get(user_id, 0)
 
     def add_referral(self, referrer_id: int, referral_id: int):
         """Adds referral"""
         try:
-            referrer_id_str = str(referrer_id)
-            referral_id_str = str(referral_id)
-
             # Check that user is not inviting themselves
             if referrer_id == referral_id:
                 logging.warning(f"❌ User {referrer_id} trying to invite themselves")
                 return False, 0, 0, 0
 
-            # Initialize referrer data if not exists
-            if referrer_id_str not in self.referral_data:
-                self.referral_data[referrer_id_str] = {
-                    "referrals": [],
-                    "total_earned_sp": 0,
-                    "total_earned_money": 0,
-                    "total_attempts": 0
-                }
-
-            # Check if this user was already invited
-            if referral_id_str in self.referral_data[referrer_id_str]["referrals"]:
-                logging.warning(f"❌ User {referral_id} already invited by user {referrer_id}")
+            # Check if this user was already invited by anyone
+            if referral_id in self.referrer_of:
+                logging.warning(f"❌ User {referral_id} already invited by user {self.referrer_of[referral_id]}")
                 return False, 0, 0, 0
 
-            # Add referral
-            self.referral_data[referrer_id_str]["referrals"].append(referral_id_str)
+            record = {"referrer": referrer_id, "referral": referral_id, "time": int(time.time())}
+            self.apply_record(record)
 
             # Give reward to referrer
-            referrals_count = len(self.referral_data[referrer_id_str]["referrals"])
+            referrals_count = len(self.referrals[referrer_id])
 
             # Reward for 1 invitation
             reward_sp = 10000
@@ -101,33 +172,17 @@ class ReferralSystem:
                 reward_money += 100000
                 reward_attempts += 10
 
-            # Give rewards to referrer
+            # Referrer reward is held until the guard releases it
             if referrer_id in self.user_db:
-                self.user_db[referrer_id]["total_sp"] += reward_sp
-                self.user_db[referrer_id]["money"] += reward_money
-                self.user_db[referrer_id]["craft_attempts"] = self.user_db[referrer_id].get("craft_attempts", 0) + reward_attempts
-
-                # Update referrer statistics
-                self.referral_data[referrer_id_str]["total_earned_sp"] += reward_sp
-                self.referral_data[referrer_id_str]["total_earned_money"] += reward_money
-                self.referral_data[referrer_id_str]["total_attempts"] += reward_attempts
+                self.guard.hold(referrer_id, referral_id, reward_sp, reward_money, reward_attempts)
 
             # Reward for new user
             if referral_id in self.user_db:
-                self.user_db[referral_id]["total_sp"] += 5000
+                add_sp(self.user_db[referral_id], 5000)
                 self.user_db[referral_id]["money"] += 5000
 
-            # Save referral data
-            if referral_id_str not in self.referral_data:
-                self.referral_data[referral_id_str] = {
-                    "referrer": referrer_id_str,
-                    "joined_via_ref": True
-                }
-            else:
-                self.referral_data[referral_id_str]["referrer"] = referrer_id_str
-                self.referral_data[referral_id_str]["joined_via_ref"] = True
-
-            self.save_referral_data()
+            self.append_records([record])
+            events.emit("referral_joined", referrer_id)
 
             logging.info(f"✅ Successfully added referral: {referral_id} -> {referrer_id}")
             logging.info(f"🎁 Rewards: {reward_sp} SP, {reward_money} money, {reward_attempts} attempts")
@@ -138,22 +193,57 @@ class ReferralSystem:
             logging.error(f"❌ Error adding referral: {e}")
             return False, 0, 0, 0
 
+    def pay_referrer_reward(self, entry):
+        """Gives released reward to referrer and logs it"""
+        referrer_id = entry["referrer"]
+        if referrer_id not in self.user_db:
+            return False
+
+        user_data = self.user_db[referrer_id]
+        add_sp(user_data, entry["sp"])
+        user_data["money"] += entry["money"]
+        user_data["craft_attempts"] = user_data.get("craft_attempts", 0) + entry["attempts"]
+
+        # Update referrer statistics
+        earned = self.earned[referrer_id]
+        earned["sp"] += entry["sp"]
+        earned["money"] += entry["money"]
+        earned["attempts"] += entry["attempts"]
+        self.append_records([{"referrer": referrer_id, "sp": entry["sp"], "money": entry["money"], "attempts": entry["attempts"]}])
+        events.emit("stats_changed", referrer_id)
+        return True
+
+    async def release_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """JobQueue callback paying held referrer rewards that passed the guard"""
+        for entry in self.guard.pop_releasable():
+            if not self.pay_referrer_reward(entry):
+                continue
+            logging.info(f"✅ Referral reward released: {entry['referral']} -> {entry['referrer']}")
+            try:
+                await context.bot.send_message(
+                    chat_id=entry["referrer"],
+                    text=(
+                        f"🎁 Referral reward credited!\n\n"
+                        f"👤 {self.user_db[entry['referral']].get('username', 'Your friend')} started playing\n"
+                        f"💎 +{entry['sp']:,} SP, 💰 +{entry['money']:,}, 🎴 +{entry['attempts']} attempts"
+                    )
+                )
+            except Exception as e:
+                logging.error(f"❌ Failed to notify referrer: {e}")
+        self.guard.flush()
+
     def get_referral_stats(self, user_id: int):
         """Returns referral statistics"""
-        user_id_str = str(user_id)
-
         referrals = self.get_user_referrals(user_id)
-        user_data = self.referral_data.get(user_id_str, {})
-
-        total_earned_sp = user_data.get("total_earned_sp", 0)
-        total_earned_money = user_data.get("total_earned_money", 0)
-        total_attempts = user_data.get("total_attempts", 0)
+        earned = self.earned.get(user_id, {})
 
         return {
             "total_referrals": len(referrals),
-            "total_earned_sp": total_earned_sp,
-            "total_earned_money": total_earned_money,
-            "total_attempts": total_attempts,
+            "second_level_referrals": self.count_referrals(user_id, 2),
+            "total_earned_sp": earned.get("sp", 0),
+            "total_earned_money": earned.get("money", 0),
+            "total_attempts": earned.get("attempts", 0),
+            "held_rewards": self.guard.count_held(user_id),
             "referrals": referrals
         }
 
@@ -175,13 +265,16 @@ class ReferralSystem:
             f"👤 {username}, referral system\n\n"
             f"📊 Statistics:\n"
             f"• Friends invited: {stats['total_referrals']}\n"
+            f"• Friends of friends: {stats['second_level_referrals']}\n"
             f"• SP earned: {stats['total_earned_sp']:,} 💎\n"
             f"• Money earned: {stats['total_earned_money']:,} 💰\n"
-            f"• Attempts received: {stats['total_attempts']} 🎴\n\n"
+            f"• Attempts received: {stats['total_attempts']} 🎴\n"
+            f"• Rewards on hold: {stats['held_rewards']} ⏳\n\n"
             f"🎁 **Invitation rewards:**\n"
             f"• For 1 friend: 10,000 SP 💎 + 10,000 💰 + 1 attempt 🎴\n"
             f"• For 10 friends: 100,000 SP 💎 + 100,000 💰 + 10 attempts 🎴\n\n"
-            f"👥 Friends also get bonus: 5,000 SP 💎 + 5,000 💰\n\n"
+            f"👥 Friends also get bonus: 5,000 SP 💎 + 5,000 💰\n"
+            f"⏳ Your reward is credited once the friend starts playing\n\n"
             f"📎 Your referral link:\n"
             f"`{referral_link}`"
         )
@@ -215,15 +308,14 @@ class ReferralSystem:
         else:
             text = f"👥 Your invited friends ({len(referrals)}):\n\n"
 
-            for i, ref_id in enumerate(referrals, 1):
-                ref_user_id = int(ref_id)
+            for i, ref_user_id in enumerate(referrals, 1):
                 if ref_user_id in self.user_db:
-                    ref_username = self.user_db[ref_user_id].get("username", f"Player {ref_id}")
+                    ref_username = self.user_db[ref_user_id].get("username", f"Player {ref_user_id}")
                     if len(ref_username) > 20:
                         ref_username = ref_username[:17] + "..."
                     text += f"{i}. {ref_username}\n"
                 else:
-                    text += f"{i}. Player {ref_id}\n"
+                    text += f"{i}. Player {ref_user_id}\n"
 
             # Show achievements
             if len(referrals) >= 10:
@@ -264,10 +356,13 @@ class ReferralSystem:
                                     referrer_username = self.user_db[referrer_id].get("username", "Player")
                                     referrals_count = len(self.get_user_referrals(referrer_id))
 
-                                    reward_text = f"🎁 You received: {reward_sp:,} SP 💎 + {reward_money:,} 💰 + {reward_attempts} attempts 🎴"
+                                    reward_text = (
+                                        f"⏳ Reward on hold: {reward_sp:,} SP 💎 + {reward_money:,} 💰 + {reward_attempts} attempts 🎴\n"
+                                        f"It is credited once your friend starts playing"
+                                    )
 
                                     if referrals_count >= 10:
-                                        reward_text += "\n\n🎉 Reached 10 friends! Received bonus rewards! 🎁"
+                                        reward_text += "\n\n🎉 10+ friends! Bonus rewards are included! 🎁"
 
                                     await context.bot.send_message(
                                         chat_id=referrer_id,
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import logging
+import counters
+from collections import deque
+
+# Referrer rewards are held this long before the first release check; it is
+# shorter than the join window so idle share is judged over the joins around it
+REFERRAL_HOLD_SECONDS = 30 * 60
+REFERRAL_RECHECK_SECONDS = 15 * 60        # Delay before a held reward is checked again
+REFERRAL_PENDING_TTL = 7 * 24 * 60 * 60   # Held rewards not released by then are dropped
+REFERRAL_RELEASE_INTERVAL = 60            # Seconds between release job runs
+REFERRAL_PENDING_FILE = "referral_pending.json"
+
+# Sliding windows: (window seconds, ring buckets)
+REFERRAL_JOIN_WINDOW = (60 * 60, 12)
+REFERRAL_REWARD_WINDOW = (24 * 60 * 60, 24)
+
+# Thresholds a referrer must stay under for rewards to be released
+REFERRAL_MAX_JOINS_PER_WINDOW = 10        # Joins per join window
+# Released SP per reward window: 20 rewards of the 10+ friends tier (110k SP each)
+REFERRAL_MAX_SP_PER_WINDOW = 20 * 110000
+REFERRAL_MIN_INVITEE_PULLS = 1            # Invitee counts as active after this many cards
+REFERRAL_MAX_IDLE_SHARE = 0.5             # Share of idle invitees among recent joins
+REFERRAL_IDLE_MIN_SAMPLE = 4              # Joins in window before idle share is judged
+
+# Velocity only delays rewards of active invitees, it never lets them expire
+REASON_VELOCITY = "reward velocity limit"
+# Verdicts stored on the entry: such rewards are never released and expire with the TTL
+REASON_BURST = "join burst"
+REASON_IDLE_SHARE = "most recent invitees never played"
+
+
+class SlidingWindow:
+    """Sum over the last window seconds kept in a fixed ring of buckets"""
+
+    __slots__ = ("bucket_seconds", "counts", "epochs")
+
+    def __init__(self, window, buckets):
+        self.bucket_seconds = window // buckets
+        self.counts = [0] * buckets
+        self.epochs = [0] * buckets
+
+    def add(self, now, amount=1):
+        """Adds amount at time now"""
+        epoch = int(now // self.bucket_seconds)
+        slot = epoch % len(self.counts)
+        # Bucket still holds a count from a previous turn of the ring
+        if self.epochs[slot] != epoch:
+            self.epochs[slot] = epoch
+            self.counts[slot] = 0
+        self.counts[slot] += amount
+
+    def total(self, now):
+        """Returns sum of amounts added within the window"""
+        oldest = int(now // self.bucket_seconds) - len(self.counts)
+        return sum(count for count, epoch in zip(self.counts, self.epochs) if epoch > oldest)
+
+
+class ReferrerStats:
+    """Streaming counters of one referrer"""
+
+    __slots__ = ("joins", "idle", "reward_sp", "held", "burst_at")
+
+    def __init__(self):
+        self.held = 0
+        # Time of the last join that pushed the referrer over the join rate
+        self.burst_at = None
+        self.joins = SlidingWindow(*REFERRAL_JOIN_WINDOW)
+        self.idle = SlidingWindow(*REFERRAL_JOIN_WINDOW)
+        self.reward_sp = SlidingWindow(*REFERRAL_REWARD_WINDOW)
+
+
+class ReferralGuard:
+    """Holds referrer rewards until the referrer's join stream looks organic"""
+
+    def __init__(self, user_db, pending_file=REFERRAL_PENDING_FILE):
+        self.user_db = user_db
+        self.pending_file = pending_file
+        self.stats = {}
+        # Held rewards ordered by release time; hold and recheck delays are
+        # constant, so appending keeps the order and the head is always next
+        self.pending = deque()
+        self.rechecks = deque()
+        self.dirty = False
+        self.load_pending()
+        logging.info(f"🔄 Referral guard initialization ({len(self.pending)} held rewards)")
+
+    def load_pending(self):
+        """Loads held rewards"""
+        if not os.path.exists(self.pending_file):
+            return
+        try:
+            with open(self.pending_file, "r", encoding="utf-8") as f:
+                self.pending = deque(sorted(json.load(f), key=lambda entry: entry["release_at"]))
+        except Exception as e:
+            logging.error(f"Error loading {self.pending_file}: {e}")
+        for entry in self.pending:
+            self.get_stats(entry["referrer"]).held += 1
+
+    def save_pending(self):
+        """Saves held rewards"""
+        try:
+            entries = sorted(list(self.pending) + list(self.rechecks), key=lambda entry: entry["release_at"])
+            with open(self.pending_file, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            self.dirty = False
+        except Exception as e:
+            logging.error(f"Error saving {self.pending_file}: {e}")
+
+    def flush(self):
+        """Saves held rewards if they changed"""
+        if self.dirty:
+            self.save_pending()
+
+    def get_stats(self, referrer_id):
+        """Returns streaming counters of referrer"""
+        stats = self.stats.get(referrer_id)
+        if stats is None:
+            stats = self.stats[referrer_id] = ReferrerStats()
+        return stats
+
+    def hold(self, referrer_id, referral_id, sp, money, attempts, now=None):
+        """Records join and holds its referrer reward"""
+        now = time.time() if now is None else now
+        stats = self.get_stats(referrer_id)
+        stats.joins.add(now)
+        stats.held += 1
+        # Join rate is judged when the join happens, not when the window has moved on
+        if stats.joins.total(now) > REFERRAL_MAX_JOINS_PER_WINDOW:
+            stats.burst_at = now
+        self.pending.append({
+            "referrer": referrer_id,
+            "referral": referral_id,
+            "sp": sp,
+            "money": money,
+            "attempts": attempts,
+            "joined_at": now,
+            "release_at": now + REFERRAL_HOLD_SECONDS,
+            "idle_counted": False,
+            "flag": REASON_BURST if stats.burst_at == now else None
+        })
+        self.dirty = True
+
+    def count_held(self, referrer_id):
+        """Returns number of held rewards of referrer"""
+        stats = self.stats.get(referrer_id)
+        return stats.held if stats else 0
+
+    def is_active(self, user_id):
+        """Checks if invited user has started playing"""
+        if user_id not in self.user_db:
+            return False
+        return counters.total_pulls(self.user_db[user_id]) >= REFERRAL_MIN_INVITEE_PULLS
+
+    def check(self, entry, now):
+        """Returns reason to keep holding reward, or None if it can be released"""
+        stats = self.get_stats(entry["referrer"])
+        if entry.get("flag"):
+            return entry["flag"]
+
+        # Joins shortly before the burst belong to it as well
+        if stats.burst_at is not None and abs(entry["joined_at"] - stats.burst_at) <= REFERRAL_JOIN_WINDOW[0]:
+            entry["flag"] = REASON_BURST
+            return REASON_BURST
+
+        active = self.is_active(entry["referral"])
+        if not active and not entry["idle_counted"]:
+            stats.idle.add(now)
+            entry["idle_counted"] = True
+
+        joins = stats.joins.total(now)
+        if joins >= REFERRAL_IDLE_MIN_SAMPLE and stats.idle.total(now) / joins > REFERRAL_MAX_IDLE_SHARE:
+            entry["flag"] = REASON_IDLE_SHARE
+            return REASON_IDLE_SHARE
+
+        if not active:
+            return "invitee has not played yet"
+
+        if stats.reward_sp.total(now) + entry["sp"] > REFERRAL_MAX_SP_PER_WINDOW:
+            return REASON_VELOCITY
+
+        return None
+
+    def pop_releasable(self, now=None):
+        """Returns held rewards due now that pass all checks, drops expired ones"""
+        now = time.time() if now is None else now
+        released = []
+        for queue in (self.pending, self.rechecks):
+            due = []
+            while queue and queue[0]["release_at"] <= now:
+                due.append(queue.popleft())
+
+            for entry in due:
+                self.dirty = True
+                stats = self.get_stats(entry["referrer"])
+                reason = self.check(entry, now)
+                if reason is None:
+                    stats.reward_sp.add(now, entry["sp"])
+                    stats.held -= 1
+                    released.append(entry)
+                elif reason != REASON_VELOCITY and now - entry["joined_at"] > REFERRAL_PENDING_TTL:
+                    stats.held -= 1
+                    logging.warning(f"🚫 Referral reward {entry['referral']} -> {entry['referrer']} dropped: {reason}")
+                else:
+                    entry["release_at"] = now + REFERRAL_RECHECK_SECONDS
+                    self.rechecks.append(entry)
+        return released
@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import struct
+import logging
+from collections import defaultdict, deque
+from duel import hits_to_kill, duel_winner
+
+# Replay log settings
+REPLAY_DIR = "replays"
+REPLAY_CARD_IDS_FILE = "card_ids.jsonl"    # Append-only card names, line number is the card ID
+REPLAY_SEGMENT_RECORDS = 20000    # Records per segment file (~900 KB)
+REPLAY_RETAINED_SEGMENTS = 10     # Older segments are deleted
+REPLAY_USER_HISTORY = 10          # Battles indexed per user
+
+# time, user id, opponent id, seed, outcome, cups change, 5 user + 5 enemy card IDs
+REPLAY_RECORD = struct.Struct("<IQQIbb10H")
+UNKNOWN_CARD_ID = 0xFFFF
+RARITY_ORDER = ["Common", "Rare", "Epic", "Legend", "Mythic", "Ultimate"]
+
+
+class ReplayLog:
+    """Append-only segmented log of compact battle replays"""
+
+    def __init__(self, cards_db, directory=REPLAY_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        # Card IDs come from a name table that is only appended to, so catalog
+        # changes never renumber cards of recorded battles
+        catalog = []
+        for rarity in RARITY_ORDER + sorted(set(cards_db) - set(RARITY_ORDER)):
+            catalog.extend(cards_db.get(rarity, []))
+        card_names = self.load_card_ids(catalog)
+        cards_by_name = {card["name"]: card for card in catalog}
+        if card_names is None:
+            # Without a readable name table no battle is recorded, so no wrong IDs get written
+            self.cards_by_id = []
+            self.card_ids = None
+        else:
+            self.cards_by_id = [cards_by_name.get(name) for name in card_names]
+            self.card_ids = {name: card_id for card_id, name in enumerate(card_names)}
+
+        self.segments = sorted(
+            int(name[8:-4]) for name in os.listdir(directory)
+            if name.startswith("segment_") and name.endswith(".bin")
+        )
+        if not self.segments:
+            self.segments = [0]
+        self.current_records = self.count_records(self.segments[-1])
+
+        self.user_index = defaultdict(lambda: deque(maxlen=REPLAY_USER_HISTORY))
+        self.rebuild_index()
+        logging.info(f"🔄 Replay log initialization ({len(self.segments)} segments)")
+
+    def load_card_ids(self, catalog):
+        """Returns card names by ID, appending catalog cards that have none yet, or None if the table is unreadable"""
+        path = os.path.join(self.directory, REPLAY_CARD_IDS_FILE)
+        card_names = []
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                usable = data.rfind(b"\n") + 1
+                if usable != len(data):
+                    # A torn last line after a crash is dropped so appends start on a new line
+                    with open(path, "r+b") as f:
+                        f.truncate(usable)
+                card_names = [json.loads(line) for line in data[:usable].decode("utf-8").splitlines()]
+            except Exception as e:
+                logging.error(f"Error loading replay card IDs, battles will not be recorded: {e}")
+                return None
+
+        known = set(card_names)
+        new_names = []
+        for card in catalog:
+            if card["name"] not in known and len(card_names) + len(new_names) < UNKNOWN_CARD_ID:
+                known.add(card["name"])
+                new_names.append(card["name"])
+        if new_names:
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(name, ensure_ascii=False) + "\n" for name in new_names)
+                card_names.extend(new_names)
+            except Exception as e:
+                # IDs that were not saved are not handed out, those cards are recorded as unknown
+                logging.error(f"Error saving replay card IDs: {e}")
+        return card_names
+
+    def segment_path(self, segment):
+        """Returns segment file path"""
+        return os.path.join(self.directory, f"segment_{segment:06d}.bin")
+
+    def count_records(self, segment):
+        """Returns number of complete records in segment"""
+        path = self.segment_path(segment)
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // REPLAY_RECORD.size
+
+    def rebuild_index(self):
+        """Indexes last battles of each user from retained segments"""
+        for segment in self.segments:
+            path = self.segment_path(segment)
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            usable = len(data) - len(data) % REPLAY_RECORD.size
+            for record_no, record in enumerate(REPLAY_RECORD.iter_unpack(data[:usable])):
+                self.user_index[record[1]].append((segment, record_no))
+
+    def append(self, user_id, opponent_id, seed, outcome, cups_change, user_cards, enemy_cards):
+        """Records battle, returns its replay reference or None if it was not recorded"""
+        if self.card_ids is None:
+            return None
+        if self.current_records >= REPLAY_SEGMENT_RECORDS:
+            self.roll_segment()
+
+        card_ids = [self.card_ids.get(name, UNKNOWN_CARD_ID) for name in user_cards[:5]]
+        card_ids += [UNKNOWN_CARD_ID] * (5 - len(card_ids))
+        enemy_card_ids = [self.card_ids.get(name, UNKNOWN_CARD_ID) for name in enemy_cards[:5]]
+        enemy_card_ids += [UNKNOWN_CARD_ID] * (5 - len(enemy_card_ids))
+
+        record = REPLAY_RECORD.pack(
+            int(time.time()), user_id, opponent_id, seed,
+            outcome, max(-128, min(127, cups_change)),
+            *card_ids, *enemy_card_ids
+        )
+
+        segment = self.segments[-1]
+        try:
+            with open(self.segment_path(segment), "ab") as f:
+                f.write(record)
+        except Exception as e:
+            logging.error(f"Error writing battle replay: {e}")
+            return None
+
+        reference = (segment, self.current_records)
+        self.current_records += 1
+        self.user_index[user_id].append(reference)
+        return reference
+
+    def roll_segment(self):
+        """Starts new segment and drops segments beyond retention"""
+        self.segments.append(self.segments[-1] + 1)
+        self.current_records = 0
+
+        while len(self.segments) > REPLAY_RETAINED_SEGMENTS:
+            segment = self.segments.pop(0)
+            try:
+                os.remove(self.segment_path(segment))
+            except FileNotFoundError:
+                pass
+            logging.info(f"🗑️ Replay segment {segment} removed by retention")
+
+    def read(self, segment, record_no):
+        """Reads replay record, returns dict or None"""
+        if segment not in self.segments:
+            return None
+
+        try:
+            with open(self.segment_path(segment), "rb") as f:
+                f.seek(record_no * REPLAY_RECORD.size)
+                data = f.read(REPLAY_RECORD.size)
+        except FileNotFoundError:
+            return None
+
+        if len(data) < REPLAY_RECORD.size:
+            return None
+
+        fields = REPLAY_RECORD.unpack(data)
+        return {
+            "segment": segment,
+            "record_no": record_no,
+            "time": fields[0],
+            "user_id": fields[1],
+            "opponent_id": fields[2],
+            "seed": fields[3],
+            "outcome": fields[4],
+            "cups_change": fields[5],
+            "user_cards": [self.get_card(card_id) for card_id in fields[6:11]],
+            "enemy_cards": [self.get_card(card_id) for card_id in fields[11:16]]
+        }
+
+    def get_card(self, card_id):
+        """Returns card by replay card ID"""
+        if card_id < len(self.cards_by_id):
+            return self.cards_by_id[card_id]
+        return None
+
+    def get_user_replays(self, user_id, limit=REPLAY_USER_HISTORY):
+        """Returns user's last battles, newest first"""
+        replays = []
+        for segment, record_no in reversed(self.user_index.get(user_id, ())):
+            replay = self.read(segment, record_no)
+            if replay and replay["user_id"] == user_id:
+                replays.append(replay)
+                if len(replays) >= limit:
+                    break
+        return replays
+
+    def render(self, replay):
+        """Re-creates round-by-round battle text from replay"""
+        text = ""
+        for round_no, (card, enemy_card) in enumerate(zip(replay["user_cards"], replay["enemy_cards"]), 1):
+            if not card or not enemy_card:
+                text += f"🌀 Round {round_no}: ❓ card no longer exists\n"
+                continue
+
+            attack, health = card.get("attack", 0), card.get("health", 0)
+            enemy_attack, enemy_health = enemy_card.get("attack", 0), enemy_card.get("health", 0)
+            result = duel_winner(attack, health, enemy_attack, enemy_health)
+
+            text += f"🌀 Round {round_no}: {card['name']} vs {enemy_card['name']}\n"
+            if result > 0:
+                text += f"   ✅ Won in {hits_to_kill(attack, enemy_health)} attacks\n"
+            elif result < 0:
+                text += f"   💀 Lost after {hits_to_kill(enemy_attack, health)} enemy attacks\n"
+            else:
+                text += "   🤝 Nobody could win\n"
+        return text
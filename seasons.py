@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import heapq
+import logging
+from datetime import datetime
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ContextTypes
+
+# Season settings
+SEASON_LENGTH_DAYS = 30
+SEASON_ARCHIVE_DIR = "seasons"
+SEASON_ARCHIVE_TOP = 100          # Places stored per category
+SEASON_ARCHIVE_CATEGORIES = {
+    "season": "season_sp",
+    "cups": "arena_cups"
+}
+PAST_SEASONS_SHOWN = 10
+
+
+def add_sp(user_data, amount):
+    """Gives earned SP, counting it towards the current season"""
+    user_data["total_sp"] += amount
+    user_data["season_sp"] = user_data.get("season_sp", 0) + amount
+    user_data["earned_sp"] = user_data.get("earned_sp", 0) + amount
+
+
+class SeasonSystem:
+    def __init__(self, user_db, rating_system=None):
+        self.user_db = user_db
+        self.rating_system = rating_system
+        self.season_data = self.load_season_data()
+        if not os.path.exists("season_data.json"):
+            self.save_season_data()
+        self.archive_cache = {}
+        os.makedirs(SEASON_ARCHIVE_DIR, exist_ok=True)
+        self.archived_seasons = sorted(
+            int(name[7:-5]) for name in os.listdir(SEASON_ARCHIVE_DIR)
+            if name.startswith("season_") and name.endswith(".json")
+        )
+        logging.info(f"🔄 Season system initialization (season {self.season_data['season']})")
+
+    def load_season_data(self):
+        """Loads current season data"""
+        current_time = time.time()
+        data = {
+            "season": 1,
+            "started_at": current_time,
+            "ends_at": current_time + SEASON_LENGTH_DAYS * 24 * 60 * 60,
+            "length_days": SEASON_LENGTH_DAYS
+        }
+        try:
+            if os.path.exists("season_data.json"):
+                with open("season_data.json", "r", encoding="utf-8") as f:
+                    data.update(json.load(f))
+        except Exception as e:
+            logging.error(f"Error loading season_data.json: {e}")
+        return data
+
+    def save_season_data(self):
+        """Saves current season data"""
+        try:
+            with open("season_data.json", "w", encoding="utf-8") as f:
+                json.dump(self.season_data, f, indent=2)
+        except Exception as e:
+            logging.error(f"Error saving season_data.json: {e}")
+
+    def get_season_number(self):
+        """Returns current season number"""
+        return self.season_data["season"]
+
+    def is_season_over(self):
+        """Checks if current season has ended"""
+        return time.time() >= self.season_data["ends_at"]
+
+    def get_final_standings(self, category):
+        """Returns [(user_id, score)] of category's top places"""
+        if self.rating_system:
+            with self.rating_system.lock:
+                return self.rating_system.leaderboard.top(category, SEASON_ARCHIVE_TOP)
+
+        field = SEASON_ARCHIVE_CATEGORIES[category]
+        return heapq.nsmallest(
+            SEASON_ARCHIVE_TOP,
+            ((user_id, user_data.get(field, 0)) for user_id, user_data in self.user_db.items()),
+            key=lambda item: (-item[1], item[0])
+        )
+
+    def rollover(self):
+        """Archives final standings, resets season counters and starts next season"""
+        season = self.season_data["season"]
+        ended_at = time.time()
+
+        archive = {
+            "season": season,
+            "started_at": self.season_data["started_at"],
+            "ended_at": ended_at,
+            "players": len(self.user_db),
+            "top": {}
+        }
+        for category in SEASON_ARCHIVE_CATEGORIES:
+            archive["top"][category] = [
+                [user_id, self.user_db[user_id].get("username", "") if user_id in self.user_db else "", score]
+                for user_id, score in self.get_final_standings(category)
+            ]
+
+        try:
+            path = os.path.join(SEASON_ARCHIVE_DIR, f"season_{season}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(archive, f, ensure_ascii=False, separators=(",", ":"))
+        except Exception as e:
+            logging.error(f"Error saving season {season} archive: {e}")
+            return None
+
+        self.archive_cache[season] = archive
+        self.archived_seasons.append(season)
+
+        # One bulk pass over all users, then one bulk re-index. Arena cups are
+        # long-term progress, the archive only records who led them at season end
+        for user_data in self.user_db.values():
+            user_data["season_sp"] = 0
+        if self.rating_system:
+            self.rating_system.reload()
+
+        length_days = self.season_data.get("length_days", SEASON_LENGTH_DAYS)
+        self.season_data = {
+            "season": season + 1,
+            "started_at": ended_at,
+            "ends_at": ended_at + length_days * 24 * 60 * 60,
+            "length_days": length_days
+        }
+        self.save_season_data()
+        logging.info(f"🗓 Season {season} archived, season {season + 1} started")
+        return archive
+
+    def get_archive(self, season: int):
+        """Returns archived season or None"""
+        if season not in self.archive_cache:
+            if season not in self.archived_seasons:
+                return None
+            try:
+                path = os.path.join(SEASON_ARCHIVE_DIR, f"season_{season}.json")
+                with open(path, "r", encoding="utf-8") as f:
+                    self.archive_cache[season] = json.load(f)
+            except Exception as e:
+                logging.error(f"Error loading season {season} archive: {e}")
+                return None
+        return self.archive_cache[season]
+
+    async def show_past_seasons(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+        """Shows list of archived seasons"""
+        query = update.callback_query
+        await query.answer()
+
+        ends_at = datetime.fromtimestamp(self.season_data["ends_at"]).strftime('%d.%m.%Y')
+        text = f"🗓 Season {self.get_season_number()} ends {ends_at}\n\n"
+
+        buttons = []
+        if self.archived_seasons:
+            text += "📜 Choose a past season:"
+            for season in reversed(self.archived_seasons[-PAST_SEASONS_SHOWN:]):
+                buttons.append([InlineKeyboardButton(f"🏁 Season {season}", callback_data=f"season_archive_{season}")])
+        else:
+            text += "📜 No finished seasons yet."
+
+        buttons.append([InlineKeyboardButton("🔙 Back", callback_data="rating_back")])
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+
+    async def show_season_archive(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, season: int):
+        """Shows final standings of archived season"""
+        query = update.callback_query
+
+        archive = self.get_archive(season)
+        if not archive:
+            await query.answer("❌ Season not found", show_alert=True)
+            return
+
+        await query.answer()
+
+        started = datetime.fromtimestamp(archive["started_at"]).strftime('%d.%m.%Y')
+        ended = datetime.fromtimestamp(archive["ended_at"]).strftime('%d.%m.%Y')
+        text = f"🏁 Season {season} ({started} - {ended})\n"
+        text += f"👥 Players: {archive['players']:,}\n\n"
+
+        medals = ["🥇 ", "🥈 ", "🥉 "]
+        text += "🎖️ Top Season Points:\n"
+        for place, (_, username, score) in enumerate(archive["top"].get("season", [])[:10], 1):
+            medal = medals[place - 1] if place <= 3 else ""
+            text += f"{medal}{place}. {username or 'Player'} - {score:,} SP\n"
+
+        # Cups are never reset, so this is the all-time standing when the season ended
+        text += "\n🏆 Top Cups at season end (all time):\n"
+        for place, (_, username, score) in enumerate(archive["top"].get("cups", [])[:3], 1):
+            text += f"{medals[place - 1]}{place}. {username or 'Player'} - {score:,} 🏆\n"
+
+        for place, (archived_user_id, _, score) in enumerate(archive["top"].get("season", []), 1):
+            if archived_user_id == user_id:
+                text += f"\n🎯 Your place: {place} with {score:,} SP"
+                break
+
+        buttons = [[InlineKeyboardButton("🔙 Past Seasons", callback_data="seasons_past")]]
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(buttons))
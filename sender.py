@@ -0,0 +1,56 @@
+import time
+import asyncio
+import logging
+from telegram.error import RetryAfter
+
+# Telegram allows about 30 messages per second overall and 1 per second per chat
+GLOBAL_MESSAGES_PER_SECOND = 25
+PER_CHAT_INTERVAL = 1.0
+
+
+class RateLimitedSender:
+    """Sends bot messages without exceeding Telegram rate limits"""
+
+    def __init__(self, messages_per_second=GLOBAL_MESSAGES_PER_SECOND, per_chat_interval=PER_CHAT_INTERVAL):
+        self.interval = 1 / messages_per_second
+        self.per_chat_interval = per_chat_interval
+        self.next_send_time = 0
+        self.chat_next_send_time = {}
+        self.lock = asyncio.Lock()
+        logging.info("🔄 Rate limited sender initialization")
+
+    async def wait_turn(self, chat_id):
+        """Waits until a message to chat may be sent"""
+        async with self.lock:
+            current_time = time.monotonic()
+            send_time = max(self.next_send_time, self.chat_next_send_time.get(chat_id, 0))
+            if send_time > current_time:
+                await asyncio.sleep(send_time - current_time)
+                current_time = send_time
+
+            self.next_send_time = current_time + self.interval
+            self.chat_next_send_time[chat_id] = current_time + self.per_chat_interval
+
+            # Forget chats whose interval has passed
+            if len(self.chat_next_send_time) > 10000:
+                self.chat_next_send_time = {
+                    chat: next_time for chat, next_time in self.chat_next_send_time.items()
+                    if next_time > current_time
+                }
+
+    async def send_message(self, bot, chat_id, text, **kwargs):
+        """Sends message, returns None if it could not be delivered"""
+        for attempt in range(2):
+            await self.wait_turn(chat_id)
+            try:
+                return await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if hasattr(retry_after, "total_seconds"):
+                    retry_after = retry_after.total_seconds()
+                logging.warning(f"⏳ Flood control for chat {chat_id}, retry in {retry_after}s")
+                await asyncio.sleep(retry_after)
+            except Exception as e:
+                logging.error(f"❌ Failed to send message to {chat_id}: {e}")
+                return None
+        return None
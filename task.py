@@ -1,15 +1,109 @@
 import logging
-import time
 import json
 import os
+import counters
+import events
+import epochs
+from seasons import add_sp
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 
+QUEST_DEFS_FILE = "quest_defs.json"
+QUEST_PERIODS = ["daily", "weekly", "achievement"]
+
+# Written to quest_defs.json on first start, edit the file to change quests.
+# A quest counts an "event" (optionally matching "filter") or reads a user "stat".
+DEFAULT_QUEST_DEFS = [
+    {"id": "get_cards", "period": "daily", "name": "🎴 Get 3 cards", "event": "card_pulled", "target": 3,
+     "reward_sp": 500, "reward_money": 100, "reward_attempts": 1, "reward_shards": 5},
+    {"id": "win_battle", "period": "daily", "name": "⚔️ Win a battle", "event": "battle_won", "target": 1,
+     "reward_sp": 1000, "reward_money": 200, "reward_attempts": 1, "reward_shards": 5},
+    {"id": "invite_friend", "period": "daily", "name": "👥 Invite a friend", "event": "referral_joined", "target": 1,
+     "reward_sp": 2000, "reward_money": 500, "reward_attempts": 1, "reward_shards": 5},
+    {"id": "collect_epic", "period": "daily", "name": "🐉 Collect Epic card", "event": "card_pulled",
+     "filter": {"rarity": "Epic"}, "target": 1,
+     "reward_sp": 1500, "reward_money": 300, "reward_attempts": 1, "reward_shards": 5},
+    {"id": "get_50_cards", "period": "weekly", "name": "🎴 Get 50 cards", "event": "card_pulled", "target": 50,
+     "reward_sp": 5000, "reward_money": 1000, "reward_attempts": 3, "reward_shards": 15},
+    {"id": "win_10_battles", "period": "weekly", "name": "⚔️ Win 10 battles", "event": "battle_won", "target": 10,
+     "reward_sp": 8000, "reward_money": 1500, "reward_attempts": 3, "reward_shards": 15},
+    {"id": "collect_legend", "period": "weekly", "name": "🎲 Collect Legend card", "event": "card_pulled",
+     "filter": {"rarity": "Legend"}, "target": 1,
+     "reward_sp": 10000, "reward_money": 2000, "reward_attempts": 3, "reward_shards": 15},
+    {"id": "craft_attempts", "period": "weekly", "name": "🛢️ Craft 5 attempts", "event": "craft_done", "target": 5,
+     "reward_sp": 3000, "reward_money": 500, "reward_attempts": 3, "reward_shards": 15},
+    {"id": "first_card", "period": "achievement", "name": "🌟 First card", "description": "Get your first card",
+     "stat": "total_cards", "target": 1,
+     "reward_sp": 1000, "reward_money": 200, "reward_attempts": 5, "reward_shards": 25},
+    {"id": "card_collector", "period": "achievement", "name": "📚 Collector", "description": "Collect 10 different cards",
+     "stat": "total_cards", "target": 10,
+     "reward_sp": 5000, "reward_money": 1000, "reward_attempts": 5, "reward_shards": 25},
+    {"id": "arena_champion", "period": "achievement", "name": "🏆 Arena Champion", "description": "Win 25 arena battles",
+     "stat": "battles_won", "target": 25,
+     "reward_sp": 15000, "reward_money": 3000, "reward_attempts": 5, "reward_shards": 25},
+    {"id": "rich_player", "period": "achievement", "name": "💰 Rich Player", "description": "Save 100,000 money",
+     "stat": "money", "target": 100000,
+     "reward_sp": 20000, "reward_money": 5000, "reward_attempts": 5, "reward_shards": 25}
+]
+
+# O(1) user stats available to "stat" quests
+QUEST_STATS = {
+    "total_cards": counters.total_cards,
+    "total_pulls": counters.total_pulls,
+    "battles_won": lambda user_data: user_data.get("battles_won", 0),
+    "arena_cups": lambda user_data: user_data.get("arena_cups", 0),
+    "money": lambda user_data: user_data.get("money", 0),
+    "total_sp": lambda user_data: user_data.get("total_sp", 0)
+}
+
+QUESTS_FLUSH_INTERVAL = 60        # Seconds between deferred saves of quest progress
+
+
 class TaskSystem:
     def __init__(self, user_db):
         self.user_db = user_db
+        self.quest_defs = self.load_quest_defs()
+        self.quests_by_period = {period: [] for period in QUEST_PERIODS}
+        self.quests_by_event = {}
+        for quest in self.quest_defs:
+            self.quests_by_period[quest["period"]].append(quest)
+            if "event" in quest:
+                self.quests_by_event.setdefault(quest["event"], []).append(quest)
+
         self.quests_data = self.load_quests_data()
-        logging.info("🔄 Task system initialization")
+        self.dirty = False
+        self.migrate_quests_data()
+
+        for event in self.quests_by_event:
+            events.subscribe(event, self.handle_event)
+        logging.info(f"🔄 Task system initialization ({len(self.quest_defs)} quests)")
+
+    def load_quest_defs(self):
+        """Loads quest definitions, creating default file if missing"""
+        if not os.path.exists(QUEST_DEFS_FILE):
+            try:
+                with open(QUEST_DEFS_FILE, "w", encoding="utf-8") as f:
+                    json.dump(DEFAULT_QUEST_DEFS, f, indent=2, ensure_ascii=False)
+            except Exception as e:
+                logging.error(f"Error saving {QUEST_DEFS_FILE}: {e}")
+            return DEFAULT_QUEST_DEFS
+
+        try:
+            with open(QUEST_DEFS_FILE, "r", encoding="utf-8") as f:
+                quest_defs = json.load(f)
+        except Exception as e:
+            logging.error(f"Error loading {QUEST_DEFS_FILE}: {e}")
+            return DEFAULT_QUEST_DEFS
+
+        valid_defs = []
+        for quest in quest_defs:
+            if quest.get("period") not in QUEST_PERIODS or "id" not in quest or "target" not in quest:
+                logging.error(f"Invalid quest definition skipped: {quest}")
+            elif ("event" in quest) == (quest.get("stat") in QUEST_STATS):
+                logging.error(f"Quest {quest['id']} needs exactly one known event or stat")
+            else:
+                valid_defs.append(quest)
+        return valid_defs
 
     def load_quests_data(self):
         """Loads quests data"""
@@ -27,201 +121,121 @@ class TaskSystem:
         try:
             with open("quests_data.json", "w", encoding="utf-8") as f:
                 json.dump(self.quests_data, f, indent=2, ensure_ascii=False)
+            self.dirty = False
         except Exception as e:
             logging.error(f"Error saving quests_data.json: {e}")
 
-    def get_daily_quests(self, user_id: int):
-        """Returns list of daily quests"""
+    def flush(self):
+        """Saves quest progress if it changed since last save"""
+        if self.dirty:
+            self.save_quests_data()
+
+    async def flush_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """Deferred save of quest progress (JobQueue callback)"""
+        self.flush()
+
+    def migrate_quests_data(self):
+        """Converts old per-flag records, keeping claimed achievements"""
+        for user_quests in self.quests_data.values():
+            # Old records are flat flags and counters ("daily_cards", "achievement_first_card", ...),
+            # new ones hold only per-period states
+            legacy_keys = [key for key in user_quests if key not in QUEST_PERIODS]
+            if not legacy_keys:
+                continue
+            state = user_quests.setdefault("achievement", {"epoch": 0, "progress": {}, "claimed": []})
+            for quest in self.quests_by_period["achievement"]:
+                if quest["id"] in state["claimed"]:
+                    continue
+                if user_quests.get(f"achievement_{quest['id']}") or user_quests.get(f"achievements_{quest['id']}"):
+                    state["claimed"].append(quest["id"])
+            for key in legacy_keys:
+                del user_quests[key]
+            self.dirty = True
+        self.flush()
+
+    def get_period_state(self, user_id: int, period: str):
+        """Returns user's counters for current period, resetting them when period changed"""
+        user_quests = self.quests_data.setdefault(str(user_id), {})
+        epoch = epochs.current_epoch(period)
+        state = user_quests.get(period)
+        if state is None or state.get("epoch") != epoch:
+            state = {"epoch": epoch, "progress": {}, "claimed": []}
+            user_quests[period] = state
+            self.dirty = True
+        return state
+
+    def handle_event(self, event, user_id, amount, details):
+        """Counts game event towards every quest listening to it"""
+        for quest in self.quests_by_event.get(event, ()):
+            quest_filter = quest.get("filter", {})
+            if any(details.get(field) != value for field, value in quest_filter.items()):
+                continue
+            progress = self.get_period_state(user_id, quest["period"])["progress"]
+            progress[quest["id"]] = progress.get(quest["id"], 0) + amount
+            self.dirty = True
+
+    def get_quests(self, user_id: int, period: str):
+        """Returns quests of period with user's progress"""
         user_data = self.user_db[user_id]
-        user_quests = self.quests_data.get(str(user_id), {})
-
-        daily_quests = [
-            {
-                "id": "get_cards",
-                "type": "daily",
-                "name": "🎴 Get 3 cards",
-                "progress": f"{min(user_data.get('cards_today', 0), 3)}/3",
-                "required": 3,
-                "current": min(user_data.get('cards_today', 0), 3),
-                "reward_sp": 500,
-                "reward_money": 100,
-                "completed": user_data.get('cards_today', 0) >= 3,
-                "claimed": user_quests.get("daily_get_cards", False)
-            },
-            {
-                "id": "win_battle",
-                "type": "daily",
-                "name": "⚔️ Win a battle",
-                "progress": f"{user_data.get('battles_won', 0)}/1",
-                "required": 1,
-                "current": user_data.get('battles_won', 0),
-                "reward_sp": 1000,
-                "reward_money": 200,
-                "completed": user_data.get('battles_won', 0) >= 1,
-                "claimed": user_quests.get("daily_win_battle", False)
-            },
-            {
-                "id": "invite_friend",
-                "type": "daily",
-                "name": "👥 Invite a friend",
-                "progress": f"{len(user_quests.get('referrals_today', []))}/1",
-                "required": 1,
-                "current": len(user_quests.get('referrals_today', [])),
-                "reward_sp": 2000,
-                "reward_money": 500,
-                "completed": len(user_quests.get('referrals_today', [])) >= 1,
-                "claimed": user_quests.get("daily_invite_friend", False)
-            },
-            {
-                "id": "collect_epic",
-                "type": "daily",
-                "name": "🐉 Collect Epic card",
-                "progress": f"{len(user_data['cards'].get('Epic', []))}/1",
-                "required": 1,
-                "current": len(user_data['cards'].get('Epic', [])),
-                "reward_sp": 1500,
-                "reward_money": 300,
-                "completed": len(user_data['cards'].get('Epic', [])) >= 1,
-                "claimed": user_quests.get("daily_collect_epic", False)
-            }
-        ]
+        state = self.get_period_state(user_id, period)
+
+        quests = []
+        for quest in self.quests_by_period[period]:
+            if "stat" in quest:
+                current = QUEST_STATS[quest["stat"]](user_data)
+            else:
+                current = state["progress"].get(quest["id"], 0)
+            current = min(current, quest["target"])
+            quests.append({
+                "id": quest["id"],
+                "type": period,
+                "name": quest.get("name", quest["id"]),
+                "description": quest.get("description", ""),
+                "progress": f"{current}/{quest['target']}",
+                "required": quest["target"],
+                "current": current,
+                "reward_sp": quest.get("reward_sp", 0),
+                "reward_money": quest.get("reward_money", 0),
+                "reward_attempts": quest.get("reward_attempts", 0),
+                "reward_shards": quest.get("reward_shards", 0),
+                "completed": current >= quest["target"],
+                "claimed": quest["id"] in state["claimed"]
+            })
+        return quests
 
-        return daily_quests
+    def get_daily_quests(self, user_id: int):
+        """Returns list of daily quests"""
+        return self.get_quests(user_id, "daily")
 
     def get_weekly_quests(self, user_id: int):
         """Returns list of weekly quests"""
-        user_data = self.user_db[user_id]
-        user_quests = self.quests_data.get(str(user_id), {})
-
-        weekly_quests = [
-            {
-                "id": "get_50_cards",
-                "type": "weekly",
-                "name": "🎴 Get 50 cards",
-                "progress": f"{user_quests.get('weekly_cards', 0)}/50",
-                "required": 50,
-                "current": user_quests.get('weekly_cards', 0),
-                "reward_sp": 5000,
-                "reward_money": 1000,
-                "completed": user_quests.get('weekly_cards', 0) >= 50,
-                "claimed": user_quests.get("weekly_get_50_cards", False)
-            },
-            {
-                "id": "win_10_battles",
-                "type": "weekly",
-                "name": "⚔️ Win 10 battles",
-                "progress": f"{user_data.get('battles_won', 0)}/10",
-                "required": 10,
-                "current": user_data.get('battles_won', 0),
-                "reward_sp": 8000,
-                "reward_money": 1500,
-                "completed": user_data.get('battles_won', 0) >= 10,
-                "claimed": user_quests.get("weekly_win_10_battles", False)
-            },
-            {
-                "id": "collect_legend",
-                "type": "weekly",
-                "name": "🎲 Collect Legend card",
-                "progress": f"{len(user_data['cards'].get('Legend', []))}/1",
-                "required": 1,
-                "current": len(user_data['cards'].get('Legend', [])),
-                "reward_sp": 10000,
-                "reward_money": 2000,
-                "completed": len(user_data['cards'].get('Legend', [])) >= 1,
-                "claimed": user_quests.get("weekly_collect_legend", False)
-            },
-            {
-                "id": "craft_attempts",
-                "type": "weekly",
-                "name": "🛢️ Craft 5 attempts",
-                "progress": f"{user_quests.get('weekly_craft_attempts', 0)}/5",
-                "required": 5,
-                "current": user_quests.get('weekly_craft_attempts', 0),
-                "reward_sp": 3000,
-                "reward_money": 500,
-                "completed": user_quests.get('weekly_craft_attempts', 0) >= 5,
-                "claimed": user_quests.get("weekly_craft_attempts", False)
-            }
-        ]
-
-        return weekly_quests
+        return self.get_quests(user_id, "weekly")
 
     def get_achievements(self, user_id: int):
         """Returns list of achievements"""
-        user_data = self.user_db[user_id]
-        user_quests = self.quests_data.get(str(user_id), {})
-
-        achievements = [
-            {
-                "id": "first_card",
-                "type": "achievement",
-                "name": "🌟 First card",
-                "description": "Get your first card",
-                "progress": f"{min(len(user_data['cards'].get('Common', [])), 1)}/1",
-                "required": 1,
-                "current": min(len(user_data['cards'].get('Common', [])), 1),
-                "reward_sp": 1000,
-                "reward_money": 200,
-                "completed": len(user_data['cards'].get('Common', [])) >= 1,
-                "claimed": user_quests.get("achievement_first_card", False)
-            },
-            {
-                "id": "card_collector",
-                "type": "achievement",
-                "name": "📚 Collector",
-                "description": "Collect 10 different cards",
-                "progress": f"{sum(len(cards) for cards in user_data['cards'].values())}/10",
-                "required": 10,
-                "current": sum(len(cards) for cards in user_data['cards'].values()),
-                "reward_sp": 5000,
-                "reward_money": 1000,
-                "completed": sum(len(cards) for cards in user_data['cards'].values()) >= 10,
-                "claimed": user_quests.get("achievement_card_collector", False)
-            },
-            {
-                "id": "arena_champion",
-                "type": "achievement",
-                "name": "🏆 Arena Champion",
-                "description": "Win 25 arena battles",
-                "progress": f"{user_data.get('battles_won', 0)}/25",
-                "required": 25,
-                "current": user_data.get('battles_won', 0),
-                "reward_sp": 15000,
-                "reward_money": 3000,
-                "completed": user_data.get('battles_won', 0) >= 25,
-                "claimed": user_quests.get("achievement_arena_champion", False)
-            },
-            {
-                "id": "rich_player",
-                "type": "achievement",
-                "name": "💰 Rich Player",
-                "description": "Save 100,000 money",
-                "progress": f"{user_data.get('money', 0)}/100000",
-                "required": 100000,
-                "current": user_data.get('money', 0),
-                "reward_sp": 20000,
-                "reward_money": 5000,
-                "completed": user_data.get('money', 0) >= 100000,
-                "claimed": user_quests.get("achievement_rich_player", False)
-            }
-        ]
-
-        return achievements
+        return self.get_quests(user_id, "achievement")
 
-    def update_quest_progress(self, user_id: int, quest_type: str, amount: int = 1):
-        """Updates quest progress"""
-        user_id_str = str(user_id)
-        if user_id_str not in self.quests_data:
-            self.quests_data[user_id_str] = {}
-
-        if quest_type == "daily_cards":
-            self.quests_data[user_id_str]["daily_cards"] = self.quests_data[user_id_str].get("daily_cards", 0) + amount
-        elif quest_type == "weekly_cards":
-            self.quests_data[user_id_str]["weekly_cards"] = self.quests_data[user_id_str].get("weekly_cards", 0) + amount
-        elif quest_type == "craft_attempts":
-            self.quests_data[user_id_str]["weekly_craft_attempts"] = self.quests_data[user_id_str].get("weekly_craft_attempts", 0) + amount
+    def collect_rewards(self, user_id: int, quests):
+        """Marks completed quests claimed and gives their rewards, returns totals"""
+        user_data = self.user_db[user_id]
+        totals = {"quests": 0, "sp": 0, "money": 0, "attempts": 0, "shards": 0}
 
-        self.save_quests_data()
+        for quest in quests:
+            if quest["completed"] and not quest["claimed"]:
+                totals["quests"] += 1
+                totals["sp"] += quest["reward_sp"]
+                totals["money"] += quest["reward_money"]
+                totals["attempts"] += quest["reward_attempts"]
+                totals["shards"] += quest["reward_shards"]
+                self.get_period_state(user_id, quest["type"])["claimed"].append(quest["id"])
+
+        if totals["quests"]:
+            add_sp(user_data, totals["sp"])
+            user_data["money"] += totals["money"]
+            user_data["cards_today"] += totals["attempts"]
+            user_data["shards"] = user_data.get("shards", 0) + totals["shards"]
+            self.save_quests_data()
+        return totals
 
     async def show_quests_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
         """Shows main quests menu"""
@@ -233,13 +247,17 @@ class TaskSystem:
 
         daily_quests = self.get_daily_quests(user_id)
         completed_daily = sum(1 for q in daily_quests if q["completed"])
+        weekly_quests = self.get_weekly_quests(user_id)
+        completed_weekly = sum(1 for q in weekly_quests if q["completed"])
+        achievements = self.get_achievements(user_id)
+        completed_achievements = sum(1 for q in achievements if q["completed"])
 
         text = (
             f"📋 {username}, quest system\n\n"
             f"📊 Today's progress:\n"
             f"• 🎯 Daily: {completed_daily}/{len(daily_quests)}\n"
-            f"• ⏳ Weekly: in progress\n"
-            f"• 🏆 Achievements: available\n\n"
+            f"• ⏳ Weekly: {completed_weekly}/{len(weekly_quests)}\n"
+            f"• 🏆 Achievements: {completed_achievements}/{len(achievements)}\n\n"
             f"💎 Choose quest type:"
         )
 
@@ -361,58 +379,15 @@ class TaskSystem:
     async def claim_quest_rewards(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, quest_type: str):
         """Gives quest rewards"""
         query = update.callback_query
-        await query.answer()
-
-        user_data = self.user_db[user_id]
-        user_id_str = str(user_id)
-
-        if quest_type == "daily":
-            quests = self.get_daily_quests(user_id)
-        elif quest_type == "weekly":
-            quests = self.get_weekly_quests(user_id)
-        else:  # achievements
-            quests = self.get_achievements(user_id)
 
-        total_reward_sp = 0
-        total_reward_money = 0
-        total_reward_attempts = 0  # ADDED: for attempts
-        total_reward_shards = 0    # ADDED: for shards
-        claimed_quests = 0
+        period = "achievement" if quest_type == "achievements" else quest_type
+        totals = self.collect_rewards(user_id, self.get_quests(user_id, period))
 
-        for quest in quests:
-            if quest["completed"] and not quest["claimed"]:
-                total_reward_sp += quest["reward_sp"]
-                total_reward_money += quest["reward_money"]
-
-                # ADDED: Give attempts and shards for quests
-                if quest_type == "daily":
-                    total_reward_attempts += 1  # +1 attempt for each daily quest
-                    total_reward_shards += 5    # +5 shards for each daily quest
-                elif quest_type == "weekly":
-                    total_reward_attempts += 3  # +3 attempts for each weekly quest
-                    total_reward_shards += 15   # +15 shards for each weekly quest
-                else:  # achievements
-                    total_reward_attempts += 5  # +5 attempts for each achievement
-                    total_reward_shards += 25   # +25 shards for each achievement
-
-                claimed_quests += 1
-
-                # Mark quest as completed
-                if user_id_str not in self.quests_data:
-                    self.quests_data[user_id_str] = {}
-                self.quests_data[user_id_str][f"{quest_type}_{quest['id']}"] = True
-
-        if claimed_quests == 0:
+        if totals["quests"] == 0:
             await query.answer("❌ No completed quests to claim rewards!", show_alert=True)
             return
 
-        # Give rewards
-        user_data["total_sp"] += total_reward_sp
-        user_data["money"] += total_reward_money
-        user_data["cards_today"] += total_reward_attempts  # ADDED: give attempts
-        user_data["shards"] += total_reward_shards         # ADDED: give shards
-
-        self.save_quests_data()
+        await query.answer()
 
         quest_type_name = {
             "daily": "daily quests",
@@ -422,11 +397,11 @@ class TaskSystem:
 
         text = (
             f"🎉 Rewards claimed!\n\n"
-            f"📦 Received for {claimed_quests} {quest_type_name[quest_type]}:\n"
-            f"• 💎 {total_reward_sp:,} SP\n"
-            f"• 💰 {total_reward_money:,} money\n"
-            f"• 🎴 +{total_reward_attempts} attempts\n"      # ADDED
-            f"• 🀄️ +{total_reward_shards} shards\n\n"        # ADDED
+            f"📦 Received for {totals['quests']} {quest_type_name[quest_type]}:\n"
+            f"• 💎 {totals['sp']:,} SP\n"
+            f"• 💰 {totals['money']:,} money\n"
+            f"• 🎴 +{totals['attempts']} attempts\n"
+            f"• 🀄️ +{totals['shards']} shards\n\n"
             f"✅ Rewards added to your account!"
         )
 
@@ -441,65 +416,25 @@ class TaskSystem:
     async def claim_all_rewards(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
         """Gives all available rewards"""
         query = update.callback_query
-        await query.answer()
 
-        user_data = self.user_db[user_id]
-        user_id_str = str(user_id)
-
-        all_quests = (
-            self.get_daily_quests(user_id) +
-            self.get_weekly_quests(user_id) +
-            self.get_achievements(user_id)
-        )
+        all_quests = []
+        for period in QUEST_PERIODS:
+            all_quests += self.get_quests(user_id, period)
+        totals = self.collect_rewards(user_id, all_quests)
 
-        total_reward_sp = 0
-        total_reward_money = 0
-        total_reward_attempts = 0  # ADDED
-        total_reward_shards = 0    # ADDED
-        claimed_quests = 0
-
-        for quest in all_quests:
-            if quest["completed"] and not quest["claimed"]:
-                total_reward_sp += quest["reward_sp"]
-                total_reward_money += quest["reward_money"]
-
-                # ADDED: Give attempts and shards depending on quest type
-                if quest["type"] == "daily":
-                    total_reward_attempts += 1
-                    total_reward_shards += 5
-                elif quest["type"] == "weekly":
-                    total_reward_attempts += 3
-                    total_reward_shards += 15
-                else:  # achievements
-                    total_reward_attempts += 5
-                    total_reward_shards += 25
-
-                claimed_quests += 1
-
-                # Mark quest as completed
-                if user_id_str not in self.quests_data:
-                    self.quests_data[user_id_str] = {}
-                self.quests_data[user_id_str][f"{quest['type']}_{quest['id']}"] = True
-
-        if claimed_quests == 0:
+        if totals["quests"] == 0:
             await query.answer("❌ No completed quests to claim rewards!", show_alert=True)
             return
 
-        # Give rewards
-        user_data["total_sp"] += total_reward_sp
-        user_data["money"] += total_reward_money
-        user_data["cards_today"] += total_reward_attempts  # ADDED
-        user_data["shards"] += total_reward_shards         # ADDED
-
-        self.save_quests_data()
+        await query.answer()
 
         text = (
             f"🎉 All rewards claimed!\n\n"
-            f"📦 Received for {claimed_quests} quests:\n"
-            f"• 💎 {total_reward_sp:,} SP\n"
-            f"• 💰 {total_reward_money:,} money\n"
-            f"• 🎴 +{total_reward_attempts} attempts\n"      # ADDED
-            f"• 🀄️ +{total_reward_shards} shards\n\n"        # ADDED
+            f"📦 Received for {totals['quests']} quests:\n"
+            f"• 💎 {totals['sp']:,} SP\n"
+            f"• 💰 {totals['money']:,} money\n"
+            f"• 🎴 +{totals['attempts']} attempts\n"
+            f"• 🀄️ +{totals['shards']} shards\n\n"
             f"✅ Rewards added to your account!"
         )
 
@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import events
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ContextTypes
+from duel import run_swiss_tournament
+from seasons import add_sp
+
+# Tournament settings
+TOURNAMENT_WORKERS = 2
+TOURNAMENT_MIN_PLAYERS = 2
+TOURNAMENT_DEFAULT_ROUNDS = 5
+TOURNAMENT_JOB_NAME = "tournament"
+TOURNAMENT_PRIZES = [
+    {"money": 100000, "sp": 20000, "cups": 50},
+    {"money": 50000, "sp": 10000, "cups": 30},
+    {"money": 25000, "sp": 5000, "cups": 15}
+]
+
+
+class TournamentSystem:
+    def __init__(self, user_db, arena_system, sender):
+        self.user_db = user_db
+        self.arena_system = arena_system
+        self.sender = sender
+        self.executor = None
+        self.tournament_data = self.load_tournament_data()
+        logging.info("🔄 Tournament system initialization")
+
+    def load_tournament_data(self):
+        """Loads tournament data"""
+        data = {
+            "registrations": {},
+            "scheduled_at": None,
+            "rounds": TOURNAMENT_DEFAULT_ROUNDS,
+            "last_results": []
+        }
+        try:
+            if os.path.exists("tournament_data.json"):
+                with open("tournament_data.json", "r", encoding="utf-8") as f:
+                    data.update(json.load(f))
+        except Exception as e:
+            logging.error(f"Error loading tournament_data.json: {e}")
+        return data
+
+    def save_tournament_data(self):
+        """Saves tournament data"""
+        try:
+            with open("tournament_data.json", "w", encoding="utf-8") as f:
+                json.dump(self.tournament_data, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            logging.error(f"Error saving tournament_data.json: {e}")
+
+    def get_executor(self):
+        """Returns process pool for tournament simulation"""
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=TOURNAMENT_WORKERS)
+        return self.executor
+
+    def register(self, user_id: int):
+        """Registers user's current arena team, returns (success, message)"""
+        user_team = self.user_db[user_id].get("arena_team", [])
+        if len(user_team) != 5 or not all(user_team):
+            return False, "❌ Your team is incomplete! Fill all 5 slots."
+
+        user_id_str = str(user_id)
+        already_registered = user_id_str in self.tournament_data["registrations"]
+        self.tournament_data["registrations"][user_id_str] = list(user_team)
+        self.save_tournament_data()
+
+        if already_registered:
+            return True, "🔄 Tournament team updated!"
+        return True, "✅ You are registered for the tournament!"
+
+    def unregister(self, user_id: int):
+        """Removes user's registration"""
+        if self.tournament_data["registrations"].pop(str(user_id), None) is None:
+            return False
+        self.save_tournament_data()
+        return True
+
+    def schedule(self, job_queue, delay_seconds: float, rounds: int = TOURNAMENT_DEFAULT_ROUNDS):
+        """Schedules tournament start"""
+        for job in job_queue.get_jobs_by_name(TOURNAMENT_JOB_NAME):
+            job.schedule_removal()
+
+        job_queue.run_once(self.run_tournament, when=delay_seconds, name=TOURNAMENT_JOB_NAME)
+        self.tournament_data["scheduled_at"] = time.time() + delay_seconds
+        self.tournament_data["rounds"] = rounds
+        self.save_tournament_data()
+        logging.info(f"🏟 Tournament scheduled in {delay_seconds:.0f}s, {rounds} rounds")
+
+    def restore_schedule(self, job_queue):
+        """Re-schedules tournament saved before restart"""
+        scheduled_at = self.tournament_data.get("scheduled_at")
+        if scheduled_at:
+            delay = max(0, scheduled_at - time.time())
+            job_queue.run_once(self.run_tournament, when=delay, name=TOURNAMENT_JOB_NAME)
+            logging.info(f"🏟 Tournament schedule restored, starts in {delay:.0f}s")
+
+    def build_entries(self):
+        """Returns registered teams as (user_id, [(attack, health)]) entries"""
+        entries = []
+        for user_id_str, team in self.tournament_data["registrations"].items():
+            team_stats = []
+            for card_name in team:
+                card_data = self.arena_system.get_card_data(card_name)
+                if not card_data:
+                    break
+                team_stats.append((card_data.get("attack", 0), card_data.get("health", 0)))
+
+            if len(team_stats) == 5:
+                entries.append((int(user_id_str), team_stats))
+        return entries
+
+    def give_prize(self, user_id: int, place: int):
+        """Gives tournament prize for place, returns prize or None"""
+        if place > len(TOURNAMENT_PRIZES) or user_id not in self.user_db:
+            return None
+
+        prize = TOURNAMENT_PRIZES[place - 1]
+        user_data = self.user_db[user_id]
+        user_data["money"] += prize["money"]
+        add_sp(user_data, prize["sp"])
+        user_data["arena_cups"] = user_data.get("arena_cups", 0) + prize["cups"]
+        events.emit("stats_changed", user_id)
+        return prize
+
+    def get_username(self, user_id: int):
+        """Returns display name of participant"""
+        if user_id in self.user_db:
+            return self.user_db[user_id].get("username") or f"Player {user_id}"
+        return f"Player {user_id}"
+
+    async def run_tournament(self, context: ContextTypes.DEFAULT_TYPE):
+        """Runs scheduled tournament (JobQueue callback)"""
+        entries = self.build_entries()
+        self.tournament_data["scheduled_at"] = None
+
+        if len(entries) < TOURNAMENT_MIN_PLAYERS:
+            logging.info(f"🏟 Tournament cancelled: {len(entries)} participants")
+            self.save_tournament_data()
+            for user_id, _ in entries:
+                await self.notify(
+                    context.bot, user_id,
+                    "🏟 Tournament cancelled: not enough participants.\n"
+                    "Your registration is kept for the next one!"
+                )
+            return
+
+        rounds = max(1, min(self.tournament_data.get("rounds", TOURNAMENT_DEFAULT_ROUNDS), len(entries) - 1))
+        logging.info(f"🏟 Tournament started: {len(entries)} participants, {rounds} rounds")
+
+        # Simulation runs in worker processes so the bot keeps answering
+        loop = asyncio.get_running_loop()
+        standings = await loop.run_in_executor(
+            self.get_executor(), run_swiss_tournament, entries, rounds, random.getrandbits(32)
+        )
+
+        results = []
+        prizes = {}
+        for place, stats in enumerate(standings, 1):
+            prize = self.give_prize(stats["user_id"], place)
+            if prize:
+                prizes[stats["user_id"]] = prize
+            if place <= 10:
+                results.append({
+                    "user_id": stats["user_id"],
+                    "username": self.get_username(stats["user_id"]),
+                    "points": stats["points"],
+                    "wins": stats["wins"],
+                    "draws": stats["draws"],
+                    "losses": stats["losses"]
+                })
+
+        self.tournament_data["registrations"] = {}
+        self.tournament_data["last_results"] = results
+        self.tournament_data["finished_at"] = time.time()
+        self.save_tournament_data()
+        logging.info(f"🏁 Tournament finished, winner: {results[0]['username']}")
+
+        podium = self.format_podium(results)
+        for place, stats in enumerate(standings, 1):
+            text = (
+                f"🏁 Tournament finished!\n\n"
+                f"{podium}\n"
+                f"📊 Your place: {place} of {len(standings)}\n"
+                f"⚔️ Wins/Draws/Losses: {stats['wins']}/{stats['draws']}/{stats['losses']}\n"
+                f"⭐ Points: {stats['points']:g}"
+            )
+            prize = prizes.get(stats["user_id"])
+            if prize:
+                text += (
+                    f"\n\n🎁 Prize: {prize['money']:,} 💰 + {prize['sp']:,} SP 💎 + {prize['cups']} 🏆"
+                )
+            await self.notify(context.bot, stats["user_id"], text)
+
+    async def notify(self, bot, user_id: int, text: str):
+        """Sends message to participant, directly through the bot if there is no rate limited sender"""
+        if self.sender:
+            await self.sender.send_message(bot, user_id, text)
+            return
+        try:
+            await bot.send_message(chat_id=user_id, text=text)
+        except Exception as e:
+            logging.error(f"❌ Failed to notify tournament participant {user_id}: {e}")
+
+    def format_podium(self, results):
+        """Formats top-3 of tournament results"""
+        medals = ["🥇", "🥈", "🥉"]
+        text = ""
+        for medal, result in zip(medals, results):
+            text += f"{medal} {result['username']} - {result['points']:g} pts\n"
+        return text
+
+    async def show_tournament_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+        """Shows tournament menu"""
+        query = update.callback_query
+        await query.answer()
+
+        registrations = self.tournament_data["registrations"]
+        scheduled_at = self.tournament_data.get("scheduled_at")
+        is_registered = str(user_id) in registrations
+
+        text = "🏟 Tournament\n\n"
+        if scheduled_at:
+            start_time = datetime.fromtimestamp(scheduled_at).strftime('%d.%m.%Y %H:%M')
+            text += f"⏰ Start: {start_time}\n"
+            text += f"🌀 Swiss rounds: {self.tournament_data.get('rounds', TOURNAMENT_DEFAULT_ROUNDS)}\n"
+        else:
+            text += "⏰ Next tournament is not scheduled yet\n"
+
+        text += f"👥 Registered teams: {len(registrations)}\n"
+        text += f"📝 Your status: {'✅ Registered' if is_registered else '❌ Not registered'}\n\n"
+
+        text += "🎁 Prizes:\n"
+        for place, prize in enumerate(TOURNAMENT_PRIZES, 1):
+            text += f"{place}. {prize['money']:,} 💰 + {prize['sp']:,} SP 💎 + {prize['cups']} 🏆\n"
+
+        last_results = self.tournament_data.get("last_results", [])
+        if last_results:
+            text += f"\n📜 Last tournament:\n{self.format_podium(last_results)}"
+
+        buttons = []
+        if is_registered:
+            buttons.append([InlineKeyboardButton("🔄 Update Team", callback_data="tournament_register")])
+            buttons.append([InlineKeyboardButton("🚪 Leave Tournament", callback_data="tournament_leave")])
+        else:
+            buttons.append([InlineKeyboardButton("📝 Register Team", callback_data="tournament_register")])
+        buttons.append([InlineKeyboardButton("🔙 Back", callback_data="arena")])
+
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+
+    async def register_team(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+        """Registers user's team from tournament menu"""
+        query = update.callback_query
+        success, message = self.register(user_id)
+        await query.answer(message, show_alert=True)
+        if success:
+            await self.show_tournament_menu(update, context, user_id)
+
+    async def leave_tournament(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+        """Removes user's registration from tournament menu"""
+        query = update.callback_query
+        if self.unregister(user_id):
+            await query.answer("🚪 You left the tournament", show_alert=True)
+        await self.show_tournament_menu(update, context, user_id)
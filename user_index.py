@@ -0,0 +1,52 @@
+import os
+import logging
+from array import array
+
+USER_INDEX_FILE = "user_index.bin"
+
+
+class UserIndex:
+    """Dense numbering of user IDs: the file is an append-only uint64 array, position is the index"""
+
+    def __init__(self, path=USER_INDEX_FILE):
+        self.path = path
+        self.user_ids = array("q")
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                usable = len(data) - len(data) % self.user_ids.itemsize
+                self.user_ids.frombytes(data[:usable])
+                if usable != len(data):
+                    # A torn last record after a crash is dropped so appends stay aligned
+                    with open(path, "r+b") as f:
+                        f.truncate(usable)
+            except Exception as e:
+                logging.error(f"Error loading user index: {e}")
+        self.positions = {user_id: index for index, user_id in enumerate(self.user_ids)}
+        logging.info(f"🔄 User index initialization ({len(self.user_ids)} users)")
+
+    def get(self, user_id):
+        """Returns dense index of user, or None if user has none yet"""
+        return self.positions.get(user_id)
+
+    def get_or_add(self, user_id):
+        """Returns dense index of user, assigning next one to new users"""
+        index = self.positions.get(user_id)
+        if index is not None:
+            return index
+
+        index = len(self.user_ids)
+        record = array("q", [user_id])
+        try:
+            with open(self.path, "ab") as f:
+                record.tofile(f)
+        except Exception as e:
+            logging.error(f"Error saving user index: {e}")
+        self.user_ids.append(user_id)
+        self.positions[user_id] = index
+        return index
+
+    def user_id(self, index):
+        """Returns user ID of dense index"""
+        return self.user_ids[index]